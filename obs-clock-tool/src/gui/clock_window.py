@@ -116,11 +116,14 @@ class ClockWindow(QMainWindow):
         # プレビューの更新
         self.preview_label.setText(time_text)
         
-        # OBSのテキストソースを更新
-        self.obs_manager.update_text(time_text)
+        # OBSのテキストソースを更新（表示中と同じテキストは送られない）
+        self.obs_manager.submit_text(time_text)
     
     def update_preview(self):
-        """プレビュー表示を更新"""
+        """プレビュー表示を更新
+
+        フォントの変更ではOBSに送るテキストは変わらないため、送信は出力段で省かれる。
+        """
         font = QFont(self.font_combo.currentText(), self.size_spin.value())
         self.preview_label.setFont(font)
         self.update_time()
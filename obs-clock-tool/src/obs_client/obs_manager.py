@@ -1,4 +1,22 @@
-from obswebsocket import obsws, requests
+from obswebsocket import obsws, requests, events
+from .supervisor import ConnectionSupervisor
+from .text_queue import TextUpdateQueue
+
+# テキストソースの更新に使うリクエスト（試す順。先頭はobs-websocket v5、残りはv4のリクエスト）
+TEXT_UPDATE_METHODS = ("SetInputSettings", "SetTextFreetype2Properties", "SetSourceSettings")
+
+# ソースの追加・削除・名前の変更を通知するイベント（v5とv4）と、ソース名を持つ項目
+SOURCE_CHANGE_EVENTS = (
+    "InputCreated", "InputRemoved", "InputNameChanged",
+    "SourceCreated", "SourceDestroyed", "SourceRenamed",
+)
+SOURCE_NAME_KEYS = ("inputName", "oldInputName", "sourceName", "previousName", "newName")
+
+# ソースの更新に使うリクエストをまだ決めていないことを表す
+_UNRESOLVED = object()
+
+class TextRequestRejected(Exception):
+    """OBSがテキスト更新のリクエストを拒否した（通信の失敗ではない）"""
 
 class OBSManager:
     """OBS WebSocket接続とテキスト更新を管理するクラス"""
@@ -11,64 +29,217 @@ class OBSManager:
         self.config = config
         self.obs = None
         self.connected = False
+        # 作成したクライアントの世代（古いクライアントや意図した切断の通知を無視するために使う）
+        self._generation = 0
+        self._supervisor = None
+        # ソース名から更新に使うリクエスト名（どれも使えなかった場合はNone）
+        self._text_methods = {}
+        # 同じ値の更新を捨て、続いた更新をまとめて送る出力段（submit_textで使う）
+        self.text_queue = TextUpdateQueue(
+            lambda source_name, text: self.update_text(text, source_name),
+            min_interval=config.obs_config.get("min_update_interval", 0.1)
+        )
     
     def connect(self):
-        """OBSに接続"""
+        """OBSに接続
+
+        接続後は接続を監視し、切れたら自動で再接続する（auto_reconnectがFalseの場合を除く）。
+        """
         try:
-            print(f"OBSへの接続を試みています... (host: {self.config.obs_config['host']}, port: {self.config.obs_config['port']})")
-            self.obs = obsws(
-                host=self.config.obs_config["host"],
-                port=self.config.obs_config["port"],
-                password=self.config.obs_config["password"]
-            )
-            print("WebSocketクライアントを作成しました。接続を開始します...")
-            self.obs.connect()
-            self.connected = True
-            print("OBSに正常に接続しました。")
-            self._log_obs_info()
+            self._open()
         except Exception as e:
             self.connected = False
             raise Exception(f"OBSへの接続に失敗しました: {str(e)}")
+        obs_config = self.config.obs_config
+        if obs_config.get("auto_reconnect", True) and self._supervisor is None:
+            self._supervisor = ConnectionSupervisor(
+                self._reconnect,
+                self._heartbeat,
+                on_lost=self._on_connection_lost,
+                heartbeat_interval=obs_config.get("heartbeat_interval", 5.0),
+                initial_delay=obs_config.get("reconnect_initial_delay", 0.5),
+                max_delay=obs_config.get("reconnect_max_delay", 30.0)
+            )
+            self._supervisor.start()
+    
+    def _open(self):
+        """クライアントを作成して接続し、ソースの更新の準備をする"""
+        print(f"OBSへの接続を試みています... (host: {self.config.obs_config['host']}, port: {self.config.obs_config['port']})")
+        self._generation += 1
+        generation = self._generation
+
+        def on_disconnect(*args):
+            self._on_socket_closed(generation)
+
+        self.obs = obsws(
+            host=self.config.obs_config["host"],
+            port=self.config.obs_config["port"],
+            password=self.config.obs_config["password"],
+            timeout=self.config.obs_config.get("request_timeout", 5.0),
+            on_disconnect=on_disconnect
+        )
+        print("WebSocketクライアントを作成しました。接続を開始します...")
+        self.obs.connect()
+        self.connected = True
+        print("OBSに正常に接続しました。")
+        self._text_methods.clear()
+        self.text_queue.forget()
+        self.text_queue.start()
+        for name in SOURCE_CHANGE_EVENTS:
+            self.obs.register(self._on_source_event, getattr(events, name))
+        self._log_obs_info()
+        self._probe_text_method(self.config.display_config["source_name"])
+    
+    def _reconnect(self):
+        """切れた接続を破棄して接続し直し、ソースごとの最新の値を送り直す"""
+        self._close_client()
+        self._open()
+        self.text_queue.resync()
+    
+    def _heartbeat(self):
+        """接続が生きているかを確認する（OBSが応答しなければ例外を送出する）"""
+        if not self.connected:
+            return False
+        self.obs.call(requests.GetVersion())
+        return True
+    
+    def _on_socket_closed(self, generation):
+        """クライアントがソケットの切断を検知した"""
+        if generation != self._generation or self._supervisor is None:
+            return
+        self.connected = False
+        self._supervisor.notify_lost()
+    
+    def _on_connection_lost(self):
+        """切断を検知したら、再接続するまで送信を止める（送信を待つ値は再接続後に送る）"""
+        self.connected = False
+        self.text_queue.stop()
+    
+    def _close_client(self):
+        """現在のクライアントを閉じる（閉じたことによる切断の通知は無視する）"""
+        self._generation += 1
+        obs, self.obs = self.obs, None
+        if obs is None:
+            return
+        try:
+            obs.disconnect()
+        except Exception as e:
+            print(f"切断でのエラー: {type(e).__name__} - {str(e)}")
     
     def disconnect(self):
         """OBSから切断"""
+        if self._supervisor is not None:
+            supervisor, self._supervisor = self._supervisor, None
+            supervisor.stop()
+        self.text_queue.stop()
         if self.obs:
-            self.obs.disconnect()
+            self._close_client()
             self.connected = False
     
-    def update_text(self, text):
-        """テキストソースを更新"""
+    def submit_text(self, text, source_name=None):
+        """テキストソースの更新を出力段に渡す（呼び出し側を待たせず、同じ値は送らない）"""
+        self.text_queue.submit(source_name or self.config.display_config["source_name"], text)
+    
+    def update_text(self, text, source_name=None):
+        """テキストソースを更新
+
+        ソースごとに使えるリクエストを一度だけ決めて記録し、以降は1回のリクエストで更新する。
+
+        Args:
+            text: 表示するテキスト
+            source_name: 更新するソース名（Noneの場合は設定のsource_name）
+        """
         if not self.connected:
             return
         
+        source_name = source_name or self.config.display_config["source_name"]
+        method = self._text_methods.get(source_name, _UNRESOLVED)
+        if method is None:
+            # どのリクエストも使えなかったソースは、追加・名前変更が通知されるまで送らない
+            return None
+        if method is _UNRESOLVED:
+            return self._negotiate_text_method(source_name, text)
         try:
-            # まず、SetInputSettings を試す
-            response = self.obs.call(requests.SetInputSettings(
-                inputName=self.config.display_config["source_name"],
-                inputSettings={"text": text}
-            ))
-            return response
+            return self._send_text(method, source_name, text)
         except Exception as e:
-            print(f"SetInputSettings でのエラー: {type(e).__name__} - {str(e)}")
+            print(f"{method} でのエラー: {type(e).__name__} - {str(e)}")
+            return None
+    
+    def _negotiate_text_method(self, source_name, text):
+        """使えるリクエストを順に試し、成功したものをソースに記録する"""
+        rejected = True
+        for method in self._candidate_text_methods():
             try:
-                # 失敗した場合は、SetTextFreetype2Properties を試す
-                response = self.obs.call(requests.SetTextFreetype2Properties(
-                    source=self.config.display_config["source_name"],
-                    text=text
-                ))
-                return response
+                response = self._send_text(method, source_name, text)
+            except TextRequestRejected as e:
+                print(f"{method} でのエラー: {str(e)}")
+                continue
             except Exception as e:
-                print(f"SetTextFreetype2Properties でのエラー: {type(e).__name__} - {str(e)}")
-                try:
-                    # 最後の手段として、SetSourceSettings を試す
-                    response = self.obs.call(requests.SetSourceSettings(
-                        sourceName=self.config.display_config["source_name"],
-                        sourceSettings={"text": text}
-                    ))
-                    return response
-                except Exception as e:
-                    print(f"SetSourceSettings でのエラー: {type(e).__name__} - {str(e)}")
-                    return None
+                print(f"{method} でのエラー: {type(e).__name__} - {str(e)}")
+                rejected = False
+                continue
+            self._text_methods[source_name] = method
+            print(f"テキストソース '{source_name}' の更新に {method} を使います。")
+            return response
+        if rejected:
+            # 通信の失敗ではなくOBSがすべて拒否した場合だけ、使えるリクエストがないと記録する
+            self._text_methods[source_name] = None
+            print(f"テキストソース '{source_name}' を更新できるリクエストがありません。")
+        return None
+    
+    def _candidate_text_methods(self):
+        """接続先のプロトコル（v5かv4か）で使えるリクエストの候補"""
+        legacy = getattr(self.obs, "legacy", None)
+        if legacy is True:
+            return TEXT_UPDATE_METHODS[1:]
+        if legacy is False:
+            return TEXT_UPDATE_METHODS[:1]
+        return TEXT_UPDATE_METHODS
+    
+    def _send_text(self, method, source_name, text):
+        """1つのリクエストでテキストを更新する
+
+        Raises:
+            TextRequestRejected: OBSがリクエストを拒否した場合
+        """
+        if method == "SetInputSettings":
+            request = requests.SetInputSettings(inputName=source_name, inputSettings={"text": text})
+        elif method == "SetTextFreetype2Properties":
+            request = requests.SetTextFreetype2Properties(source=source_name, text=text)
+        else:
+            request = requests.SetSourceSettings(sourceName=source_name, sourceSettings={"text": text})
+        response = self.obs.call(request)
+        if getattr(response, "status", None) is False:
+            raise TextRequestRejected(f"OBSがリクエストを拒否しました ({response.datain})")
+        return response
+    
+    def _probe_text_method(self, source_name):
+        """接続時に、プロトコルとソースの種類から更新に使うリクエストを決める"""
+        legacy = getattr(self.obs, "legacy", None)
+        try:
+            if legacy is False:
+                response = self.obs.call(requests.GetInputSettings(inputName=source_name))
+                if response.status:
+                    self._text_methods[source_name] = "SetInputSettings"
+            elif legacy is True:
+                response = self.obs.call(requests.GetSourceSettings(sourceName=source_name))
+                if response.status:
+                    kind = response.datain.get("sourceType", "")
+                    self._text_methods[source_name] = (
+                        "SetTextFreetype2Properties" if kind.startswith("text_ft2_source")
+                        else "SetSourceSettings"
+                    )
+        except Exception as e:
+            # 決められなければ最初の更新のときに順に試す
+            print(f"テキストソースの種類の確認に失敗: {str(e)}")
+    
+    def _on_source_event(self, event):
+        """ソースの削除・名前の変更が通知されたら、そのソースに記録したリクエストを破棄する"""
+        for key in SOURCE_NAME_KEYS:
+            name = event.datain.get(key)
+            if name in self._text_methods:
+                del self._text_methods[name]
+                print(f"ソース '{name}' が変更されたため、更新に使うリクエストを確認し直します。")
     
     def _log_obs_info(self):
         """OBSの情報をログに出力"""
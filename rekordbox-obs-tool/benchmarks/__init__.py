@@ -0,0 +1,3 @@
+"""
+ベンチマークと、テスト・ベンチマーク用の合成データ（master.db・export.pdb）の生成
+"""
@@ -0,0 +1,235 @@
+import argparse
+import itertools
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from rekordbox_client.rekordbox_client import format_db_timestamp
+
+# 暗号化したデータベースの既定のキー（pyrekordboxがキーとして受け付ける形式）
+SYNTHETIC_KEY = "402fd" + "0" * 59
+
+# 一度に挿入する行数（100万曲規模でもメモリに全行を載せないため）
+INSERT_CHUNK_SIZE = 10000
+
+def _insert_rows(conn: sqlite3.Connection, table: str, rows: List[Dict[str, Any]]) -> None:
+    """
+    NOT NULL制約のある列を既定値で補いながら行を一括挿入する
+
+    Args:
+        conn (sqlite3.Connection): 挿入先の接続
+        table (str): テーブル名
+        rows (List[Dict[str, Any]]): 挿入する行（列名と値の辞書、全行で同じキーを持つ）
+    """
+    if not rows:
+        return
+    given = list(rows[0].keys())
+    defaults = {}
+    for _, name, col_type, not_null, default, _ in conn.execute(f"PRAGMA table_info({table})"):
+        if not_null and default is None and name not in given:
+            defaults[name] = 0 if 'INT' in col_type.upper() or 'FLOAT' in col_type.upper() else ''
+    columns = given + list(defaults.keys())
+    placeholders = ', '.join('?' for _ in columns)
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+        [tuple(row[c] for c in given) + tuple(defaults.values()) for row in rows]
+    )
+
+def _insert_chunked(conn: sqlite3.Connection, table: str, rows: Iterable[Dict[str, Any]]) -> None:
+    """行をINSERT_CHUNK_SIZE件ずつ挿入する"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, INSERT_CHUNK_SIZE))
+        if not chunk:
+            return
+        _insert_rows(conn, table, chunk)
+
+def analysis_data_path(content_id: int) -> str:
+    """曲の解析ファイルのパス（rekordboxと同様にshareディレクトリからの相対パス）"""
+    return f"/PIONEER/USBANLZ/P{content_id % 256:03X}/{content_id:08X}/ANLZ0000.DAT"
+
+# rekordboxのDjmdKeyに登録されるキー名（Seq順）
+KEY_NAMES = [
+    "C", "Am", "G", "Em", "D", "Bm", "A", "F#m", "E", "C#m", "B", "G#m",
+    "F#", "D#m", "Db", "Bbm", "Ab", "Fm", "Eb", "Cm", "Bb", "Gm", "F", "Dm",
+]
+GENRE_NAMES = ["House", "Techno", "Trance", "Drum & Bass", "Hip Hop", "Disco", "Ambient", "Pop"]
+
+def create_synthetic_database(
+    db_path: str,
+    num_tracks: int = 1000,
+    latest_updated_at: Optional[datetime] = None,
+    history_sessions: int = 0,
+    tracks_per_session: int = 20,
+    key: Optional[str] = None
+) -> str:
+    """
+    rekordboxのmaster.dbと同じスキーマを持つ検証用データベースを作成する
+
+    アーティスト・アルバム・ジャンル・キーも作成し、各曲から参照させる。
+    曲の更新時刻とrb_local_usnは1曲ごとに増やし、最後の曲が最も新しくなるようにする。
+    history_sessionsを指定すると、1日1セッションの再生履歴（DjmdHistory/DjmdSongHistory）も作成し、
+    最後のセッションの最後の再生がlatest_updated_atになるようにする。
+
+    Args:
+        db_path (str): 作成するデータベースファイルのパス
+        num_tracks (int): 作成する曲数
+        latest_updated_at (Optional[datetime]): 最新の曲の更新時刻（Noneの場合は現在時刻）
+        history_sessions (int): 作成する再生履歴のセッション数
+        tracks_per_session (int): 1セッションあたりの再生数
+        key (Optional[str]): 指定した場合はこのキーでSQLCipherにより暗号化する
+            （sqlcipher3が必要。pyrekordboxでは "402fd" で始まるキーだけを受け付ける）
+
+    Returns:
+        str: 作成したデータベースファイルのパス
+    """
+    # スキーマ作成にだけSQLAlchemyを使い、大量の行は sqlite3 で直接挿入する
+    from sqlalchemy import create_engine
+    from pyrekordbox.db6 import tables
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    engine = create_engine(f"sqlite:///{db_path}")
+    tables.Base.metadata.create_all(engine)
+    engine.dispose()
+
+    if latest_updated_at is None:
+        latest_updated_at = datetime.now()
+    oldest = latest_updated_at - timedelta(minutes=num_tracks - 1)
+
+    num_artists = max(1, num_tracks // 10)
+    num_albums = max(1, num_tracks // 12)
+    created = format_db_timestamp(oldest)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # 作成中のファイルは捨てても構わないため、ジャーナルと同期を省いて高速に書き込む
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+
+        def lookup_rows(names):
+            return (
+                {"ID": str(i + 1), "Name": name, "created_at": created, "updated_at": created}
+                for i, name in enumerate(names)
+            )
+        _insert_chunked(conn, "djmdArtist", lookup_rows(f"Artist {i + 1}" for i in range(num_artists)))
+        _insert_chunked(conn, "djmdAlbum", lookup_rows(f"Album {i + 1}" for i in range(num_albums)))
+        _insert_rows(conn, "djmdGenre", list(lookup_rows(GENRE_NAMES)))
+        _insert_rows(conn, "djmdKey", [
+            {"ID": str(i + 1), "ScaleName": name, "Seq": i + 1,
+             "created_at": created, "updated_at": created}
+            for i, name in enumerate(KEY_NAMES)
+        ])
+        _insert_chunked(conn, "djmdContent", _content_rows(num_tracks, oldest, num_artists, num_albums))
+        # 実際のmaster.dbと同様にrb_local_usnのインデックスを作成する
+        conn.execute(
+            "CREATE INDEX djmd_content__rb_local_usn__ID ON djmdContent (rb_local_usn, ID)"
+        )
+        if num_tracks:
+            _insert_history(conn, num_tracks, latest_updated_at, history_sessions, tracks_per_session)
+        conn.commit()
+    finally:
+        conn.close()
+
+    if key:
+        _encrypt_database(db_path, key)
+    return db_path
+
+def _content_rows(num_tracks: int, oldest: datetime, num_artists: int,
+                  num_albums: int) -> Iterator[Dict[str, Any]]:
+    """djmdContentの行を1曲ずつ生成する（1分ごとに更新時刻を進める）"""
+    for i in range(num_tracks):
+        timestamp = format_db_timestamp(oldest + timedelta(minutes=i))
+        yield {
+            "ID": str(i + 1), "UUID": f"uuid-{i + 1}", "Title": f"Track {i + 1}",
+            "ArtistID": str(i % num_artists + 1), "AlbumID": str(i % num_albums + 1),
+            "GenreID": str(i % len(GENRE_NAMES) + 1), "KeyID": str(i % len(KEY_NAMES) + 1),
+            "BPM": 12000 + (i % 60) * 10, "Length": 180 + i % 240,
+            "FolderPath": f"/Music/Artist {i % num_artists + 1}/Track {i + 1}.mp3",
+            "AnalysisDataPath": analysis_data_path(i + 1),
+            "rb_local_usn": i + 1, "created_at": timestamp, "updated_at": timestamp
+        }
+
+def _encrypt_database(db_path: str, key: str) -> None:
+    """
+    平文のデータベースをSQLCipherで暗号化したファイルに置き換える
+
+    rekordboxのmaster.dbと同じく、sqlcipher3の既定の設定（SQLCipher 4）で暗号化する。
+    """
+    import sqlcipher3
+
+    encrypted_path = db_path + ".encrypted"
+    if os.path.exists(encrypted_path):
+        os.remove(encrypted_path)
+    conn = sqlcipher3.connect(db_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS encrypted KEY ?", (encrypted_path, key))
+        conn.execute("SELECT sqlcipher_export('encrypted')")
+        conn.execute("DETACH DATABASE encrypted")
+    finally:
+        conn.close()
+    os.replace(encrypted_path, db_path)
+
+def _insert_history(conn: sqlite3.Connection, num_tracks: int, latest: datetime,
+                    num_sessions: int, tracks_per_session: int) -> None:
+    """
+    1日1セッションの再生履歴を作成する
+
+    rb_local_usnは曲の後に続く通し番号とし、再生の記録順に増やす。
+    """
+    conn.execute("CREATE INDEX djmd_song_history__HistoryID ON djmdSongHistory (HistoryID)")
+    conn.execute(
+        "CREATE INDEX djmd_song_history__rb_local_usn__ID ON djmdSongHistory (rb_local_usn, ID)"
+    )
+    def session_plays(s, session_start, first_usn):
+        for t in range(tracks_per_session):
+            play_id = s * tracks_per_session + t + 1
+            played_at = format_db_timestamp(session_start + timedelta(minutes=4 * t))
+            yield {
+                "ID": str(play_id), "HistoryID": str(s + 1),
+                # 曲の選び方は決定的にし、セッション内で重複しにくくする
+                "ContentID": str((play_id * 7919) % num_tracks + 1), "TrackNo": t + 1,
+                "UUID": f"song-history-uuid-{play_id}", "rb_local_usn": first_usn + t,
+                "created_at": played_at, "updated_at": played_at,
+            }
+
+    sessions = []
+    usn = num_tracks
+    for s in range(num_sessions):
+        # 最後のセッションの最後の再生がlatestになるように、古いセッションから作成する
+        session_end = latest - timedelta(days=num_sessions - 1 - s)
+        session_start = session_end - timedelta(minutes=4 * (tracks_per_session - 1))
+        history_id = str(s + 1)
+        usn += 1
+        sessions.append({
+            "ID": history_id, "Seq": s + 1, "Name": session_start.strftime('%Y-%m-%d'),
+            "Attribute": 0, "DateCreated": session_start.strftime('%Y-%m-%d'),
+            "UUID": f"history-uuid-{history_id}", "rb_local_usn": usn,
+            "created_at": format_db_timestamp(session_start),
+            "updated_at": format_db_timestamp(session_end),
+        })
+        _insert_chunked(conn, "djmdSongHistory", session_plays(s, session_start, usn + 1))
+        usn += tracks_per_session
+    _insert_rows(conn, "djmdHistory", sessions)
+
+def main(argv=None) -> int:
+    """検証用データベースを作成するコマンド"""
+    parser = argparse.ArgumentParser(description="rekordboxのmaster.dbと同じスキーマの検証用データベースを作成する")
+    parser.add_argument("db_path", help="作成するデータベースファイルのパス")
+    parser.add_argument("num_tracks", nargs="?", type=int, default=1000, help="曲数（既定: 1000）")
+    parser.add_argument("--sessions", type=int, default=0, help="再生履歴のセッション数")
+    parser.add_argument("--tracks-per-session", type=int, default=20, help="1セッションあたりの再生数")
+    parser.add_argument("--encrypt", action="store_true", help="SQLCipherで暗号化する")
+    parser.add_argument("--key", default=SYNTHETIC_KEY, help="暗号化に使うキー（--encrypt指定時）")
+    args = parser.parse_args(argv)
+
+    path = create_synthetic_database(
+        args.db_path, args.num_tracks, history_sessions=args.sessions,
+        tracks_per_session=args.tracks_per_session, key=args.key if args.encrypt else None
+    )
+    print(f"Synthetic database created: {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import argparse
+import os
+import struct
+import sys
+from typing import Dict, Iterator, List
+from rekordbox_client.device_library import (
+    FILE_HEADER, PAGE_HEADER, ROW_GROUP_SIZE, ROWS_PER_GROUP, TABLE_ALBUMS, TABLE_ARTISTS,
+    TABLE_GENRES, TABLE_HISTORY_ENTRIES, TABLE_HISTORY_PLAYLISTS, TABLE_KEYS, TABLE_POINTER,
+    TABLE_TRACKS, TRACK_STRING_ANALYZE_PATH, TRACK_STRING_COMMENT, TRACK_STRING_FILE_PATH, TRACK_STRING_TITLE,
+)
+from .synthetic_db import GENRE_NAMES, KEY_NAMES, analysis_data_path
+
+# rekordboxがエクスポートするexport.pdbのページサイズ
+PAGE_SIZE = 4096
+
+# 行を持つページと持たないページのフラグ
+_PAGE_FLAGS_DATA = 0x34
+_PAGE_FLAGS_EMPTY = 0x64
+
+# 曲の行の固定部分（文字列の位置の配列まで）
+_TRACK_ROW = struct.Struct('<HHIIIIIHHIIIIIIIIIIIIHHHHHHBBHH21H')
+_ARTIST_ROW = struct.Struct('<HHIBB')
+_ALBUM_ROW = struct.Struct('<HHIIIIBB')
+
+# テーブルの並び（ファイルヘッダーのテーブルの位置もこの順に並べる）
+_TABLE_ORDER = [
+    TABLE_TRACKS, TABLE_GENRES, TABLE_ARTISTS, TABLE_ALBUMS, TABLE_KEYS,
+    TABLE_HISTORY_PLAYLISTS, TABLE_HISTORY_ENTRIES,
+]
+
+def encode_string(value: str) -> bytes:
+    """DeviceSQLの文字列に変換する（短いASCII、長いASCII、UTF-16LEのいずれか）"""
+    try:
+        data = value.encode('ascii')
+    except UnicodeEncodeError:
+        data = value.encode('utf-16-le')
+        return struct.pack('<BHx', 0x90, len(data) + 4) + data
+    if len(data) + 1 < 0x80:
+        return bytes([(len(data) + 1) << 1 | 1]) + data
+    return struct.pack('<BHx', 0x40, len(data) + 4) + data
+
+def create_synthetic_export(
+    path: str,
+    num_tracks: int = 1000,
+    history_sessions: int = 0,
+    tracks_per_session: int = 20,
+    title_format: str = "Track {}"
+) -> str:
+    """
+    CDJ向けにエクスポートしたexport.pdbと同じ形式の検証用ファイルを作成する
+
+    曲・アーティスト・アルバム・ジャンル・キーは合成master.db（synthetic_db）と同じ値にする。
+    history_sessionsを指定すると、メディアの再生履歴（履歴プレイリストとその曲）も作成する。
+
+    Args:
+        path (str): 作成するexport.pdbのパス
+        num_tracks (int): 作成する曲数
+        history_sessions (int): 作成する履歴プレイリストの数
+        tracks_per_session (int): 1つの履歴プレイリストあたりの曲数
+        title_format (str): 曲名の書式（曲番号で埋める）
+
+    Returns:
+        str: 作成したファイルのパス
+    """
+    num_artists = max(1, num_tracks // 10)
+    num_albums = max(1, num_tracks // 12)
+    tables: Dict[int, Iterator[bytes]] = {
+        TABLE_TRACKS: _track_rows(num_tracks, num_artists, num_albums, title_format),
+        TABLE_GENRES: (
+            struct.pack('<I', i + 1) + encode_string(name) for i, name in enumerate(GENRE_NAMES)
+        ),
+        TABLE_ARTISTS: (
+            _ARTIST_ROW.pack(0x60, (i << 5) & 0xffff, i + 1, 0x03, _ARTIST_ROW.size)
+            + encode_string(f"Artist {i + 1}")
+            for i in range(num_artists)
+        ),
+        TABLE_ALBUMS: (
+            _ALBUM_ROW.pack(0x80, (i << 5) & 0xffff, 0, 0, i + 1, 0, 0x03, _ALBUM_ROW.size)
+            + encode_string(f"Album {i + 1}")
+            for i in range(num_albums)
+        ),
+        TABLE_KEYS: (
+            struct.pack('<II', i + 1, i + 1) + encode_string(name) for i, name in enumerate(KEY_NAMES)
+        ),
+        TABLE_HISTORY_PLAYLISTS: (
+            struct.pack('<I', s + 1) + encode_string(f"HISTORY {s + 1:03d}")
+            for s in range(history_sessions if num_tracks else 0)
+        ),
+        TABLE_HISTORY_ENTRIES: (
+            struct.pack('<3I', (s * tracks_per_session + k) % num_tracks + 1, s + 1, k + 1)
+            for s in range(history_sessions if num_tracks else 0)
+            for k in range(tracks_per_session)
+        ),
+    }
+
+    pages: List[bytes] = [b'']
+    pointers = []
+    for table_type in _TABLE_ORDER:
+        first = len(pages)
+        for data in _pack_pages(table_type, list(tables[table_type]), first):
+            pages.append(data)
+        last = len(pages) - 1
+        pointers.append((table_type, last + 1, first, last))
+
+    header = FILE_HEADER.pack(0, PAGE_SIZE, len(pointers), len(pages), 5, 1, 0)
+    header += b''.join(TABLE_POINTER.pack(*pointer) for pointer in pointers)
+    pages[0] = header.ljust(PAGE_SIZE, b'\x00')
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        for data in pages:
+            f.write(data)
+    return path
+
+def _track_rows(num_tracks: int, num_artists: int, num_albums: int,
+                title_format: str) -> Iterator[bytes]:
+    """曲の行を1曲ずつ生成する（21個の文字列は固定部分の後ろに続けて置く）"""
+    empty = encode_string('')
+    for i in range(num_tracks):
+        strings = [empty] * 21
+        strings[TRACK_STRING_TITLE] = encode_string(title_format.format(i + 1))
+        strings[TRACK_STRING_COMMENT] = encode_string(f"Comment {i + 1}")
+        strings[TRACK_STRING_ANALYZE_PATH] = encode_string(analysis_data_path(i + 1))
+        strings[TRACK_STRING_FILE_PATH] = encode_string(
+            f"/Contents/Artist {i % num_artists + 1}/Track {i + 1}.mp3"
+        )
+        offsets = []
+        position = _TRACK_ROW.size
+        for data in strings:
+            offsets.append(position)
+            position += len(data)
+        fixed = _TRACK_ROW.pack(
+            0x24, (i << 5) & 0xffff, 0x000c0700, 44100, 0, 8_000_000, 0, 0, 0, 0,
+            i % len(KEY_NAMES) + 1, 0, 0, 0, 320, i + 1, 12000 + (i % 60) * 10,
+            i % len(GENRE_NAMES) + 1, i % num_albums + 1, i % num_artists + 1, i + 1,
+            1, i % 10, 2024, 16, 180 + i % 240, 0x29, 0, i % 6, 1, 0, *offsets
+        )
+        yield fixed + b''.join(strings)
+
+def _pack_pages(table_type: int, rows: List[bytes], first_page: int) -> Iterator[bytes]:
+    """行をページに詰める（行は先頭から、行の位置の索引はページの末尾から並べる）"""
+    capacity = PAGE_SIZE - PAGE_HEADER.size
+    pages = []
+    current: List[bytes] = []
+    used = 0
+    for row in rows:
+        row = row.ljust((len(row) + 3) // 4 * 4, b'\x00')
+        groups = len(current) // ROWS_PER_GROUP + 1
+        if current and used + len(row) + groups * ROW_GROUP_SIZE > capacity:
+            pages.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += len(row)
+    if current or not pages:
+        pages.append(current)
+
+    for n, page_rows in enumerate(pages):
+        index = first_page + n
+        next_page = index + 1
+        heap = b''.join(page_rows)
+        flags = _PAGE_FLAGS_DATA if page_rows else _PAGE_FLAGS_EMPTY
+        num_groups = (len(page_rows) + ROWS_PER_GROUP - 1) // ROWS_PER_GROUP
+        header = PAGE_HEADER.pack(
+            0, index, table_type, next_page, 1, 0, len(page_rows), 0, 0, flags,
+            capacity - len(heap) - num_groups * ROW_GROUP_SIZE, len(heap), 1, 0, 0, 0
+        )
+        page = bytearray(header + heap)
+        page.extend(b'\x00' * (PAGE_SIZE - len(page)))
+        offset = 0
+        for k, row in enumerate(page_rows):
+            group_end = PAGE_SIZE - (k // ROWS_PER_GROUP) * ROW_GROUP_SIZE
+            slot = k % ROWS_PER_GROUP
+            struct.pack_into('<H', page, group_end - 6 - 2 * slot, offset)
+            present = struct.unpack_from('<H', page, group_end - 4)[0]
+            struct.pack_into('<H', page, group_end - 4, present | 1 << slot)
+            offset += len(row)
+        yield bytes(page)
+
+def main(argv=None) -> int:
+    """検証用export.pdbを作成するコマンド"""
+    parser = argparse.ArgumentParser(description="CDJ向けエクスポートと同じ形式の検証用export.pdbを作成する")
+    parser.add_argument("path", help="作成するexport.pdbのパス")
+    parser.add_argument("num_tracks", nargs="?", type=int, default=1000, help="曲数（既定: 1000）")
+    parser.add_argument("--sessions", type=int, default=0, help="履歴プレイリストの数")
+    parser.add_argument("--tracks-per-session", type=int, default=20, help="1つの履歴あたりの曲数")
+    args = parser.parse_args(argv)
+
+    path = create_synthetic_export(
+        args.path, args.num_tracks, history_sessions=args.sessions,
+        tracks_per_session=args.tracks_per_session
+    )
+    print(f"Synthetic export created: {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
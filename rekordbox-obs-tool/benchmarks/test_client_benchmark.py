@@ -0,0 +1,196 @@
+import importlib.util
+import os
+import sqlite3
+import time
+import tracemalloc
+import logging
+from datetime import datetime, timedelta
+from statistics import median
+
+from rekordbox_client.key_provider import DatabaseKeyProvider
+from rekordbox_client.rekordbox_client import RekordboxClient, format_db_timestamp
+from benchmarks.synthetic_db import SYNTHETIC_KEY, _insert_rows, create_synthetic_database
+
+# ベンチマーク対象のライブラリサイズ（BENCH_LIBRARY_SIZESで上書き可能、例: "1000,100000,1000000"）
+LIBRARY_SIZES = [int(n) for n in os.getenv("BENCH_LIBRARY_SIZES", "1000,10000,100000").split(",")]
+# 再生履歴のセッション数と1セッションあたりの再生数
+HISTORY_SESSIONS = int(os.getenv("BENCH_HISTORY_SESSIONS", "100"))
+TRACKS_PER_SESSION = 30
+ROUNDS = 20
+CONNECT_ROUNDS = 5
+HISTORY_LIMIT = 100
+FORMAT_ROWS = 2000
+
+SQLCIPHER_AVAILABLE = importlib.util.find_spec("sqlcipher3") is not None
+
+def _touch_track(db_path, content_id, usn):
+    """rekordboxによる曲の更新（タグの編集や解析）を再現する"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            "UPDATE djmdContent SET updated_at = ?, rb_local_usn = ? WHERE ID = ?",
+            (format_db_timestamp(datetime.now() + timedelta(minutes=1)), usn, content_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def _legacy_poll(client):
+    """全曲を読み込んでPython側でソートする従来の方式"""
+    content = client.db.get_content().all()
+    return max(content, key=lambda track: track.updated_at)
+
+def _record_play(db_path, content_id, minutes):
+    """rekordboxによる再生履歴の記録を再現する"""
+    conn = sqlite3.connect(db_path)
+    try:
+        usn = conn.execute("SELECT MAX(rb_local_usn) FROM djmdSongHistory").fetchone()[0]
+        history_id, track_no = conn.execute(
+            "SELECT HistoryID, TrackNo FROM djmdSongHistory WHERE rb_local_usn = ?", (usn,)
+        ).fetchone()
+        played_at = format_db_timestamp(datetime.now() + timedelta(minutes=minutes))
+        _insert_rows(conn, "djmdSongHistory", [{
+            "ID": f"bench-{usn + 1}", "HistoryID": history_id, "ContentID": content_id,
+            "TrackNo": track_no + 1, "UUID": f"bench-uuid-{usn + 1}", "rb_local_usn": usn + 1,
+            "created_at": played_at, "updated_at": played_at,
+        }])
+        conn.commit()
+    finally:
+        conn.close()
+
+def _timed(func, rounds=ROUNDS):
+    """funcをrounds回実行し、所要時間の中央値（ミリ秒）と最後の戻り値を返す"""
+    durations = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return median(durations), result
+
+def _peak_memory(func):
+    """funcの実行中に確保されたメモリのピーク（KiB）を返す"""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+def _connect_time(db_path, key=None, key_provider_factory=None):
+    """接続（暗号化されている場合は復号の確認まで）にかかる時間の中央値（ミリ秒）
+
+    Args:
+        key_provider_factory: 接続ごとにDatabaseKeyProviderを作成する関数（Noneの場合は使わない）
+    """
+    durations = []
+    for _ in range(CONNECT_ROUNDS):
+        provider = key_provider_factory() if key_provider_factory else None
+        client = RekordboxClient(db_path=db_path, key=key, unlock=key is not None or provider is not None,
+                                 key_provider=provider)
+        assert client.connect()
+        durations.append(client.connection_stats['last_duration'] * 1000)
+        client.close()
+    return median(durations)
+
+def _cold_provider(cache_path):
+    """キャッシュを消したDatabaseKeyProvider（毎回キーの取得と鍵導出から行う）"""
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    return DatabaseKeyProvider(cache_path, discover=lambda: SYNTHETIC_KEY, persist=True)
+
+def measure(db_path, num_tracks):
+    """1つのデータベースに対する各処理の時間とメモリを計測する"""
+    results = {"connect": _connect_time(db_path)}
+
+    client = RekordboxClient(db_path=db_path, unlock=False)
+    client.connect()
+    try:
+        start = time.perf_counter()
+        client.get_current_track()
+        results["first"] = (time.perf_counter() - start) * 1000
+        results["idle"], _ = _timed(client.get_current_track)
+
+        edits = []
+        for i in range(ROUNDS):
+            _touch_track(db_path, str(i % num_tracks + 1), num_tracks + i + 1)
+            start = time.perf_counter()
+            client.get_current_track()
+            edits.append((time.perf_counter() - start) * 1000)
+        results["edit"] = median(edits)
+
+        changes = []
+        for i in range(ROUNDS):
+            _record_play(db_path, str(i % num_tracks + 1), minutes=i + 1)
+            start = time.perf_counter()
+            client.get_current_track()
+            changes.append((time.perf_counter() - start) * 1000)
+        results["change"] = median(changes)
+
+        results["history"], history = _timed(lambda: client.get_history(limit=HISTORY_LIMIT, days=3650))
+        assert len(history) == min(HISTORY_LIMIT, HISTORY_SESSIONS * TRACKS_PER_SESSION + ROUNDS)
+        results["session"], _ = _timed(client.get_session_history)
+
+        # 整形のみの時間（1行あたりのマイクロ秒）
+        from rekordbox_client import formatter, queries
+        rows = queries.recent_plays(client.db, FORMAT_ROWS)
+        format_ms, _ = _timed(lambda: formatter.format_rows(rows))
+        results["format_us"] = format_ms * 1000 / len(rows)
+
+        results["legacy"], _ = _timed(lambda: _legacy_poll(client), rounds=1)
+        results["history_kib"] = _peak_memory(lambda: client.get_history(limit=HISTORY_LIMIT, days=3650))
+        results["poll_kib"] = _peak_memory(client.get_current_track)
+    finally:
+        client.close()
+    return results
+
+def test_client_benchmark(tmp_path):
+    """ライブラリサイズごとにRekordboxClientの主要な処理を計測する"""
+    logging.disable(logging.CRITICAL)
+    try:
+        results = {}
+        print("\nRekordboxClient ベンチマーク（ミリ秒は中央値、メモリはピーク）")
+        print(f"{'tracks':>8} {'connect':>9} {'first':>8} {'idle':>8} {'edit':>8} {'change':>8} "
+              f"{'legacy':>9} {'history':>9} {'session':>9} {'fmt(us)':>8} {'hist KiB':>9} {'poll KiB':>9}")
+        for num_tracks in LIBRARY_SIZES:
+            db_path = create_synthetic_database(
+                str(tmp_path / f"master_{num_tracks}.db"), num_tracks,
+                history_sessions=HISTORY_SESSIONS, tracks_per_session=TRACKS_PER_SESSION
+            )
+            r = results[num_tracks] = measure(db_path, num_tracks)
+            print(f"{num_tracks:>8} {r['connect']:>9.2f} {r['first']:>8.2f} {r['idle']:>8.2f} "
+                  f"{r['edit']:>8.2f} {r['change']:>8.2f} {r['legacy']:>9.2f} {r['history']:>9.2f} "
+                  f"{r['session']:>9.2f} {r['format_us']:>8.1f} {r['history_kib']:>9.0f} {r['poll_kib']:>9.0f}")
+
+        if SQLCIPHER_AVAILABLE:
+            db_path = create_synthetic_database(
+                str(tmp_path / "encrypted.db"), min(LIBRARY_SIZES), key=SYNTHETIC_KEY
+            )
+            print(f"SQLCipher connect ({min(LIBRARY_SIZES)} tracks): "
+                  f"{_connect_time(db_path, key=SYNTHETIC_KEY):.2f} ms")
+
+            # コールド：キーのキャッシュが空の状態から（キーの取得と鍵導出を含む）
+            # ウォーム：キャッシュした導出済みの暗号鍵で接続
+            cache_path = str(tmp_path / "keys.json")
+            cold = _connect_time(db_path, key_provider_factory=lambda: _cold_provider(cache_path))
+            warm = _connect_time(db_path, key_provider_factory=lambda: DatabaseKeyProvider(
+                cache_path, discover=lambda: SYNTHETIC_KEY, persist=True))
+            print(f"SQLCipher connect with key cache: cold {cold:.2f} ms, warm {warm:.2f} ms")
+            assert warm < cold
+    finally:
+        logging.disable(logging.NOTSET)
+
+    # ポーリングと履歴の取得はライブラリサイズに依存しないこと
+    smallest, largest = results[min(LIBRARY_SIZES)], results[max(LIBRARY_SIZES)]
+    assert largest["idle"] < max(smallest["idle"] * 5, 2.0)
+    assert largest["edit"] < max(smallest["edit"] * 5, 20.0)
+    assert largest["change"] < max(smallest["change"] * 5, 20.0)
+    assert largest["history"] < max(smallest["history"] * 5, 50.0)
+    assert largest["session"] < max(smallest["session"] * 5, 50.0)
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_client_benchmark(Path(tmp_dir))
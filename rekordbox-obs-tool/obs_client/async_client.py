@@ -0,0 +1,344 @@
+"""
+asyncioによるOBS WebSocket（v5）クライアント
+
+obswebsocket.obsws.callは応答が届くまで呼び出し元をブロックし、リクエストは実質1つずつしか送れない。
+AsyncOBSClientはリクエストIDで応答を照合するため、複数のリクエストを応答を待たずに続けて送れる
+（応答は届いた順に、それぞれのリクエストの待ち手に渡す）。タイムアウトはリクエストごとに指定でき、
+OBSが混んでいて1つの応答が遅れても、他のリクエストは待たされない。
+
+PipelinedObsWsはAsyncOBSClientをバックグラウンドのイベントループで動かし、obswsと同じ同期の
+インターフェース（call / call_batch / register）を提供する。OBSManagerなど既存の呼び出し側は
+そのまま使え、call_asyncを使えば応答を待たずに次の処理に進める。
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import Future
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import websockets
+from obswebsocket import events, exceptions
+
+# obs-websocket v5のRPCバージョンと、購読するイベント（EventSubscription::All）
+RPC_VERSION = 1
+EVENT_SUBSCRIPTIONS_ALL = 1023
+
+# メッセージの種類（op）
+OP_HELLO = 0
+OP_IDENTIFY = 1
+OP_IDENTIFIED = 2
+OP_EVENT = 5
+OP_REQUEST = 6
+OP_REQUEST_RESPONSE = 7
+OP_REQUEST_BATCH = 8
+OP_REQUEST_BATCH_RESPONSE = 9
+
+class OBSRequestError(Exception):
+    """OBSがリクエストを拒否した"""
+
+    def __init__(self, request_type: str, code: Optional[int], comment: Optional[str]):
+        super().__init__(f"{request_type} が拒否されました (code={code}): {comment or ''}")
+        self.request_type = request_type
+        self.code = code
+        self.comment = comment
+
+def auth_string(password: str, salt: str, challenge: str) -> str:
+    """obs-websocket v5の認証文字列を作成する"""
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode()).digest())
+    return base64.b64encode(hashlib.sha256(secret + challenge.encode()).digest()).decode()
+
+class AsyncOBSClient:
+    """リクエストを応答を待たずに続けて送れるOBS WebSocketクライアント"""
+
+    def __init__(self, host: str = 'localhost', port: int = 4455, password: str = '',
+                 timeout: float = 5.0,
+                 on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                 on_disconnect: Optional[Callable[[], None]] = None):
+        """
+        Args:
+            host (str): OBSのホスト名
+            port (int): OBS WebSocketのポート
+            password (str): OBS WebSocketのパスワード
+            timeout (float): リクエストの既定のタイムアウト（秒）
+            on_event (Optional[Callable[[str, Dict[str, Any]], None]]): イベントを受け取る関数
+                （イベントの種類, イベントのデータ）。イベントループのスレッドで呼ばれる
+            on_disconnect (Optional[Callable[[], None]]): 接続が切れたときに呼ばれる関数
+        """
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.on_event = on_event
+        self.on_disconnect = on_disconnect
+        self.logger = logging.getLogger(__name__)
+        self._ws = None
+        self._receiver: Optional[asyncio.Task] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+
+    @property
+    def connected(self) -> bool:
+        return self._receiver is not None and not self._receiver.done()
+
+    @property
+    def pending_requests(self) -> int:
+        """応答を待っているリクエストの数"""
+        return len(self._pending)
+
+    async def connect(self) -> None:
+        """OBSに接続して認証する"""
+        self._ws = await websockets.connect(
+            f"ws://{self.host}:{self.port}", subprotocols=['obswebsocket.json'], max_size=None,
+            close_timeout=self.timeout
+        )
+        try:
+            hello = json.loads(await asyncio.wait_for(self._ws.recv(), self.timeout))
+            if hello.get('op') != OP_HELLO:
+                raise exceptions.ConnectionFailure("Invalid Hello message.")
+            identify = {'rpcVersion': RPC_VERSION, 'eventSubscriptions': EVENT_SUBSCRIPTIONS_ALL}
+            authentication = hello['d'].get('authentication')
+            if authentication:
+                identify['authentication'] = auth_string(
+                    self.password, authentication['salt'], authentication['challenge']
+                )
+            await self._ws.send(json.dumps({'op': OP_IDENTIFY, 'd': identify}))
+            identified = json.loads(await asyncio.wait_for(self._ws.recv(), self.timeout))
+            if identified.get('op') != OP_IDENTIFIED:
+                raise exceptions.ConnectionFailure("Invalid Identified message.")
+        except (asyncio.TimeoutError, websockets.ConnectionClosed, ValueError, KeyError) as e:
+            await self._ws.close()
+            raise exceptions.ConnectionFailure(f"認証に失敗しました: {type(e).__name__} {str(e)}")
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    async def close(self) -> None:
+        """接続を閉じる（応答を待っているリクエストはConnectionErrorで失敗する）"""
+        if self._ws is not None:
+            await self._ws.close()
+        if self._receiver is not None:
+            await asyncio.gather(self._receiver, return_exceptions=True)
+
+    async def call(self, request_type: str, data: Optional[Dict[str, Any]] = None,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+        """リクエストを送り、応答のデータを返す
+
+        Raises:
+            OBSRequestError: OBSがリクエストを拒否した場合
+            asyncio.TimeoutError: タイムアウトまでに応答がなかった場合
+            ConnectionError: 接続していないか、応答の前に接続が切れた場合
+        """
+        response = await self._request(OP_REQUEST, {
+            'requestType': request_type, 'requestData': data or {},
+        }, timeout)
+        status = response.get('requestStatus', {})
+        if not status.get('result'):
+            raise OBSRequestError(request_type, status.get('code'), status.get('comment'))
+        return response.get('responseData') or {}
+
+    async def call_batch(self, requests: Sequence[Tuple[str, Dict[str, Any]]],
+                         halt_on_failure: bool = False,
+                         timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """複数のリクエストを1つのRequestBatchとして送る
+
+        Args:
+            requests (Sequence[Tuple[str, Dict[str, Any]]]): (リクエストの種類, データ)
+            halt_on_failure (bool): 失敗したリクエストの後のリクエストを実行しない
+            timeout (Optional[float]): タイムアウト（秒）
+
+        Returns:
+            List[Dict[str, Any]]: リクエストの順の結果（requestStatusとresponseData）。
+                実行されなかったリクエストはNone
+        """
+        response = await self._request(OP_REQUEST_BATCH, {
+            'haltOnFailure': halt_on_failure,
+            'executionType': 0,
+            'requests': [
+                {'requestType': request_type, 'requestId': str(i), 'requestData': data or {}}
+                for i, (request_type, data) in enumerate(requests)
+            ],
+        }, timeout)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        for result in response.get('results', []):
+            index = int(result.get('requestId', -1))
+            if 0 <= index < len(results):
+                results[index] = result
+        return results
+
+    async def _request(self, op: int, data: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        if not self.connected:
+            raise ConnectionError("OBSに接続されていません")
+        request_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._ws.send(json.dumps({'op': op, 'd': dict(data, requestId=request_id)}))
+            return await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+        except websockets.ConnectionClosed as e:
+            raise ConnectionError(f"OBSとの接続が切れました: {str(e)}")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _receive(self) -> None:
+        """応答をリクエストIDで待ち手に渡し、イベントを通知する"""
+        try:
+            async for message in self._ws:
+                try:
+                    result = json.loads(message)
+                    op, data = result['op'], result.get('d', {})
+                except (ValueError, KeyError, TypeError):
+                    self.logger.warning(f"不正なメッセージを無視します: {message!r}")
+                    continue
+                if op in (OP_REQUEST_RESPONSE, OP_REQUEST_BATCH_RESPONSE):
+                    future = self._pending.get(data.get('requestId'))
+                    if future is not None and not future.done():
+                        future.set_result(data)
+                elif op == OP_EVENT and self.on_event is not None:
+                    try:
+                        self.on_event(data.get('eventType'), data.get('eventData', {}))
+                    except Exception as e:
+                        self.logger.error(f"イベントの処理でのエラー: {type(e).__name__} - {str(e)}")
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("OBSとの接続が切れました"))
+            if self.on_disconnect is not None:
+                self.on_disconnect()
+
+class PipelinedObsWs:
+    """AsyncOBSClientをバックグラウンドのイベントループで動かす、obsws互換の同期クライアント
+
+    リクエストにはobswebsocket.requestsのオブジェクトを使い、obsws.callと同様に
+    応答（datainとstatus）を設定して返す。登録したイベントの関数はイベントループのスレッドで呼ばれる。
+    """
+
+    legacy = False
+
+    def __init__(self, host: str = 'localhost', port: int = 4455, password: str = '',
+                 timeout: float = 5.0, on_disconnect: Optional[Callable[[], None]] = None):
+        self.client = AsyncOBSClient(host, port, password, timeout,
+                                     on_event=self._dispatch_event, on_disconnect=on_disconnect)
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._handlers: List[Tuple[Callable, Any]] = []
+
+    @property
+    def connected(self) -> bool:
+        return self._loop is not None and self.client.connected
+
+    def connect(self) -> None:
+        """イベントループを開始してOBSに接続する"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name='PipelinedObsWs', daemon=True
+            )
+            self._thread.start()
+        try:
+            # タイムアウトはイベントループの中で処理し、後始末が終わってから戻る
+            self._submit(self._connect()).result()
+        except Exception:
+            self._stop_loop()
+            raise
+
+    def disconnect(self) -> None:
+        """接続を閉じてイベントループを停止する"""
+        if self._loop is None:
+            return
+        try:
+            self._submit(self.client.close()).result(self.timeout)
+        finally:
+            self._stop_loop()
+
+    def call(self, obj, timeout: Optional[float] = None):
+        """リクエストを送り、応答を設定したリクエストを返す（obsws.callと同じ）"""
+        return self.call_async(obj, timeout).result()
+
+    def call_async(self, obj, timeout: Optional[float] = None) -> Future:
+        """リクエストを送り、応答を待たずにFutureを返す（結果は応答を設定したリクエスト）"""
+        return self._submit(self._call(obj, timeout))
+
+    def call_batch(self, objs: Sequence, halt_on_failure: bool = False,
+                   timeout: Optional[float] = None) -> List:
+        """複数のリクエストを1つのRequestBatchとして送る（BatchObsWs.call_batchと同じ）"""
+        results = self._submit(self.client.call_batch(
+            [(obj.name, obj.data()) for obj in objs], halt_on_failure, timeout
+        )).result()
+        for obj, result in zip(objs, results):
+            if result is not None:
+                obj.input(result.get('responseData') or {}, result['requestStatus']['result'])
+        return list(objs)
+
+    def register(self, func: Callable, event=None) -> None:
+        """イベントを受け取る関数を登録する（eventはobswebsocket.eventsのクラス）"""
+        self._handlers.append((func, event))
+
+    def unregister(self, func: Callable, event=None) -> None:
+        self._handlers = [
+            (f, e) for f, e in self._handlers if not (f == func and (event is None or e == event))
+        ]
+
+    async def _connect(self) -> None:
+        """timeout * 2 秒で接続を諦め、途中まで開いたソケットを閉じ終えてから例外を送出する
+
+        接続の処理を取り消さずにイベントループを止めると、処理中のタスクやソケットが残る。
+        """
+        try:
+            await asyncio.wait_for(self.client.connect(), self.timeout * 2)
+        except BaseException:
+            await self.client.close()
+            raise
+
+    async def _call(self, obj, timeout: Optional[float]):
+        try:
+            obj.input(await self.client.call(obj.name, obj.data(), timeout), True)
+        except OBSRequestError:
+            obj.input({}, False)
+        except asyncio.TimeoutError:
+            raise exceptions.MessageTimeout(f"No answer for {obj.name}")
+        return obj
+
+    def _submit(self, coroutine) -> Future:
+        if self._loop is None:
+            coroutine.close()
+            raise ConnectionError("OBSに接続されていません")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _dispatch_event(self, event_type: str, data: Dict[str, Any]) -> None:
+        try:
+            event = getattr(events, event_type)()
+        except (AttributeError, TypeError):
+            return
+        event.input(data)
+        for func, trigger in list(self._handlers):
+            if trigger is None or isinstance(event, trigger):
+                func(event)
+
+    async def _drain(self) -> None:
+        """残ったタスク（ソケットを閉じる処理など）をtimeout秒まで待ち、終わらなければ取り消す"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=self.timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _stop_loop(self) -> None:
+        loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._thread is not None and self._thread is not threading.current_thread():
+            try:
+                asyncio.run_coroutine_threadsafe(self._drain(), loop).result(self.timeout * 2)
+            except Exception as e:
+                self.client.logger.debug(f"イベントループの後始末でのエラー: {type(e).__name__} - {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.timeout)
+        self._thread = None
+        loop.close()
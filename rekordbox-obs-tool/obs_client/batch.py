@@ -0,0 +1,108 @@
+"""
+obs-websocket v5 のRequestBatch
+
+obs-websocket-py 1.0 は1リクエストずつ（op 6）しか送れず、受信スレッドはバッチの応答（op 9）を
+捨ててしまう。BatchObsWsはobswsを拡張し、複数のリクエストを1つのRequestBatch（op 8）として送り、
+1回の往復でまとめて応答を受け取る。
+
+バッチの応答は、受信スレッドが読み取るソケットの手前で通常の応答（op 7）の形に変換し、
+obsws.callと同じ仕組み（リクエストIDごとの待ち合わせ）で呼び出し元に渡す。
+"""
+from typing import List, Optional, Sequence
+import json
+import re
+import threading
+from obswebsocket import obsws, exceptions
+
+# RequestBatchの実行方法（SerialRealtime：受け取った順に続けて実行する）
+EXECUTION_SERIAL_REALTIME = 0
+
+_BATCH_RESPONSE = re.compile(r'"op"\s*:\s*9\b')
+
+class BatchNotSupported(Exception):
+    """接続先がRequestBatchに対応していない（obs-websocket v4）"""
+
+class BatchResponseAdapter:
+    """WebSocketの受信を仲介し、バッチの応答（op 9）を通常の応答（op 7）に変換する"""
+
+    def __init__(self, ws):
+        self._ws = ws
+
+    def recv(self):
+        message = self._ws.recv()
+        if not message or not _BATCH_RESPONSE.search(message):
+            return message
+        try:
+            result = json.loads(message)
+        except ValueError:
+            return message
+        if not isinstance(result, dict) or result.get('op') != 9:
+            return message
+        data = result.get('d', {})
+        return json.dumps({
+            'op': 7,
+            'd': {
+                'requestId': data.get('requestId'),
+                'requestType': 'RequestBatch',
+                'requestStatus': {'result': True, 'code': 100},
+                'responseData': {'results': data.get('results', [])},
+            }
+        })
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+class BatchObsWs(obsws):
+    """RequestBatchを送れるobsws"""
+
+    def _auth(self):
+        super()._auth()
+        # 受信スレッドはこの後に作成され、self.wsから読み取る
+        self.ws = BatchResponseAdapter(self.ws)
+
+    def call_batch(self, objs: Sequence, halt_on_failure: bool = False,
+                   timeout: Optional[float] = None) -> List:
+        """複数のリクエストを1つのRequestBatchとして送る
+
+        Args:
+            objs (Sequence): obswebsocket.requestsのリクエスト
+            halt_on_failure (bool): 失敗したリクエストの後のリクエストを実行しない
+            timeout (Optional[float]): 応答を待つ秒数（Noneの場合は接続の既定値）
+
+        Returns:
+            List: 応答を設定したリクエスト（実行されなかったリクエストのstatusはNoneのまま）
+
+        Raises:
+            BatchNotSupported: obs-websocket v4に接続している場合
+            exceptions.MessageTimeout: 応答がなかった場合
+        """
+        if self.legacy:
+            raise BatchNotSupported("RequestBatchにはobs-websocket v5が必要です")
+        message_id = str(self.id)
+        self.id += 1
+        event = threading.Event()
+        self.events[message_id] = event
+        payload = {
+            'op': 8,
+            'd': {
+                'requestId': message_id,
+                'haltOnFailure': halt_on_failure,
+                'executionType': EXECUTION_SERIAL_REALTIME,
+                'requests': [
+                    {'requestType': obj.name, 'requestId': str(i), 'requestData': obj.data()}
+                    for i, obj in enumerate(objs)
+                ],
+            }
+        }
+        self.ws.send(json.dumps(payload))
+
+        event.wait(self.timeout if timeout is None else timeout)
+        self.events.pop(message_id)
+        if message_id not in self.answers:
+            raise exceptions.MessageTimeout(f"バッチ {message_id} の応答がありません")
+        answer = self.answers.pop(message_id)
+        for result in answer.get('responseData', {}).get('results', []):
+            index = int(result.get('requestId', -1))
+            if 0 <= index < len(objs):
+                objs[index].input(result.get('responseData', {}), result['requestStatus']['result'])
+        return list(objs)
@@ -1,5 +1,25 @@
-from obswebsocket import obsws, requests
+from obswebsocket import requests, events
 import logging
+from .async_client import PipelinedObsWs
+from .batch import BatchNotSupported, BatchObsWs
+from .supervisor import ConnectionSupervisor
+from .text_queue import TextUpdateQueue
+
+# テキストソースの更新に使うリクエスト（試す順。先頭はobs-websocket v5、残りはv4のリクエスト）
+TEXT_UPDATE_METHODS = ("SetInputSettings", "SetTextFreetype2Properties", "SetSourceSettings")
+
+# ソースの追加・削除・名前の変更を通知するイベント（v5とv4）と、ソース名を持つ項目
+SOURCE_CHANGE_EVENTS = (
+    "InputCreated", "InputRemoved", "InputNameChanged",
+    "SourceCreated", "SourceDestroyed", "SourceRenamed",
+)
+SOURCE_NAME_KEYS = ("inputName", "oldInputName", "sourceName", "previousName", "newName")
+
+# ソースの更新に使うリクエストをまだ決めていないことを表す
+_UNRESOLVED = object()
+
+class TextRequestRejected(Exception):
+    """OBSがテキスト更新のリクエストを拒否した（通信の失敗ではない）"""
 
 class OBSManager:
     """OBS WebSocket接続とテキスト更新を管理するクラス"""
@@ -13,70 +33,324 @@ class OBSManager:
         self.obs = None
         self.connected = False
         self.logger = logging.getLogger(__name__)
+        # 作成したクライアントの世代（古いクライアントや意図した切断の通知を無視するために使う）
+        self._generation = 0
+        self._supervisor = None
+        self._last_image = None
+        # ソース名から更新に使うリクエスト名（どれも使えなかった場合はNone）
+        self._text_methods = {}
+        # 同じ値の更新を捨て、続いた更新をまとめて送る出力段（submit_textで使う）
+        self.text_queue = TextUpdateQueue(
+            lambda source_name, text: self.update_text(text, source_name),
+            min_interval=config.get("min_update_interval", 0.1),
+            send_many=self.update_texts
+        )
     
     def connect(self):
-        """OBSに接続"""
+        """OBSに接続
+
+        接続後は接続を監視し、切れたら自動で再接続する（auto_reconnectがFalseの場合を除く）。
+        """
         try:
-            self.logger.info(f"OBSへの接続を試みています... (host: {self.config['host']}, port: {self.config['port']})")
-            self.obs = obsws(
-                host=self.config["host"],
-                port=self.config["port"],
-                password=self.config["password"]
-            )
-            self.logger.info("WebSocketクライアントを作成しました。接続を開始します...")
-            self.obs.connect()
-            self.connected = True
-            self.logger.info("OBSに正常に接続しました。")
-            self._log_obs_info()
+            self._open()
         except Exception as e:
             self.connected = False
             self.logger.error(f"OBSへの接続に失敗しました: {str(e)}")
             raise Exception(f"OBSへの接続に失敗しました: {str(e)}")
+        if self.config.get("auto_reconnect", True) and self._supervisor is None:
+            self._supervisor = ConnectionSupervisor(
+                self._reconnect,
+                self._heartbeat,
+                on_lost=self._on_connection_lost,
+                heartbeat_interval=self.config.get("heartbeat_interval", 5.0),
+                initial_delay=self.config.get("reconnect_initial_delay", 0.5),
+                max_delay=self.config.get("reconnect_max_delay", 30.0)
+            )
+            self._supervisor.start()
+    
+    def _open(self):
+        """クライアントを作成して接続し、ソースの更新の準備をする"""
+        self.logger.info(f"OBSへの接続を試みています... (host: {self.config['host']}, port: {self.config['port']})")
+        self.obs = self._create_client()
+        self.logger.info("WebSocketクライアントを作成しました。接続を開始します...")
+        self.obs.connect()
+        self.connected = True
+        self.logger.info("OBSに正常に接続しました。")
+        self._text_methods.clear()
+        self.text_queue.forget()
+        self.text_queue.start()
+        for name in SOURCE_CHANGE_EVENTS:
+            self.obs.register(self._on_source_event, getattr(events, name))
+        self._log_obs_info()
+        self._probe_text_method(self.config["source_name"])
+    
+    def _reconnect(self):
+        """切れた接続を破棄して接続し直し、ソースごとの最新の値を送り直す"""
+        self._close_client()
+        self._open()
+        self.text_queue.resync()
+        if self._last_image:
+            self.update_image(self._last_image)
+    
+    def _heartbeat(self):
+        """接続が生きているかを確認する（OBSが応答しなければ例外を送出する）"""
+        if not self.connected:
+            return False
+        self.obs.call(requests.GetVersion())
+        return True
+    
+    def _on_socket_closed(self, generation):
+        """クライアントがソケットの切断を検知した"""
+        if generation != self._generation or self._supervisor is None:
+            return
+        self.connected = False
+        self._supervisor.notify_lost()
+    
+    def _on_connection_lost(self):
+        """切断を検知したら、再接続するまで送信を止める（送信を待つ値は再接続後に送る）"""
+        self.connected = False
+        self.text_queue.stop()
+    
+    def _close_client(self):
+        """現在のクライアントを閉じる（閉じたことによる切断の通知は無視する）"""
+        self._generation += 1
+        obs, self.obs = self.obs, None
+        if obs is None:
+            return
+        try:
+            obs.disconnect()
+        except Exception as e:
+            self.logger.debug(f"切断でのエラー: {type(e).__name__} - {str(e)}")
+    
+    def _create_client(self):
+        """WebSocketクライアントを作成する
+
+        pipelined_clientを有効にすると、応答を待たずに続けてリクエストを送れるクライアントを使う
+        （obs-websocket v5のみ）。1つの応答の遅れが他のリクエストを待たせない。
+        """
+        self._generation += 1
+        generation = self._generation
+
+        def on_disconnect(*args):
+            self._on_socket_closed(generation)
+
+        if self.config.get("pipelined_client", False):
+            return PipelinedObsWs(
+                host=self.config["host"],
+                port=self.config["port"],
+                password=self.config["password"],
+                timeout=self.config.get("request_timeout", 5.0),
+                on_disconnect=on_disconnect
+            )
+        return BatchObsWs(
+            host=self.config["host"],
+            port=self.config["port"],
+            password=self.config["password"],
+            timeout=self.config.get("request_timeout", 5.0),
+            on_disconnect=on_disconnect
+        )
     
     def disconnect(self):
         """OBSから切断"""
+        if self._supervisor is not None:
+            supervisor, self._supervisor = self._supervisor, None
+            supervisor.stop()
+        self.text_queue.stop()
         if self.obs:
-            self.obs.disconnect()
+            self._close_client()
             self.connected = False
             self.logger.info("OBSから切断しました。")
     
-    def update_text(self, text):
-        """テキストソースを更新"""
+    def submit_text(self, text, source_name=None):
+        """テキストソースの更新を出力段に渡す（呼び出し側を待たせず、同じ値は送らない）"""
+        self.text_queue.submit(source_name or self.config["source_name"], text)
+    
+    def submit_texts(self, texts):
+        """複数のテキストソースの更新をまとめて出力段に渡す（同じ時点の値として一緒に送る）"""
+        self.text_queue.submit_many(texts)
+    
+    def update_texts(self, texts):
+        """複数のテキストソースを1回のRequestBatchで更新
+
+        曲の変更などで複数のソースを同時に変えるときに、1回の往復でまとめて反映する。
+        RequestBatchに対応していない接続先（obs-websocket v4）では1つずつ更新する。
+
+        Args:
+            texts: ソース名からテキストへの辞書
+
+        Returns:
+            ソース名から応答への辞書（失敗したソースはNone）
+        """
+        if not self.connected:
+            self.logger.warning("OBSに接続されていません。テキスト更新をスキップします。")
+            return {source_name: None for source_name in texts}
+        
+        results = {}
+        batch = []
+        for source_name, text in texts.items():
+            method = self._text_methods.get(source_name, _UNRESOLVED)
+            if method is None:
+                results[source_name] = None
+            elif method is _UNRESOLVED and getattr(self.obs, "legacy", None) is not False:
+                # v5以外では使えるリクエストが分からないため、1つずつ試す
+                results[source_name] = self.update_text(text, source_name)
+            else:
+                if method is _UNRESOLVED:
+                    method = TEXT_UPDATE_METHODS[0]
+                batch.append((source_name, method, self._text_request(method, source_name, text)))
+        if not batch:
+            return results
+        
+        call_batch = getattr(self.obs, "call_batch", None)
+        try:
+            if call_batch is None:
+                raise BatchNotSupported()
+            responses = call_batch([request for _, _, request in batch])
+        except BatchNotSupported:
+            for source_name, _, _ in batch:
+                results[source_name] = self.update_text(texts[source_name], source_name)
+            return results
+        except Exception as e:
+            self.logger.error(f"RequestBatch でのエラー: {type(e).__name__} - {str(e)}")
+            return dict(results, **{source_name: None for source_name, _, _ in batch})
+        
+        for (source_name, method, _), response in zip(batch, responses):
+            if response.status:
+                self._text_methods[source_name] = method
+                results[source_name] = response
+            else:
+                self.logger.error(f"{method} でのエラー（{source_name}）: OBSがリクエストを拒否しました")
+                results[source_name] = None
+        self.logger.debug(f"{len(batch)}個のテキストソースをまとめて更新しました。")
+        return results
+    
+    def update_text(self, text, source_name=None):
+        """テキストソースを更新
+
+        ソースごとに使えるリクエストを一度だけ決めて記録し、以降は1回のリクエストで更新する。
+
+        Args:
+            text: 表示するテキスト
+            source_name: 更新するソース名（Noneの場合は設定のsource_name）
+        """
         if not self.connected:
             self.logger.warning("OBSに接続されていません。テキスト更新をスキップします。")
             return
         
+        source_name = source_name or self.config["source_name"]
+        method = self._text_methods.get(source_name, _UNRESOLVED)
+        if method is None:
+            # どのリクエストも使えなかったソースは、追加・名前変更が通知されるまで送らない
+            self.logger.debug(f"テキストソース '{source_name}' を更新できないためスキップします。")
+            return None
+        if method is _UNRESOLVED:
+            return self._negotiate_text_method(source_name, text)
+        try:
+            return self._send_text(method, source_name, text)
+        except Exception as e:
+            self.logger.error(f"{method} でのエラー: {type(e).__name__} - {str(e)}")
+            return None
+    
+    def _negotiate_text_method(self, source_name, text):
+        """使えるリクエストを順に試し、成功したものをソースに記録する"""
+        rejected = True
+        for method in self._candidate_text_methods():
+            try:
+                response = self._send_text(method, source_name, text)
+            except TextRequestRejected as e:
+                self.logger.error(f"{method} でのエラー: {str(e)}")
+                continue
+            except Exception as e:
+                self.logger.error(f"{method} でのエラー: {type(e).__name__} - {str(e)}")
+                rejected = False
+                continue
+            self._text_methods[source_name] = method
+            self.logger.info(f"テキストソース '{source_name}' の更新に {method} を使います。")
+            return response
+        if rejected:
+            # 通信の失敗ではなくOBSがすべて拒否した場合だけ、使えるリクエストがないと記録する
+            self._text_methods[source_name] = None
+            self.logger.error(f"テキストソース '{source_name}' を更新できるリクエストがありません。")
+        return None
+    
+    def _candidate_text_methods(self):
+        """接続先のプロトコル（v5かv4か）で使えるリクエストの候補"""
+        legacy = getattr(self.obs, "legacy", None)
+        if legacy is True:
+            return TEXT_UPDATE_METHODS[1:]
+        if legacy is False:
+            return TEXT_UPDATE_METHODS[:1]
+        return TEXT_UPDATE_METHODS
+    
+    def _send_text(self, method, source_name, text):
+        """1つのリクエストでテキストを更新する
+
+        Raises:
+            TextRequestRejected: OBSがリクエストを拒否した場合
+        """
+        response = self.obs.call(self._text_request(method, source_name, text))
+        if getattr(response, "status", None) is False:
+            raise TextRequestRejected(f"OBSがリクエストを拒否しました ({response.datain})")
+        self.logger.debug(f"テキストソースを更新しました（{method}）: {text}")
+        return response
+    
+    def _text_request(self, method, source_name, text):
+        """テキストを更新するリクエストを作成する"""
+        if method == "SetInputSettings":
+            return requests.SetInputSettings(inputName=source_name, inputSettings={"text": text})
+        if method == "SetTextFreetype2Properties":
+            return requests.SetTextFreetype2Properties(source=source_name, text=text)
+        return requests.SetSourceSettings(sourceName=source_name, sourceSettings={"text": text})
+    
+    def _probe_text_method(self, source_name):
+        """接続時に、プロトコルとソースの種類から更新に使うリクエストを決める"""
+        legacy = getattr(self.obs, "legacy", None)
+        try:
+            if legacy is False:
+                response = self.obs.call(requests.GetInputSettings(inputName=source_name))
+                if response.status:
+                    self._text_methods[source_name] = "SetInputSettings"
+            elif legacy is True:
+                response = self.obs.call(requests.GetSourceSettings(sourceName=source_name))
+                if response.status:
+                    kind = response.datain.get("sourceType", "")
+                    self._text_methods[source_name] = (
+                        "SetTextFreetype2Properties" if kind.startswith("text_ft2_source")
+                        else "SetSourceSettings"
+                    )
+        except Exception as e:
+            # 決められなければ最初の更新のときに順に試す
+            self.logger.debug(f"テキストソースの種類の確認に失敗: {str(e)}")
+    
+    def _on_source_event(self, event):
+        """ソースの削除・名前の変更が通知されたら、そのソースに記録したリクエストを破棄する"""
+        for key in SOURCE_NAME_KEYS:
+            name = event.datain.get(key)
+            if name in self._text_methods:
+                del self._text_methods[name]
+                self.logger.info(f"ソース '{name}' が変更されたため、更新に使うリクエストを確認し直します。")
+    
+    def update_image(self, file_path):
+        """画像ソースのファイルを差し替える（曲の波形画像の表示など）"""
+        source_name = self.config.get("waveform_source_name")
+        if not source_name:
+            return None
+        # 再接続したときに送り直す
+        self._last_image = file_path
+        if not self.connected:
+            self.logger.warning("OBSに接続されていません。画像の更新をスキップします。")
+            return None
+
         try:
-            # まず、SetInputSettings を試す
             response = self.obs.call(requests.SetInputSettings(
-                inputName=self.config["source_name"],
-                inputSettings={"text": text}
+                inputName=source_name,
+                inputSettings={"file": file_path}
             ))
-            self.logger.debug(f"テキストソースを更新しました: {text}")
+            self.logger.debug(f"画像ソースを更新しました: {file_path}")
             return response
         except Exception as e:
-            self.logger.error(f"SetInputSettings でのエラー: {type(e).__name__} - {str(e)}")
-            try:
-                # 失敗した場合は、SetTextFreetype2Properties を試す
-                response = self.obs.call(requests.SetTextFreetype2Properties(
-                    source=self.config["source_name"],
-                    text=text
-                ))
-                self.logger.debug(f"テキストソースを更新しました（Freetype2）: {text}")
-                return response
-            except Exception as e:
-                self.logger.error(f"SetTextFreetype2Properties でのエラー: {type(e).__name__} - {str(e)}")
-                try:
-                    # 最後の手段として、SetSourceSettings を試す
-                    response = self.obs.call(requests.SetSourceSettings(
-                        sourceName=self.config["source_name"],
-                        sourceSettings={"text": text}
-                    ))
-                    self.logger.debug(f"テキストソースを更新しました（SourceSettings）: {text}")
-                    return response
-                except Exception as e:
-                    self.logger.error(f"SetSourceSettings でのエラー: {type(e).__name__} - {str(e)}")
-                    return None
+            self.logger.error(f"画像ソースの更新でのエラー: {type(e).__name__} - {str(e)}")
+            return None
     
     def _log_obs_info(self):
         """OBSの情報をログに出力"""
@@ -0,0 +1,147 @@
+"""
+OBSとの接続の監視と自動再接続
+
+OBSの再起動やネットワークの切断でWebSocketが切れても、ツールを再起動せずに復帰させる。
+切断はソケットの切断の通知（notify_lost）と、一定間隔の死活確認（heartbeat）で検知する。
+再接続の間隔は失敗するたびに倍にし（上限あり）、ランダムにずらして複数のツールが同時に
+OBSへ接続し直さないようにする。
+"""
+from typing import Any, Callable, Dict, Optional
+import logging
+import random
+import threading
+
+def backoff_delay(attempt: int, initial: float = 0.5, maximum: float = 30.0,
+                  rand: Callable[[], float] = random.random) -> float:
+    """再接続までの待ち時間
+
+    attempt回目の待ち時間は initial * 2^attempt（maximumまで）の半分から全体の間でランダムに決める。
+
+    Args:
+        attempt (int): これまでに失敗した再接続の回数
+        initial (float): 最初の待ち時間（秒）
+        maximum (float): 待ち時間の上限（秒）
+        rand (Callable[[], float]): 0以上1未満の乱数を返す関数
+
+    Returns:
+        float: 待ち時間（秒）
+    """
+    base = min(maximum, initial * 2 ** min(attempt, 32))
+    return base / 2 + base / 2 * rand()
+
+class ConnectionSupervisor:
+    """接続を監視し、切れたら間隔を延ばしながら再接続するスレッド"""
+
+    def __init__(self, reconnect: Callable[[], Any], heartbeat: Callable[[], bool],
+                 on_lost: Optional[Callable[[], Any]] = None, heartbeat_interval: float = 5.0,
+                 initial_delay: float = 0.5, max_delay: float = 30.0,
+                 rand: Callable[[], float] = random.random):
+        """
+        Args:
+            reconnect (Callable[[], Any]): 再接続する関数（失敗した場合は例外を送出する）
+            heartbeat (Callable[[], bool]): 接続が生きているかを確認する関数
+                （切れている場合はFalseを返すか、例外を送出する）
+            on_lost (Optional[Callable[[], Any]]): 切断を検知したときに呼ぶ関数（監視のスレッドで呼ぶ）
+            heartbeat_interval (float): 死活確認の間隔（秒、0以下なら死活確認をしない）
+            initial_delay (float): 最初の再接続までの待ち時間（秒）
+            max_delay (float): 再接続までの待ち時間の上限（秒）
+            rand (Callable[[], float]): 待ち時間をずらす乱数を返す関数
+        """
+        self.reconnect = reconnect
+        self.heartbeat = heartbeat
+        self.on_lost = on_lost
+        self.heartbeat_interval = heartbeat_interval
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.rand = rand
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._lost = False
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'lost': 0, 'attempts': 0, 'reconnects': 0}
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """切断を検知した回数・再接続を試みた回数・再接続できた回数"""
+        with self._cond:
+            return dict(self._stats)
+
+    def start(self) -> None:
+        """監視のスレッドを開始する"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._lost = False
+        self._thread = threading.Thread(target=self._run, name='ConnectionSupervisor', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0) -> None:
+        """監視のスレッドを停止する"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def notify_lost(self) -> None:
+        """接続が切れたことを通知する（ソケットの切断を検知した受信スレッドなどから呼ぶ）"""
+        with self._cond:
+            self._lost = True
+            self._cond.notify_all()
+
+    def _wait(self, timeout: Optional[float]) -> bool:
+        """停止されるか切断が通知されるまで待つ（停止された場合はFalse）"""
+        with self._cond:
+            if self._running and not self._lost:
+                self._cond.wait(timeout)
+            return self._running
+
+    def _alive(self) -> bool:
+        try:
+            return self.heartbeat() is not False
+        except Exception as e:
+            self.logger.warning(f"死活確認に失敗しました: {type(e).__name__} - {str(e)}")
+            return False
+
+    def _run(self) -> None:
+        while True:
+            interval = self.heartbeat_interval if self.heartbeat_interval > 0 else None
+            if not self._wait(interval):
+                return
+            with self._cond:
+                lost = self._lost
+            if not lost and (interval is None or self._alive()):
+                continue
+            with self._cond:
+                self._stats['lost'] += 1
+            self.logger.warning("OBSとの接続が切れました。再接続を試みます。")
+            if self.on_lost is not None:
+                self.on_lost()
+            if not self._reconnect_until_connected():
+                return
+
+    def _reconnect_until_connected(self) -> bool:
+        """再接続できるまで待ち時間を延ばしながら繰り返す（停止された場合はFalse）"""
+        attempt = 0
+        while True:
+            delay = backoff_delay(attempt, self.initial_delay, self.max_delay, self.rand)
+            with self._cond:
+                if self._running:
+                    self._cond.wait(delay)
+                if not self._running:
+                    return False
+                self._lost = False
+                self._stats['attempts'] += 1
+            try:
+                self.reconnect()
+            except Exception as e:
+                attempt += 1
+                self.logger.warning(f"再接続に失敗しました（{attempt}回目）: {str(e)}")
+                continue
+            with self._cond:
+                self._stats['reconnects'] += 1
+            self.logger.info("OBSに再接続しました。")
+            return True
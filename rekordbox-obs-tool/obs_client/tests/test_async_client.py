@@ -0,0 +1,220 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+import websockets
+from obswebsocket import events, exceptions, requests
+from obs_client.async_client import AsyncOBSClient, OBSRequestError, PipelinedObsWs, auth_string
+
+class FakeOBS:
+    """obs-websocket v5と同じ手順で認証し、リクエストに応答するサーバー
+
+    requestDataのdelayで応答を遅らせ、Hangには応答しない。Failは拒否する。
+    """
+
+    def __init__(self, password=''):
+        self.password = password
+        self.received = []
+        self.connections = []
+
+    async def handler(self, ws, *args):
+        self.connections.append(ws)
+        hello = {'obsWebSocketVersion': '5.0.0', 'rpcVersion': 1}
+        if self.password:
+            hello['authentication'] = {'salt': 'salt', 'challenge': 'challenge'}
+        await ws.send(json.dumps({'op': 0, 'd': hello}))
+        identify = json.loads(await ws.recv())['d']
+        if self.password and identify.get('authentication') != auth_string(self.password, 'salt', 'challenge'):
+            await ws.close(4009, 'Authentication failed')
+            return
+        await ws.send(json.dumps({'op': 2, 'd': {'negotiatedRpcVersion': 1}}))
+        async for message in ws:
+            asyncio.ensure_future(self.respond(ws, json.loads(message)))
+
+    async def respond(self, ws, message):
+        self.received.append(message)
+        data = message['d']
+        if message['op'] == 8:
+            results = [self.result(request) for request in data['requests']]
+            await ws.send(json.dumps({'op': 9, 'd': {'requestId': data['requestId'], 'results': results}}))
+            return
+        if data['requestType'] == 'Hang':
+            return
+        await asyncio.sleep(data['requestData'].get('delay', 0))
+        await ws.send(json.dumps({'op': 7, 'd': self.result(data)}))
+
+    def result(self, request):
+        ok = request['requestType'] != 'Fail'
+        return {
+            'requestType': request['requestType'],
+            'requestId': request['requestId'],
+            'requestStatus': {'result': ok, 'code': 100 if ok else 600, 'comment': None if ok else 'failed'},
+            'responseData': {'echo': request['requestData']} if ok else None,
+        }
+
+    async def event(self, event_type, event_data):
+        for ws in self.connections:
+            await ws.send(json.dumps({'op': 5, 'd': {'eventType': event_type, 'eventData': event_data}}))
+
+def run_with_server(test, password=''):
+    """ローカルのFakeOBSに接続したクライアントでテストを実行する"""
+    async def main():
+        obs = FakeOBS(password)
+        async with websockets.serve(obs.handler, 'localhost', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncOBSClient(port=port, password=password, timeout=1.0)
+            await client.connect()
+            try:
+                await test(client, obs)
+            finally:
+                await client.close()
+    asyncio.run(main())
+
+def test_auth_string():
+    """認証文字列がobs-websocketの手順（sha256とbase64を2回）で作られることのテスト"""
+    assert auth_string('supersecretpassword', 'lM1GncleQOaCu9lT1yeUZhFYnqhsLLP1G5lAGo3ixaI=',
+                       '+IxH4CnCiqpX1rM9scsNynZzbOe4KhDeYcTNS3PDaeY=') == \
+        '1Ct943GAT+6YQUUX47Ia/ncufilbe6+oD6lY+5kaCu4='
+
+def test_call_with_authentication():
+    """パスワードで認証し、応答のデータを返すことのテスト"""
+    async def test(client, obs):
+        assert await client.call('GetVersion', {'a': 1}) == {'echo': {'a': 1}}
+        assert obs.received[0]['op'] == 6
+    run_with_server(test, password='secret')
+
+def test_pipelined_requests():
+    """応答を待たずに続けて送り、応答は届いた順にリクエストIDで照合することのテスト"""
+    async def test(client, obs):
+        order = []
+
+        async def call(name, delay):
+            await client.call(name, {'delay': delay})
+            order.append(name)
+
+        await asyncio.gather(call('Slow', 0.3), call('Fast', 0))
+        assert order == ['Fast', 'Slow']
+        assert client.pending_requests == 0
+    run_with_server(test)
+
+def test_timeout_is_per_request():
+    """応答のないリクエストがタイムアウトしても、他のリクエストは応答を受け取ることのテスト"""
+    async def test(client, obs):
+        hung = asyncio.ensure_future(client.call('Hang', timeout=0.2))
+        assert await client.call('GetVersion') == {'echo': {}}
+        with pytest.raises(asyncio.TimeoutError):
+            await hung
+        assert client.pending_requests == 0
+    run_with_server(test)
+
+def test_rejected_request():
+    """OBSが拒否したリクエストはOBSRequestErrorになることのテスト"""
+    async def test(client, obs):
+        with pytest.raises(OBSRequestError) as e:
+            await client.call('Fail')
+        assert e.value.code == 600
+    run_with_server(test)
+
+def test_call_batch():
+    """RequestBatchの結果をリクエストの順に返すことのテスト"""
+    async def test(client, obs):
+        results = await client.call_batch([('GetVersion', {'a': 1}), ('Fail', {})])
+        assert [r['requestStatus']['result'] for r in results] == [True, False]
+        assert results[0]['responseData'] == {'echo': {'a': 1}}
+        assert obs.received[0]['op'] == 8
+    run_with_server(test)
+
+def test_connection_lost_fails_pending():
+    """接続が切れたら応答を待っているリクエストが失敗することのテスト"""
+    async def test(client, obs):
+        hung = asyncio.ensure_future(client.call('Hang'))
+        await asyncio.sleep(0.05)
+        await obs.connections[0].close()
+        with pytest.raises(ConnectionError):
+            await hung
+        assert not client.connected
+        with pytest.raises(ConnectionError):
+            await client.call('GetVersion')
+    run_with_server(test)
+
+def test_pipelined_obsws():
+    """obsws互換の同期クライアントでリクエスト・バッチ・イベントを扱えることのテスト"""
+    obs = FakeOBS()
+    loop = asyncio.new_event_loop()
+    started = []
+    thread = threading.Thread(target=loop.run_until_complete,
+                              args=(_serve_until_stopped(obs, started),), daemon=True)
+    thread.start()
+    while not started:
+        threading.Event().wait(0.01)
+
+    client = PipelinedObsWs(port=started[0], timeout=1.0)
+    client.connect()
+    try:
+        received = []
+        client.register(received.append, events.InputRemoved)
+        assert client.legacy is False
+
+        response = client.call(requests.SetInputSettings(inputName='Title', inputSettings={'text': 'a'}))
+        assert response.status is True
+        assert response.datain == {'echo': {'inputName': 'Title', 'inputSettings': {'text': 'a'}}}
+
+        slow = client.call_async(requests.GetVersion(delay=0.3))
+        assert client.call(requests.GetStats()).status is True
+        assert not slow.done()
+        assert slow.result(1).status is True
+
+        assert client.call(requests.GetInputSettings(inputName='x')).status is True
+        assert client.call(requests.Fail()).status is False
+        with pytest.raises(exceptions.MessageTimeout):
+            client.call(requests.Hang(), timeout=0.1)
+
+        results = client.call_batch([requests.GetVersion(), requests.Fail()])
+        assert [r.status for r in results] == [True, False]
+
+        asyncio.run_coroutine_threadsafe(
+            obs.event('InputRemoved', {'inputName': 'Title'}), loop
+        ).result(1)
+        for _ in range(100):
+            if received:
+                break
+            threading.Event().wait(0.01)
+        assert received[0].datain == {'inputName': 'Title'}
+    finally:
+        client.disconnect()
+        loop.call_soon_threadsafe(started.append, None)
+        thread.join(1)
+    assert not client.connected
+
+def test_pipelined_obsws_connect_timeout():
+    """接続がタイムアウトしたら、途中まで開いたソケットを閉じてからイベントループを止めることのテスト"""
+    # TCPの接続は受け付けるが、WebSocketのハンドシェイクには応答しないサーバー
+    listener = socket.socket()
+    listener.bind(('localhost', 0))
+    listener.listen(1)
+    try:
+        client = PipelinedObsWs(port=listener.getsockname()[1], timeout=0.1)
+        start = time.monotonic()
+        with pytest.raises(asyncio.TimeoutError):
+            client.connect()
+        assert time.monotonic() - start < 1.0
+        assert client._loop is None and not client.connected
+
+        conn, _ = listener.accept()
+        conn.settimeout(1.0)
+        try:
+            while conn.recv(4096):
+                pass
+        finally:
+            conn.close()
+    finally:
+        listener.close()
+
+async def _serve_until_stopped(obs, started):
+    """startedにNoneが追加されるまでFakeOBSを動かす"""
+    async with websockets.serve(obs.handler, 'localhost', 0) as server:
+        started.append(server.sockets[0].getsockname()[1])
+        while started[-1] is not None:
+            await asyncio.sleep(0.01)
@@ -0,0 +1,67 @@
+import json
+import pytest
+from obswebsocket import requests
+from obs_client.batch import BatchNotSupported, BatchObsWs, BatchResponseAdapter
+
+class FakeSocket:
+    """送られたRequestBatchにOBSと同じ形式（op 9）で応答するソケット"""
+
+    def __init__(self, obs, fail=()):
+        self.obs = obs
+        self.fail = fail
+        self.sent = []
+        self._incoming = []
+
+    def send(self, message):
+        payload = json.loads(message)
+        self.sent.append(payload)
+        results = [
+            {
+                'requestType': request['requestType'],
+                'requestId': request['requestId'],
+                'requestStatus': {'result': request['requestType'] not in self.fail, 'code': 100},
+                'responseData': {},
+            }
+            for request in payload['d']['requests']
+        ]
+        self._incoming.append(json.dumps(
+            {'op': 9, 'd': {'requestId': payload['d']['requestId'], 'results': results}}
+        ))
+        # 受信スレッドと同じ処理で応答を渡す
+        answer = json.loads(BatchResponseAdapter(self).recv())
+        assert answer['op'] == 7
+        self.obs.answers[answer['d']['requestId']] = answer['d']
+        self.obs.events[answer['d']['requestId']].set()
+
+    def recv(self):
+        return self._incoming.pop(0)
+
+def test_adapter_passes_other_messages():
+    """バッチの応答以外はそのまま渡すことのテスト"""
+    message = json.dumps({'op': 5, 'd': {'eventType': 'InputCreated'}})
+    socket = FakeSocket(None)
+    socket._incoming.append(message)
+    assert BatchResponseAdapter(socket).recv() == message
+
+def test_call_batch():
+    """複数のリクエストを1回のRequestBatchで送り、リクエストごとの結果を設定することのテスト"""
+    obs = BatchObsWs(port=4455)
+    obs.ws = FakeSocket(obs, fail=('SetSourceSettings',))
+    objs = [
+        requests.SetInputSettings(inputName="Title", inputSettings={"text": "a"}),
+        requests.SetSourceSettings(sourceName="Artist", sourceSettings={"text": "b"}),
+    ]
+    results = obs.call_batch(objs)
+    assert len(obs.ws.sent) == 1
+    assert obs.ws.sent[0]['op'] == 8
+    assert [r['requestData'] for r in obs.ws.sent[0]['d']['requests']] == \
+        [{"inputName": "Title", "inputSettings": {"text": "a"}},
+         {"sourceName": "Artist", "sourceSettings": {"text": "b"}}]
+    assert [r.status for r in results] == [True, False]
+    assert obs.events == {} and obs.answers == {}
+
+def test_call_batch_legacy():
+    """obs-websocket v4ではRequestBatchを送らないことのテスト"""
+    obs = BatchObsWs(port=4444)
+    with pytest.raises(BatchNotSupported):
+        obs.call_batch([requests.GetVersion()])
@@ -1,3 +1,4 @@
+import threading
 import pytest
 from unittest.mock import Mock, patch
 from obs_client.obs_manager import OBSManager
@@ -24,15 +25,28 @@ def test_init(obs_manager, config):
 def test_connect_success(obs_manager):
     """接続成功のテスト"""
     mock_obs = Mock()
-    with patch('obs_client.obs_manager.obsws', return_value=mock_obs):
+    with patch('obs_client.obs_manager.BatchObsWs', return_value=mock_obs):
         obs_manager.connect()
         assert obs_manager.connected is True
         assert obs_manager.obs == mock_obs
         mock_obs.connect.assert_called_once()
 
+def test_connect_pipelined_client(config):
+    """pipelined_clientを有効にすると応答を待たずに送れるクライアントを使うことのテスト"""
+    manager = OBSManager(dict(config, pipelined_client=True, request_timeout=2.0))
+    mock_obs = Mock()
+    with patch('obs_client.obs_manager.PipelinedObsWs', return_value=mock_obs) as client, \
+            patch('obs_client.obs_manager.BatchObsWs') as batch_client:
+        manager.connect()
+        client.assert_called_once()
+        assert client.call_args.kwargs["timeout"] == 2.0
+        batch_client.assert_not_called()
+        assert manager.obs == mock_obs
+    manager.disconnect()
+
 def test_connect_failure(obs_manager):
     """接続失敗のテスト"""
-    with patch('obs_client.obs_manager.obsws', side_effect=Exception("Connection failed")):
+    with patch('obs_client.obs_manager.BatchObsWs', side_effect=Exception("Connection failed")):
         with pytest.raises(Exception) as exc_info:
             obs_manager.connect()
         assert "OBSへの接続に失敗しました" in str(exc_info.value)
@@ -74,4 +88,136 @@ def test_update_text_fallback(obs_manager):
     
     result = obs_manager.update_text("test")
     assert result is not None
-    assert mock_obs.call.call_count == 3 
\ No newline at end of file
+    assert mock_obs.call.call_count == 3 
+
+def test_update_image(config):
+    """画像ソースのファイル差し替えのテスト"""
+    obs_manager = OBSManager(dict(config, waveform_source_name="Waveform"))
+    mock_obs = Mock()
+    obs_manager.obs = mock_obs
+    obs_manager.connected = True
+
+    obs_manager.update_image("/tmp/1_400x48.png")
+    request = mock_obs.call.call_args[0][0]
+    assert request.dataout["inputName"] == "Waveform"
+    assert request.dataout["inputSettings"] == {"file": "/tmp/1_400x48.png"}
+
+def test_update_text_remembers_working_method(obs_manager):
+    """成功したリクエストを記録し、以降は1回のリクエストで更新することのテスト"""
+    mock_obs = Mock()
+    mock_obs.call.side_effect = [
+        Exception("First method failed"),
+        Exception("Second method failed"),
+        Mock(),
+        Mock(),
+    ]
+    obs_manager.obs = mock_obs
+    obs_manager.connected = True
+
+    obs_manager.update_text("first")
+    assert obs_manager.update_text("second") is not None
+    assert mock_obs.call.call_count == 4
+    assert mock_obs.call.call_args[0][0].name == "SetSourceSettings"
+
+def test_update_text_probes_at_connect(obs_manager):
+    """接続時にソースを確認し、最初の更新から1回のリクエストで済むことのテスト"""
+    mock_obs = Mock(legacy=False)
+    mock_obs.call.return_value = Mock(status=True)
+    with patch('obs_client.obs_manager.BatchObsWs', return_value=mock_obs):
+        obs_manager.connect()
+    mock_obs.call.reset_mock()
+
+    obs_manager.update_text("test")
+    mock_obs.call.assert_called_once()
+    assert mock_obs.call.call_args[0][0].name == "SetInputSettings"
+
+def test_update_text_rejected_until_source_changes(obs_manager):
+    """すべて拒否されたソースは、ソースの追加・名前変更が通知されるまで送らないことのテスト"""
+    mock_obs = Mock(legacy=True)
+    mock_obs.call.return_value = Mock(status=False, datain={})
+    obs_manager.obs = mock_obs
+    obs_manager.connected = True
+
+    assert obs_manager.update_text("test") is None
+    assert mock_obs.call.call_count == 2
+    obs_manager.update_text("test")
+    assert mock_obs.call.call_count == 2
+
+    event = Mock(datain={"previousName": "Old", "newName": "NowPlaying"})
+    obs_manager._on_source_event(event)
+    mock_obs.call.return_value = Mock(status=True)
+    assert obs_manager.update_text("test") is not None
+    assert mock_obs.call.call_count == 3
+    assert mock_obs.call.call_args[0][0].name == "SetTextFreetype2Properties"
+
+def test_submit_text_drops_duplicates(obs_manager):
+    """出力段を通した更新では同じテキストを送らないことのテスト"""
+    mock_obs = Mock()
+    obs_manager.obs = mock_obs
+    obs_manager.connected = True
+
+    obs_manager.submit_text("test")
+    obs_manager.submit_text("test")
+    obs_manager.text_queue.flush()
+    obs_manager.submit_text("test")
+    obs_manager.text_queue.flush()
+    mock_obs.call.assert_called_once()
+
+def test_update_texts_batch(obs_manager):
+    """複数のソースを1回のRequestBatchで更新することのテスト"""
+    mock_obs = Mock(legacy=False)
+    mock_obs.call_batch.side_effect = lambda objs: [Mock(status=True), Mock(status=False)]
+    obs_manager.obs = mock_obs
+    obs_manager.connected = True
+
+    results = obs_manager.update_texts({"Title": "a", "Artist": "b"})
+    mock_obs.call_batch.assert_called_once()
+    mock_obs.call.assert_not_called()
+    assert results["Title"] is not None and results["Artist"] is None
+    assert [r.name for r in mock_obs.call_batch.call_args[0][0]] == ["SetInputSettings"] * 2
+
+def test_update_texts_sequential_fallback(obs_manager):
+    """RequestBatchに対応していない接続先では1つずつ更新することのテスト"""
+    mock_obs = Mock(legacy=True)
+    obs_manager.obs = mock_obs
+    obs_manager.connected = True
+
+    results = obs_manager.update_texts({"Title": "a", "Artist": "b"})
+    mock_obs.call_batch.assert_not_called()
+    assert mock_obs.call.call_count == 2
+    assert all(response is not None for response in results.values())
+
+def test_reconnects_and_resyncs(config):
+    """接続が切れたら再接続し、ソースごとの最新の値を送り直すことのテスト"""
+    manager = OBSManager(dict(config, heartbeat_interval=0, reconnect_initial_delay=0.01,
+                              reconnect_max_delay=0.01, waveform_source_name="Waveform"))
+    first, second = Mock(legacy=True), Mock(legacy=True)
+    clients = [first, second]
+    reconnected = threading.Event()
+    second.connect.side_effect = reconnected.set
+    with patch('obs_client.obs_manager.BatchObsWs', side_effect=lambda **kwargs: clients.pop(0)) as client:
+        manager.connect()
+        manager.update_text("a", "Title")
+        manager.update_image("/tmp/waveform.png")
+        manager.text_queue.submit("Title", "b")
+
+        # 受信スレッドが切断を検知したときの通知
+        client.call_args_list[0].kwargs["on_disconnect"](first)
+        assert reconnected.wait(2.0)
+        for _ in range(200):
+            if manager._supervisor.stats["reconnects"] and manager.text_queue.last_value("Title") == "b":
+                break
+            threading.Event().wait(0.01)
+        assert manager.connected is True
+        assert manager.obs is second
+        first.disconnect.assert_called_once()
+        pushed = [call[0][0] for call in second.call.call_args_list]
+        assert any(r.name == "SetInputSettings" and r.data()["inputSettings"] == {"file": "/tmp/waveform.png"}
+                   for r in pushed)
+        assert manager.text_queue.last_value("Title") == "b"
+
+        # 意図した切断の通知では再接続しない
+        manager.disconnect()
+        client.call_args_list[1].kwargs["on_disconnect"](second)
+        assert manager.connected is False
+        assert client.call_count == 2
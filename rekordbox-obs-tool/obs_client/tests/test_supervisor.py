@@ -0,0 +1,75 @@
+import threading
+from obs_client.supervisor import ConnectionSupervisor, backoff_delay
+
+def wait_until(condition, timeout=2.0):
+    event = threading.Event()
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        event.wait(0.01)
+    return condition()
+
+def test_backoff_delay():
+    """待ち時間が失敗するたびに倍になり、上限を超えず、半分から全体の間でずれることのテスト"""
+    assert backoff_delay(0, 0.5, 30.0, rand=lambda: 0.0) == 0.25
+    assert backoff_delay(0, 0.5, 30.0, rand=lambda: 1.0) == 0.5
+    assert backoff_delay(3, 0.5, 30.0, rand=lambda: 1.0) == 4.0
+    assert backoff_delay(100, 0.5, 30.0, rand=lambda: 1.0) == 30.0
+    assert 15.0 <= backoff_delay(100, 0.5, 30.0) <= 30.0
+
+def test_reconnects_with_retries():
+    """切断が通知されたら、成功するまで再接続を繰り返すことのテスト"""
+    attempts = []
+    lost = []
+
+    def reconnect():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("refused")
+
+    supervisor = ConnectionSupervisor(reconnect, lambda: True, on_lost=lambda: lost.append(1),
+                                      heartbeat_interval=0, initial_delay=0.01, max_delay=0.02)
+    supervisor.start()
+    try:
+        supervisor.notify_lost()
+        assert wait_until(lambda: supervisor.stats['reconnects'] == 1)
+        assert len(attempts) == 3 and len(lost) == 1
+        assert supervisor.stats == {'lost': 1, 'attempts': 3, 'reconnects': 1}
+    finally:
+        supervisor.stop()
+
+def test_heartbeat_failure_triggers_reconnect():
+    """死活確認に失敗したら再接続することのテスト"""
+    alive = [False]
+    reconnected = threading.Event()
+
+    def heartbeat():
+        if not alive[0]:
+            raise TimeoutError("no answer")
+        return True
+
+    def reconnect():
+        alive[0] = True
+        reconnected.set()
+
+    supervisor = ConnectionSupervisor(reconnect, heartbeat, heartbeat_interval=0.01,
+                                      initial_delay=0.01, max_delay=0.01)
+    supervisor.start()
+    try:
+        assert reconnected.wait(2.0)
+        assert wait_until(lambda: supervisor.stats['reconnects'] == 1)
+    finally:
+        supervisor.stop()
+    assert supervisor.stats['lost'] == 1
+
+def test_stop_interrupts_backoff():
+    """再接続を待つ間でもすぐに停止できることのテスト"""
+    supervisor = ConnectionSupervisor(lambda: None, lambda: True, heartbeat_interval=0,
+                                      initial_delay=60.0, max_delay=60.0)
+    supervisor.start()
+    supervisor.notify_lost()
+    assert wait_until(lambda: supervisor.stats['lost'] == 1)
+    thread = supervisor._thread
+    supervisor.stop()
+    assert not thread.is_alive()
+    assert supervisor.stats['attempts'] == 0
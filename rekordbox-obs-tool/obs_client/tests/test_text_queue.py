@@ -0,0 +1,206 @@
+import threading
+from obs_client.text_queue import TextUpdateQueue
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class Recorder:
+    def __init__(self, result=True):
+        self.sent = []
+        self.result = result
+
+    def __call__(self, source_name, text):
+        self.sent.append((source_name, text))
+        return self.result
+
+def test_drops_duplicates():
+    """OBSが表示している値と同じ更新は送らないことのテスト"""
+    send = Recorder()
+    queue = TextUpdateQueue(send, clock=FakeClock())
+    queue.submit("Clock", "12:00:00")
+    assert queue.flush() == 1
+    queue.submit("Clock", "12:00:00")
+    assert queue.flush() == 0
+    assert send.sent == [("Clock", "12:00:00")]
+    assert queue.stats['duplicates'] == 1
+    assert queue.last_value("Clock") == "12:00:00"
+
+def test_coalesces_within_min_interval():
+    """最小間隔の間に続いた更新は最新の値だけを送ることのテスト"""
+    clock = FakeClock()
+    send = Recorder()
+    queue = TextUpdateQueue(send, min_interval=0.1, clock=clock)
+    queue.submit("Title", "a")
+    queue.flush()
+    clock.now = 0.01
+    for text in ("b", "c", "d"):
+        queue.submit("Title", text)
+    # 別のソースは間隔の制限を受けない
+    queue.submit("Artist", "x")
+    assert queue.flush() == 1
+    clock.now = 0.1
+    assert queue.flush() == 1
+    assert send.sent == [("Title", "a"), ("Artist", "x"), ("Title", "d")]
+    assert queue.stats['coalesced'] == 2
+
+def test_pending_value_reverted():
+    """送信を待つ間に表示中の値に戻った場合は何も送らないことのテスト"""
+    clock = FakeClock()
+    send = Recorder()
+    queue = TextUpdateQueue(send, clock=clock)
+    queue.submit("Title", "a")
+    queue.flush()
+    queue.submit("Title", "b")
+    queue.submit("Title", "a")
+    clock.now = 1.0
+    assert queue.flush() == 0
+    assert send.sent == [("Title", "a")]
+
+def test_failed_send_is_not_acknowledged():
+    """送信に失敗した値は記録せず、同じ値でも次の更新で送ることのテスト"""
+    clock = FakeClock()
+    send = Recorder(result=None)
+    queue = TextUpdateQueue(send, clock=clock)
+    queue.submit("Title", "a")
+    assert queue.flush() == 0
+    send.result = True
+    clock.now = 1.0
+    queue.submit("Title", "a")
+    assert queue.flush() == 1
+    assert queue.stats['failed'] == 1
+
+def test_failed_send_is_retried_with_backoff():
+    """送信に失敗したら最新の値を待ち時間を延ばしながら送り直し、上限で諦めることのテスト"""
+    clock = FakeClock()
+    send = Recorder(result=False)
+    queue = TextUpdateQueue(send, min_interval=0.1, clock=clock, retry_delay=1.0, max_retries=2)
+    queue.submit("Title", "a")
+    assert queue.flush() == 0
+    # 失敗した後に受け付けた値があれば、それを送り直す
+    queue.submit("Title", "b")
+    clock.now = 0.9
+    assert queue.flush() == 0
+    assert len(send.sent) == 1
+    clock.now = 1.0
+    queue.flush()
+    clock.now = 2.9
+    queue.flush()
+    assert send.sent == [("Title", "a"), ("Title", "b")]
+    clock.now = 3.0
+    queue.flush()
+    assert send.sent[-1] == ("Title", "b")
+    # max_retries回送り直しても失敗したら、次の更新まで送らない
+    clock.now = 100.0
+    assert queue.flush() == 0
+    assert len(send.sent) == 3
+    assert queue.stats['retried'] == 2
+
+    send.result = True
+    queue.submit("Title", "c")
+    assert queue.flush() == 1
+    assert queue.last_value("Title") == "c"
+
+def test_fast_producer_does_not_flood():
+    """速い更新を送信用のスレッドが間隔を守って最新の値だけ送ることのテスト"""
+    sent = []
+    delivered = threading.Event()
+
+    def send(source_name, text):
+        sent.append(text)
+        if text == "999":
+            delivered.set()
+        return True
+
+    queue = TextUpdateQueue(send, min_interval=0.05)
+    queue.start()
+    try:
+        for i in range(1000):
+            queue.submit("Clock", str(i))
+        assert delivered.wait(1.0)
+    finally:
+        queue.stop()
+    assert sent[-1] == "999"
+    assert len(sent) <= 3
+
+def test_submit_many_sends_together():
+    """同時に受け付けた複数のソースの値を1回の呼び出しで送ることのテスト"""
+    batches = []
+
+    def send_many(texts):
+        batches.append(texts)
+        return {source_name: True for source_name in texts}
+
+    queue = TextUpdateQueue(Recorder(), clock=FakeClock(), send_many=send_many)
+    queue.submit_many({"Title": "a", "Artist": "b"})
+    assert queue.flush() == 2
+    assert batches == [{"Title": "a", "Artist": "b"}]
+    assert queue.last_value("Artist") == "b"
+
+def test_resync_resends_latest_values():
+    """resyncで記録した値を破棄し、ソースごとの最新の値を送り直すことのテスト"""
+    clock = FakeClock()
+    send = Recorder()
+    queue = TextUpdateQueue(send, clock=clock)
+    queue.submit_many({"Title": "a", "Artist": "x"})
+    queue.flush()
+    queue.submit("Title", "b")
+    queue.resync()
+    assert queue.last_value("Title") is None
+    assert queue.flush() == 2
+    assert send.sent[2:] == [("Title", "b"), ("Artist", "x")]
+
+def test_restart_while_sending_reuses_thread():
+    """送信中に停止して再開しても、送信用のスレッドが2つにならないことのテスト"""
+    entered = threading.Event()
+    release = threading.Event()
+    sent = []
+
+    def send(source_name, text):
+        sent.append((threading.current_thread(), text))
+        entered.set()
+        release.wait(5)
+        return True
+
+    queue = TextUpdateQueue(send, min_interval=0)
+    queue.start()
+    try:
+        queue.submit("Title", "a")
+        assert entered.wait(1.0)
+        queue.stop(timeout=0.05)
+        sender = queue._thread
+        assert sender is not None and sender.is_alive()
+
+        queue.start()
+        assert queue._thread is sender
+        queue.submit("Title", "b")
+        release.set()
+        sender.join(0.5)
+        assert sender.is_alive()
+        assert [text for _, text in sent] == ["a", "b"]
+        assert {thread for thread, _ in sent} == {sender}
+    finally:
+        release.set()
+        queue.stop()
+    assert not sender.is_alive()
+    assert queue._thread is None
+
+def test_stop_wakes_retry_wait():
+    """送り直しの待ち時間中でもstopですぐに終了することのテスト"""
+    failed = threading.Event()
+
+    def send(source_name, text):
+        failed.set()
+        return False
+
+    queue = TextUpdateQueue(send, retry_delay=10.0)
+    queue.start()
+    queue.submit("Title", "a")
+    assert failed.wait(1.0)
+    sender = queue._thread
+    queue.stop(timeout=1.0)
+    assert not sender.is_alive()
+    assert queue.stats['retried'] == 1
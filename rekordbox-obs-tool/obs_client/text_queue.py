@@ -0,0 +1,238 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+class TextUpdateQueue:
+    """ソースごとのテキスト更新の出力段
+
+    ソースごとにOBSが表示している（送信に成功した）値を記録し、同じ値の更新は送らない。
+    送信を待つ値はソースごとに最新の1つだけを持ち、短い間に続いた更新はまとめて最新の値だけを送る。
+    1つのソースへの送信は min_interval 秒に1回までとするため、更新が速くても古い値が溜まって
+    OBSに送られ続けることはない。送信に失敗した場合は、そのソースの最新の値を retry_delay 秒
+    （失敗が続くたびに倍）後に送り直す。max_retries 回続けて失敗したら、次の更新まで送り直さない。
+
+    start() で送信用のスレッドを開始する。スレッドを使わない場合は flush() を呼んで送信する。
+    send_many を指定すると、同時に送信できる複数のソースの値は1回の呼び出しでまとめて送る。
+    """
+
+    def __init__(self, send: Callable[[str, str], Any], min_interval: float = 0.1,
+                 clock: Callable[[], float] = time.monotonic,
+                 send_many: Optional[Callable[[Dict[str, str]], Dict[str, Any]]] = None,
+                 retry_delay: float = 0.5, max_retries: int = 3):
+        """
+        Args:
+            send (Callable[[str, str], Any]): (ソース名, テキスト) を送信する関数
+                （失敗した場合はNoneかFalseを返すか、例外を送出する）
+            min_interval (float): 1つのソースへの送信の最小間隔（秒）
+            clock (Callable[[], float]): 現在時刻を返す関数
+            retry_delay (float): 送信に失敗してから送り直すまでの最初の待ち時間（秒）
+            max_retries (int): 続けて失敗したときに送り直す回数の上限
+            send_many (Optional[Callable[[Dict[str, str]], Dict[str, Any]]]): ソース名からテキストへの
+                辞書をまとめて送信し、ソースごとの結果を返す関数（OBSManager.update_textsなど）
+        """
+        self.send = send
+        self.send_many = send_many
+        self.min_interval = min_interval
+        self.clock = clock
+        self.retry_delay = retry_delay
+        self.max_retries = max_retries
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._acked: Dict[str, str] = {}
+        self._latest: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+        self._inflight: Dict[str, str] = {}
+        self._next_send: Dict[str, float] = {}
+        self._failures: Dict[str, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._stats = {'submitted': 0, 'sent': 0, 'duplicates': 0, 'coalesced': 0, 'failed': 0,
+                       'retried': 0}
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """受け付けた更新・送信した更新・同じ値で捨てた更新・まとめた更新・失敗した送信・送り直した数"""
+        with self._cond:
+            return dict(self._stats)
+
+    def last_value(self, source_name: str) -> Optional[str]:
+        """OBSに送信できた最後の値"""
+        with self._cond:
+            return self._acked.get(source_name)
+
+    def forget(self, source_name: Optional[str] = None) -> None:
+        """記録した値を破棄する（OBSに再接続した場合など、表示が変わった可能性があるとき）"""
+        with self._cond:
+            if source_name is None:
+                self._acked.clear()
+            else:
+                self._acked.pop(source_name, None)
+
+    def resync(self) -> None:
+        """記録した値を破棄し、ソースごとに最後に受け付けた値を送り直す
+
+        OBSに再接続した後など、OBSの表示が分からなくなったときに呼ぶ。
+        """
+        with self._cond:
+            self._acked.clear()
+            self._next_send.clear()
+            self._failures.clear()
+            self._pending.update(self._latest)
+            self._cond.notify()
+
+    def submit(self, source_name: str, text: str) -> None:
+        """テキストの更新を受け付ける（送信は送信用のスレッドかflushで行う）"""
+        with self._cond:
+            self._stats['submitted'] += 1
+            self._latest[source_name] = text
+            shown = self._inflight.get(source_name, self._acked.get(source_name))
+            if source_name in self._pending:
+                if self._pending[source_name] == text:
+                    self._stats['duplicates'] += 1
+                    return
+                self._stats['coalesced'] += 1
+                if text == shown:
+                    # 送信を待つ間に表示中の値に戻った
+                    del self._pending[source_name]
+                    return
+            elif text == shown:
+                self._stats['duplicates'] += 1
+                return
+            self._pending[source_name] = text
+            self._cond.notify()
+
+    def submit_many(self, texts: Dict[str, str]) -> None:
+        """複数のソースの更新を同じ時点の値として受け付ける（送信できるものは一緒に送る）"""
+        with self._cond:
+            for source_name, text in texts.items():
+                self.submit(source_name, text)
+
+    def flush(self) -> int:
+        """送信できる（最小間隔を過ぎた）ソースの最新の値を送信する
+
+        Returns:
+            int: 送信に成功した数
+        """
+        items, _ = self._take_due()
+        return self._deliver_all(items)
+
+    def start(self) -> None:
+        """送信用のスレッドを開始する
+
+        stop() の後でまだ送信中のスレッドが終わっていなければ、新しいスレッドは作らずにそのまま使う。
+        """
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            if self._thread is not None:
+                # 前のスレッドはまだ終了していない（_runが終了時に_threadを消す）
+                self._cond.notify_all()
+                return
+            self._thread = threading.Thread(target=self._run, name='TextUpdateQueue', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0) -> None:
+        """送信用のスレッドを停止する（送信を待つ値は送らない）
+
+        送り直しの待ち時間中ならすぐに終了する。送信中の場合は送信が終わるまでスレッドは残り、
+        終了するまで start() は新しいスレッドを作らない。
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            if thread.is_alive():
+                self.logger.warning("送信用のスレッドが送信中のため、送信が終わってから終了します")
+
+    def _take_due(self) -> Tuple[List[Tuple[str, str]], Optional[float]]:
+        """送信する値を取り出す
+
+        Returns:
+            Tuple[List[Tuple[str, str]], Optional[float]]:
+                ([(ソース名, テキスト)], 次に送信できるまでの秒数（送信を待つ値がなければNone）)
+        """
+        with self._cond:
+            now = self.clock()
+            items = []
+            wait = None
+            for source_name, text in list(self._pending.items()):
+                if source_name in self._inflight:
+                    continue
+                remaining = self._next_send.get(source_name, now) - now
+                if remaining > 0:
+                    wait = remaining if wait is None else min(wait, remaining)
+                    continue
+                del self._pending[source_name]
+                self._inflight[source_name] = text
+                self._next_send[source_name] = now + self.min_interval
+                items.append((source_name, text))
+            return items, wait
+
+    def _deliver_all(self, items: List[Tuple[str, str]]) -> int:
+        if self.send_many is None or len(items) < 2:
+            return sum(self._deliver(source_name, text) for source_name, text in items)
+        try:
+            results = self.send_many(dict(items))
+        except Exception as e:
+            self.logger.error(f"テキストの送信に失敗: {type(e).__name__} - {str(e)}")
+            results = {}
+        return sum(self._acknowledge(source_name, text, results.get(source_name))
+                   for source_name, text in items)
+
+    def _deliver(self, source_name: str, text: str) -> bool:
+        try:
+            result = self.send(source_name, text)
+        except Exception as e:
+            self.logger.error(f"テキストの送信に失敗: {type(e).__name__} - {str(e)}")
+            result = None
+        return self._acknowledge(source_name, text, result)
+
+    def _acknowledge(self, source_name: str, text: str, result: Any) -> bool:
+        ok = result is not None and result is not False
+        with self._cond:
+            del self._inflight[source_name]
+            if ok:
+                self._acked[source_name] = text
+                self._failures.pop(source_name, None)
+                self._stats['sent'] += 1
+            else:
+                # 表示中の値は分からないため、次の更新は同じ値でも送る
+                self._acked.pop(source_name, None)
+                self._stats['failed'] += 1
+                self._schedule_retry(source_name, text)
+            self._cond.notify()
+        return ok
+
+    def _schedule_retry(self, source_name: str, text: str) -> None:
+        """失敗した送信の後、最新の値を待ち時間を延ばしながら送り直す（_condを保持して呼ぶ）"""
+        failures = self._failures.get(source_name, 0) + 1
+        self._failures[source_name] = failures
+        retry_at = self.clock() + self.retry_delay * 2 ** min(failures - 1, self.max_retries)
+        self._next_send[source_name] = max(self._next_send.get(source_name, retry_at), retry_at)
+        if source_name in self._pending:
+            # 新しい値が送信を待っているため、それを待ち時間の後に送る
+            return
+        if failures > self.max_retries:
+            self._failures.pop(source_name, None)
+            self.logger.warning(f"{source_name}の送信に{failures}回続けて失敗しました。次の更新まで送り直しません")
+            return
+        self._pending[source_name] = self._latest.get(source_name, text)
+        self._stats['retried'] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running:
+                        if self._thread is threading.current_thread():
+                            self._thread = None
+                        return
+                    items, wait = self._take_due()
+                    if items:
+                        break
+                    self._cond.wait(wait)
+            self._deliver_all(items)
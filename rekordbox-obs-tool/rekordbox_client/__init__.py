@@ -1,3 +1,15 @@
 from .rekordbox_client import RekordboxClient
+from .track_info import TrackInfo
+from .change_feed import ContentChangeFeed, ContentChange
+from .event_bus import EventBus
+from .poll_scheduler import AdaptivePollScheduler
+from .now_playing import NowPlayingMonitor, TrackStarted, TrackChanged, SessionEnded
+from .progress import NowPlayingText
+from .worker import WorkerRekordboxClient
+from .device_library import DeviceLibraryClient
 
-__all__ = ['RekordboxClient'] 
\ No newline at end of file
+__all__ = [
+    'RekordboxClient', 'TrackInfo', 'ContentChangeFeed', 'ContentChange',
+    'EventBus', 'NowPlayingMonitor', 'TrackStarted', 'TrackChanged', 'SessionEnded',
+    'WorkerRekordboxClient', 'AdaptivePollScheduler', 'NowPlayingText', 'DeviceLibraryClient',
+] 
\ No newline at end of file
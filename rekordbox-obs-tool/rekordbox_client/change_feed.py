@@ -0,0 +1,156 @@
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional
+from datetime import datetime
+import logging
+from .rekordbox_client import RekordboxClient
+
+# 変更イベントの種類
+CHANGE_ADDED = "added"
+CHANGE_UPDATED = "updated"
+CHANGE_DELETED = "deleted"
+
+class ContentChange(NamedTuple):
+    """djmdContentの1行分の変更イベント"""
+    change_type: str
+    content_id: str
+    title: str
+    updated_at: Optional[datetime]
+    local_usn: Optional[int]
+    # RekordboxClient._format_track_info で整形できるフラットな行
+    track: Any
+
+class ContentChangeFeed:
+    """djmdContentの変更を差分で取得する変更フィード
+
+    最後に確認したrb_local_usnとupdated_atをウォーターマークとして保持し、
+    ポーリングごとにそれ以降に変更された行だけを問い合わせる。
+    1回のポーリングの処理量はライブラリの大きさではなく変更された行数に比例する。
+    """
+
+    def __init__(self, client: RekordboxClient, batch_size: int = 500, start_from_latest: bool = True):
+        """
+        Args:
+            client (RekordboxClient): データベース接続を提供するクライアント
+            batch_size (int): 1回の問い合わせで取得する行数
+            start_from_latest (bool): Trueの場合、最初のポーリングでは既存の行を通知せず
+                現在の最新位置からフィードを開始する
+        """
+        self.client = client
+        self.batch_size = batch_size
+        self.start_from_latest = start_from_latest
+        self.logger = logging.getLogger(__name__)
+        self._subscribers: List[Callable[[ContentChange], None]] = []
+        self._last_local_usn: Optional[int] = None
+        self._last_updated_at: Optional[datetime] = None
+        self._initialized = False
+
+    @property
+    def watermark(self):
+        """現在のウォーターマーク（rb_local_usn, updated_at）"""
+        return self._last_local_usn, self._last_updated_at
+
+    def subscribe(self, callback: Callable[[ContentChange], None]) -> Callable[[], None]:
+        """変更イベントの購読を登録する
+
+        Args:
+            callback (Callable[[ContentChange], None]): 変更ごとに呼び出される関数
+
+        Returns:
+            Callable[[], None]: 購読を解除する関数
+        """
+        self._subscribers.append(callback)
+        return lambda: self.unsubscribe(callback)
+
+    def unsubscribe(self, callback: Callable[[ContentChange], None]) -> None:
+        """変更イベントの購読を解除する"""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def poll(self) -> Iterator[ContentChange]:
+        """前回のポーリング以降に変更された行を取得する
+
+        取得した変更は登録済みの購読者にも通知される。
+
+        Returns:
+            Iterator[ContentChange]: 変更イベント（変更順）
+        """
+        try:
+            if not self.client.ensure_connected():
+                return iter(())
+
+            if not self._initialized:
+                self._initialized = True
+                if self.start_from_latest:
+                    self._seek_to_latest()
+                    return iter(())
+
+            changes = self._fetch_changes()
+        except Exception as e:
+            # 接続に関するエラーであればクライアントに再接続させる（ウォーターマークは進めていない）
+            self.logger.error(f"Error polling content changes: {e}")
+            self.client._handle_db_error(e)
+            return iter(())
+
+        for change in changes:
+            self._notify(change)
+        return iter(changes)
+
+    def _seek_to_latest(self) -> None:
+        """ウォーターマークを現在の最新位置に移動する"""
+        self._last_local_usn = self.client._max_local_usn()
+        latest = self.client._latest_content(1)
+        self._last_updated_at = latest[0].updated_at if latest else None
+
+    def _fetch_changes(self) -> List[ContentChange]:
+        """ウォーターマーク以降の変更をbatch_size件ずつ取得する
+
+        ウォーターマークはすべてのバッチを取得できた後にだけ進める。途中のバッチで例外が
+        発生した場合は以前のウォーターマークのままとし、次のポーリングで同じ行から取得し直す。
+        """
+        # 追加か更新かは、今回のポーリング開始時点のウォーターマークと作成日時で判定する
+        previous_updated_at = self._last_updated_at
+        last_local_usn = self._last_local_usn
+        last_updated_at = self._last_updated_at
+        changes = []
+        while True:
+            # rb_local_usnはローカルでの変更ごとに増加するため、変更順に並べられる
+            # 関連テーブルの名前も同じ問い合わせで取得し、行はそのまま整形に使える
+            from . import queries
+            rows = queries.changed_content(self.client.db, last_local_usn, self.batch_size)
+
+            for track in rows:
+                changes.append(self._to_change(track, previous_updated_at))
+                last_local_usn = track.rb_local_usn
+                if track.updated_at is not None and (
+                        last_updated_at is None or track.updated_at > last_updated_at):
+                    last_updated_at = track.updated_at
+            if len(rows) < self.batch_size:
+                self._last_local_usn = last_local_usn
+                self._last_updated_at = last_updated_at
+                return changes
+
+    @staticmethod
+    def _to_change(track, previous_updated_at: Optional[datetime]) -> ContentChange:
+        """djmdContentの行を変更イベントに変換する"""
+        if track.rb_local_deleted:
+            change_type = CHANGE_DELETED
+        elif (previous_updated_at is None
+              or (track.created_at is not None and track.created_at > previous_updated_at)):
+            change_type = CHANGE_ADDED
+        else:
+            change_type = CHANGE_UPDATED
+        return ContentChange(
+            change_type=change_type,
+            content_id=track.ID,
+            title=track.Title or '',
+            updated_at=track.updated_at,
+            local_usn=track.rb_local_usn,
+            track=track
+        )
+
+    def _notify(self, change: ContentChange) -> None:
+        """購読者に変更を通知する（購読者の例外はフィードを止めない）"""
+        for callback in list(self._subscribers):
+            try:
+                callback(change)
+            except Exception as e:
+                self.logger.error(f"Error in content change subscriber: {e}")
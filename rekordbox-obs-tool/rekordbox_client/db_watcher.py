@@ -0,0 +1,213 @@
+from typing import Callable, Dict, Optional, Tuple
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# inotifyのイベントマスク（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+# master.db本体と、rekordboxが書き込みに使うWAL・ジャーナルファイル
+# （-shmは読み取り側も更新するため監視しない）
+WATCHED_SUFFIXES = ('', '-wal', '-journal')
+
+# stop_eventを指定して待つ場合に、停止を確認する間隔（秒）
+STOP_CHECK_INTERVAL = 0.1
+
+class _Inotify:
+    """ctypes経由でinotifyを扱う最小限のラッパー"""
+
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def read_names(self, timeout: Optional[float]) -> Optional[set]:
+        """イベントを待ち、変更のあったファイル名の集合を返す（タイムアウト時はNone）"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return None
+        names = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class DatabaseWatcher:
+    """master.dbとWAL/ジャーナルファイルの変更を監視する
+
+    Linuxではinotifyでファイルの変更を待ち、それ以外の環境やinotifyが使えない場合は
+    一定間隔でファイルのサイズと更新時刻を確認する。いずれの場合もサイズか更新時刻が
+    実際に変わったときだけ変更とみなし、連続した書き込みはデバウンス期間でまとめる。
+    書き込みが続いて落ち着かない場合も、max_debounce秒（またはwait_for_changeのタイムアウト）で通知する。
+    """
+
+    def __init__(self, db_path: str, debounce: float = 0.25, poll_interval: float = 0.5,
+                 use_inotify: Optional[bool] = None, max_debounce: Optional[float] = None):
+        """
+        Args:
+            db_path (str): 監視するmaster.dbのパス
+            debounce (float): 最後の書き込みからこの秒数だけ変更が止まるまで通知を待つ
+            poll_interval (float): ファイル状態を確認する間隔（inotifyを使わない場合）
+            use_inotify (Optional[bool]): inotifyを使うか（Noneの場合はLinuxで自動的に使う）
+            max_debounce (Optional[float]): 変更を検知してから通知するまでの最大の待ち時間（秒）。
+                rekordboxが解析やインポートで書き込み続けていても、この秒数で通知する
+                （Noneの場合はdebounceの8倍）
+        """
+        self.db_path = os.path.abspath(db_path)
+        self.debounce = debounce
+        self.max_debounce = debounce * 8 if max_debounce is None else max_debounce
+        self.poll_interval = poll_interval
+        self.logger = logging.getLogger(__name__)
+        self._paths = [self.db_path + suffix for suffix in WATCHED_SUFFIXES]
+        self._names = {os.path.basename(path) for path in self._paths}
+        self._signature = self._snapshot()
+        self._inotify = None
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith('linux')
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(os.path.dirname(self.db_path))
+            except (OSError, AttributeError) as e:
+                self.logger.warning(f"inotify is not available, falling back to stat polling: {e}")
+
+    @property
+    def mode(self) -> str:
+        """監視方式（'inotify' または 'stat'）"""
+        return 'inotify' if self._inotify else 'stat'
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        """監視対象ファイルのサイズと更新時刻を取得する"""
+        signature = {}
+        for path in self._paths:
+            try:
+                st = os.stat(path)
+                signature[path] = (st.st_size, st.st_mtime_ns)
+            except FileNotFoundError:
+                continue
+        return signature
+
+    def _wait_for_event(self, timeout: Optional[float],
+                        stop_event: Optional[threading.Event] = None) -> bool:
+        """ファイルシステムのイベントを待つ（ファイル状態の変化は確認しない）"""
+        if self._inotify:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if stop_event is not None:
+                    # 停止を確認できるように短い間隔で区切って待つ
+                    remaining = STOP_CHECK_INTERVAL if remaining is None else min(remaining, STOP_CHECK_INTERVAL)
+                names = self._inotify.read_names(remaining)
+                if names is None:
+                    if stop_event is None or (deadline is not None and time.monotonic() >= deadline):
+                        return False
+                    continue
+                if names & self._names:
+                    return True
+        delay = self.poll_interval if timeout is None else min(self.poll_interval, timeout)
+        return not self._sleep(delay, stop_event)
+
+    def _sleep(self, seconds: float, stop_event: Optional[threading.Event]) -> bool:
+        """指定した秒数だけ待つ（stop_eventがセットされた場合はすぐに戻り、Trueを返す）"""
+        if stop_event is None:
+            time.sleep(seconds)
+            return False
+        return stop_event.wait(seconds)
+
+    def wait_for_change(self, timeout: Optional[float] = None,
+                        stop_event: Optional[threading.Event] = None) -> bool:
+        """監視対象ファイルが変更されるまで待つ
+
+        Args:
+            timeout (Optional[float]): 最大待ち時間（秒）。Noneの場合は無期限に待つ
+            stop_event (Optional[threading.Event]): セットされたら待つのをやめてFalseを返す
+                （デバウンス中も含め、STOP_CHECK_INTERVAL秒以内に戻る）
+
+        Returns:
+            bool: 変更があった場合はTrue、タイムアウトした（または停止された）場合はFalse
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if not self._wait_for_event(remaining, stop_event):
+                return False
+            signature = self._snapshot()
+            if signature != self._signature:
+                break
+
+        # 書き込みが落ち着くまで待ってからまとめて通知する
+        # （書き込みが続く場合もmax_debounceかタイムアウトで打ち切り、変更として通知する）
+        settle_deadline = time.monotonic() + self.max_debounce
+        if deadline is not None:
+            settle_deadline = min(settle_deadline, deadline)
+        while True:
+            remaining = settle_deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._sleep(min(self.debounce, remaining), stop_event):
+                return False
+            settled = self._snapshot()
+            if settled == signature:
+                break
+            signature = settled
+        self._signature = signature
+        return True
+
+    def run(self, callback: Callable[[], None], stop_event: threading.Event,
+            max_interval: Optional[float] = None) -> None:
+        """変更のたびにcallbackを呼び出す監視ループ
+
+        Args:
+            callback (Callable[[], None]): 変更時に呼び出す関数
+            stop_event (threading.Event): セットされるとループを終了する
+            max_interval (Optional[float]): 変更がなくてもこの秒数ごとにcallbackを呼び出す
+                （イベントの取りこぼしに備えた安全策）
+        """
+        while not stop_event.is_set():
+            changed = self.wait_for_change(timeout=max_interval if max_interval else 1.0,
+                                           stop_event=stop_event)
+            if stop_event.is_set():
+                break
+            if changed or max_interval:
+                try:
+                    callback()
+                except Exception as e:
+                    self.logger.error(f"Error in database change callback: {e}")
+
+    def close(self) -> None:
+        """監視を終了する"""
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
@@ -0,0 +1,309 @@
+"""
+USB・SDカードにエクスポートされたライブラリ（export.pdb）の読み取り
+
+CDJ向けにエクスポートしたメディアにはmaster.dbはなく、DeviceSQL形式のexport.pdbだけがある。
+ファイルはテーブルごとのページの連結リストで、各ページの末尾に行の位置の索引がある
+（形式はDeep SymmetryのCrate Diggerによる解析に従う）。
+
+DeviceLibraryClientはファイルをメモリマップし、ページを1つずつ解釈して
+曲の数値の項目と行の位置だけを配列に持つ索引を作る。タイトルなどの文字列は
+曲情報が必要になったときに行の位置から読むため、2万曲のメディアでも数十ミリ秒で開ける。
+曲情報はRekordboxClientと同じTrackInfoとして返すため、表示やOBSへの送信はそのまま使える。
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from array import array
+import logging
+import mmap
+import os
+import struct
+from . import formatter
+from .track_info import TrackInfo
+
+# export.pdbのメディア上の位置
+EXPORT_PATH = os.path.join('PIONEER', 'rekordbox', 'export.pdb')
+
+# テーブルの種類
+TABLE_TRACKS = 0
+TABLE_GENRES = 1
+TABLE_ARTISTS = 2
+TABLE_ALBUMS = 3
+TABLE_KEYS = 5
+TABLE_HISTORY_PLAYLISTS = 11
+TABLE_HISTORY_ENTRIES = 12
+
+# ファイルヘッダー（ページ0）：(0, ページサイズ, テーブル数, 次の未使用ページ, 不明, シーケンス, 0)
+FILE_HEADER = struct.Struct('<7I')
+# テーブルの位置：(種類, 空きページの候補, 最初のページ, 最後のページ)
+TABLE_POINTER = struct.Struct('<4I')
+# ページヘッダー：(0, ページ番号, 種類, 次のページ, 不明, 不明, 行数(小), 不明, 不明, フラグ,
+#                 空き容量, 使用量, 不明, 行数(大), 不明, 不明)
+PAGE_HEADER = struct.Struct('<6I4B6H')
+PAGE_HEAP_OFFSET = PAGE_HEADER.size
+# 行の索引は16行ごとのグループで、ページの末尾から前に向かって並ぶ
+ROW_GROUP_SIZE = 0x24
+ROWS_PER_GROUP = 16
+# ページフラグのこのビットが立っているページは行を持たない
+PAGE_FLAG_NO_DATA = 0x40
+
+# 曲の行：索引に持つ項目（キーID@32, BPM×100@56, アーティストID@68, ID@72, 長さ(秒)@84）
+TRACK_INDEX_FIELDS = struct.Struct('<32xI20xI8xII8xH')
+# 曲の行：索引に持たない数値の項目（ジャンルID@60, アルバムID@64, 再生回数@78, レーティング@89）
+TRACK_DETAIL_FIELDS = struct.Struct('<60xII10xH9xB')
+# 曲の行：文字列の位置（行の先頭からの相対位置、21個）
+TRACK_STRING_OFFSETS = struct.Struct('<21H')
+TRACK_STRINGS_POS = 0x5e
+TRACK_STRING_ANALYZE_PATH = 14
+TRACK_STRING_COMMENT = 16
+TRACK_STRING_TITLE = 17
+TRACK_STRING_FILE_PATH = 20
+
+_U1 = struct.Struct('<B')
+_U2 = struct.Struct('<H')
+_U4 = struct.Struct('<I')
+_STRING_SHORT_FLAG = 0x01
+_STRING_LONG_ASCII = 0x40
+_STRING_LONG_UTF16 = 0x90
+
+def read_string(buf, pos: int) -> str:
+    """DeviceSQLの文字列を読む
+
+    先頭1バイトの最下位ビットが立っていれば短いASCII（長さは上位7ビット）、
+    0x40なら長いASCII、0x90なら長いUTF-16LE（いずれも続く2バイトが長さ）。
+    """
+    kind = buf[pos]
+    if kind & _STRING_SHORT_FLAG:
+        return bytes(buf[pos + 1:pos + (kind >> 1)]).decode('ascii', 'replace')
+    if kind in (_STRING_LONG_ASCII, _STRING_LONG_UTF16):
+        length = _U2.unpack_from(buf, pos + 1)[0]
+        data = bytes(buf[pos + 4:pos + length])
+        if kind == _STRING_LONG_UTF16:
+            return data.decode('utf-16-le', 'replace')
+        return data.decode('ascii', 'replace')
+    return ''
+
+class PdbFile:
+    """export.pdbのページと行の位置を読む"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+        _, self.page_size, num_tables, _, _, self.sequence, _ = FILE_HEADER.unpack_from(self.buf)
+        if not self.page_size:
+            self.close()
+            raise ValueError(f"{path} is not an export.pdb file")
+        self.tables: Dict[int, Tuple[int, int]] = {}
+        for i in range(num_tables):
+            table_type, _, first, last = TABLE_POINTER.unpack_from(
+                self.buf, FILE_HEADER.size + i * TABLE_POINTER.size
+            )
+            self.tables[table_type] = (first, last)
+
+    def close(self) -> None:
+        self.buf.close()
+        self._file.close()
+
+    def pages(self, table_type: int) -> Iterator[int]:
+        """テーブルのページの先頭位置を連結リストの順に返す"""
+        if table_type not in self.tables:
+            return
+        page, last = self.tables[table_type]
+        seen = set()
+        size = len(self.buf)
+        while page not in seen and (page + 1) * self.page_size <= size:
+            seen.add(page)
+            yield page * self.page_size
+            if page == last:
+                return
+            page = _U4.unpack_from(self.buf, page * self.page_size + 12)[0]
+
+    def rows(self, table_type: int) -> Iterator[int]:
+        """テーブルの有効な行の先頭位置を返す（ページを1つずつ解釈する）"""
+        buf = self.buf
+        page_size = self.page_size
+        for base in self.pages(table_type):
+            header = PAGE_HEADER.unpack_from(buf, base)
+            page_type, flags, rows_small, rows_large = header[2], header[9], header[6], header[13]
+            if page_type != table_type or flags & PAGE_FLAG_NO_DATA:
+                continue
+            num_rows = rows_large if rows_small < rows_large != 0x1fff else rows_small
+            heap = base + PAGE_HEAP_OFFSET
+            for group in range((num_rows + ROWS_PER_GROUP - 1) // ROWS_PER_GROUP):
+                group_end = base + page_size - group * ROW_GROUP_SIZE
+                present = _U2.unpack_from(buf, group_end - 4)[0]
+                count = min(ROWS_PER_GROUP, num_rows - group * ROWS_PER_GROUP)
+                for index in range(count):
+                    if present >> index & 1:
+                        yield heap + _U2.unpack_from(buf, group_end - 6 - 2 * index)[0]
+
+class DeviceLibraryClient:
+    """エクスポートされたメディアのexport.pdbから曲情報を取得するクライアント
+
+    RekordboxClientと同様に、曲情報はTrackInfoとして返す。CDJのエクスポートには
+    再生中の曲の情報はないため、get_current_trackはメディアに記録された再生履歴
+    （最新の履歴プレイリストの最後の曲）を返す。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): export.pdbのパス、またはメディアのルートディレクトリ
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, EXPORT_PATH)
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._pdb: Optional[PdbFile] = None
+        self._artists: Dict[int, str] = {}
+        self._albums: Dict[int, str] = {}
+        self._genres: Dict[int, str] = {}
+        self._keys: Dict[int, str] = {}
+        # 曲の索引（列ごとの配列。添字が同じ要素が同じ曲。文字列は行の位置から読む）
+        self._ids = array('I')
+        self._rows = array('Q')
+        self._key_ids = array('I')
+        self._tempos = array('I')
+        self._artist_ids = array('I')
+        self._durations = array('H')
+        self._slots: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def track_ids(self) -> array:
+        return self._ids
+
+    @property
+    def analysis_root(self) -> str:
+        """曲の解析ファイルのパスの起点（メディアのルートディレクトリ）"""
+        return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(self.path))))
+
+    def connect(self) -> bool:
+        """export.pdbを開いて索引を作成する"""
+        self.close()
+        try:
+            pdb = PdbFile(self.path)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Failed to open device library: {e}")
+            return False
+        self._pdb = pdb
+        self._artists = self._names(TABLE_ARTISTS, self._artist_name)
+        self._albums = self._names(TABLE_ALBUMS, self._album_name)
+        self._genres = self._names(TABLE_GENRES, lambda row: read_string(pdb.buf, row + 4))
+        self._keys = self._names(TABLE_KEYS, lambda row: read_string(pdb.buf, row + 8))
+
+        ids, rows = array('I'), array('Q')
+        key_ids, tempos, artist_ids, durations = array('I'), array('I'), array('I'), array('H')
+        unpack = TRACK_INDEX_FIELDS.unpack_from
+        buf = pdb.buf
+        for row in pdb.rows(TABLE_TRACKS):
+            key_id, tempo, artist_id, track_id, duration = unpack(buf, row)
+            ids.append(track_id)
+            rows.append(row)
+            key_ids.append(key_id)
+            tempos.append(tempo)
+            artist_ids.append(artist_id)
+            durations.append(duration)
+        self._ids, self._rows = ids, rows
+        self._key_ids, self._tempos, self._artist_ids, self._durations = key_ids, tempos, artist_ids, durations
+        self._slots = {track_id: slot for slot, track_id in enumerate(ids)}
+        self.logger.info(f"Opened device library with {len(ids)} tracks")
+        return True
+
+    def close(self) -> None:
+        """export.pdbを閉じる"""
+        pdb, self._pdb = self._pdb, None
+        if pdb is not None:
+            pdb.close()
+
+    def get_track(self, track_id: int) -> Optional[TrackInfo]:
+        """曲のIDから曲情報を取得する（見つからなければNone）"""
+        tracks = self.get_tracks([track_id])
+        return tracks[0] if tracks else None
+
+    def get_tracks(self, track_ids) -> List[TrackInfo]:
+        """複数の曲の曲情報をまとめて取得する（見つからないIDは除く）"""
+        if self._pdb is None and not self.connect():
+            return []
+        slots = [self._slots[int(i)] for i in track_ids if int(i) in self._slots]
+        return formatter.format_columns(self._columns(slots))
+
+    def get_current_track(self) -> Optional[TrackInfo]:
+        """メディアに記録された最後の再生の曲情報を取得する（履歴がなければNone）"""
+        history = self.get_history(limit=1)
+        return history[0] if history else None
+
+    def get_history(self, limit: int = 10) -> List[TrackInfo]:
+        """最新の履歴プレイリストの曲を新しい順に取得する"""
+        if self._pdb is None and not self.connect():
+            return []
+        buf = self._pdb.buf
+        playlists = [_U4.unpack_from(buf, row)[0] for row in self._pdb.rows(TABLE_HISTORY_PLAYLISTS)]
+        if not playlists:
+            return []
+        latest = max(playlists)
+        entries = []
+        for row in self._pdb.rows(TABLE_HISTORY_ENTRIES):
+            track_id, playlist_id, index = struct.unpack_from('<3I', buf, row)
+            if playlist_id == latest:
+                entries.append((index, track_id))
+        entries.sort(reverse=True)
+        return self.get_tracks(track_id for _, track_id in entries[:limit])
+
+    def _names(self, table_type: int, read_name) -> Dict[int, str]:
+        """ID（行の先頭の4バイト以外の位置にある場合はread_nameが読む）から名前への辞書"""
+        names = {}
+        for row in self._pdb.rows(table_type):
+            names[self._row_id(table_type, row)] = read_name(row)
+        return names
+
+    def _row_id(self, table_type: int, row: int) -> int:
+        buf = self._pdb.buf
+        if table_type == TABLE_ARTISTS:
+            return _U4.unpack_from(buf, row + 4)[0]
+        if table_type == TABLE_ALBUMS:
+            return _U4.unpack_from(buf, row + 12)[0]
+        return _U4.unpack_from(buf, row)[0]
+
+    def _artist_name(self, row: int) -> str:
+        buf = self._pdb.buf
+        subtype = _U2.unpack_from(buf, row)[0]
+        offset = _U2.unpack_from(buf, row + 10)[0] if subtype & 0x04 else buf[row + 9]
+        return read_string(buf, row + offset)
+
+    def _album_name(self, row: int) -> str:
+        buf = self._pdb.buf
+        subtype = _U2.unpack_from(buf, row)[0]
+        offset = _U2.unpack_from(buf, row + 22)[0] if subtype & 0x04 else buf[row + 21]
+        return read_string(buf, row + offset)
+
+    def _columns(self, slots: List[int]) -> Dict[str, list]:
+        """索引の添字から、formatter.format_columnsに渡す列ごとの配列を作る"""
+        buf = self._pdb.buf
+        columns: Dict[str, list] = {name: [] for name in (
+            'ID', 'Title', 'ArtistName', 'AlbumName', 'GenreName', 'BPM', 'KeyName',
+            'Rating', 'Commnt', 'Length', 'FolderPath', 'DJPlayCount', 'AnalysisDataPath',
+        )}
+        for slot in slots:
+            row = self._rows[slot]
+            genre_id, album_id, play_count, rating = TRACK_DETAIL_FIELDS.unpack_from(buf, row)
+            strings = TRACK_STRING_OFFSETS.unpack_from(buf, row + TRACK_STRINGS_POS)
+            columns['ID'].append(str(self._ids[slot]))
+            columns['Title'].append(read_string(buf, row + strings[TRACK_STRING_TITLE]))
+            columns['ArtistName'].append(self._artists.get(self._artist_ids[slot], ''))
+            columns['AlbumName'].append(self._albums.get(album_id, ''))
+            columns['GenreName'].append(self._genres.get(genre_id, ''))
+            columns['BPM'].append(self._tempos[slot])
+            columns['KeyName'].append(self._keys.get(self._key_ids[slot], ''))
+            columns['Rating'].append(rating)
+            columns['Commnt'].append(read_string(buf, row + strings[TRACK_STRING_COMMENT]))
+            columns['Length'].append(self._durations[slot])
+            columns['FolderPath'].append(read_string(buf, row + strings[TRACK_STRING_FILE_PATH]))
+            columns['DJPlayCount'].append(play_count)
+            columns['AnalysisDataPath'].append(read_string(buf, row + strings[TRACK_STRING_ANALYZE_PATH]))
+        return columns
@@ -0,0 +1,92 @@
+from typing import Any, Dict, Optional
+import argparse
+import logging
+import sys
+
+# 曲の全属性を出力するためのログカテゴリ（通常の処理では使わない）
+logger = logging.getLogger(__name__)
+
+def dump_track_attributes(track) -> Dict[str, Any]:
+    """
+    曲オブジェクトの公開属性をすべて取得する
+
+    関連テーブルの遅延読み込みも発生するため、調査時にだけ使う。
+
+    Args:
+        track: DjmdContentのORMオブジェクト
+
+    Returns:
+        Dict[str, Any]: 属性名と値の辞書（取得に失敗した属性はエラー内容）
+    """
+    attributes = {}
+    for attr in dir(track):
+        if attr.startswith('_') or attr in ('metadata', 'registry'):
+            continue
+        try:
+            value = getattr(track, attr)
+        except Exception as e:
+            value = f"[Error: {e}]"
+        if callable(value):
+            continue
+        attributes[attr] = value
+    return attributes
+
+def log_track_attributes(track, level: int = logging.DEBUG) -> None:
+    """
+    診断用ログカテゴリが有効な場合だけ曲の全属性をログに出力する
+
+    Args:
+        track: DjmdContentのORMオブジェクト
+        level (int): 出力するログレベル
+    """
+    if not logger.isEnabledFor(level):
+        return
+    logger.log(level, "Available attributes for track %s:", getattr(track, 'Title', ''))
+    for attr, value in dump_track_attributes(track).items():
+        logger.log(level, "  %s: %s", attr, value)
+
+def find_track(client, content_id: Optional[str] = None):
+    """
+    診断対象の曲をORMオブジェクトとして取得する
+
+    Args:
+        client (RekordboxClient): 接続済みのクライアント
+        content_id (Optional[str]): 曲のID（Noneの場合は最後に更新された曲）
+
+    Returns:
+        DjmdContentのORMオブジェクト（見つからない場合はNone）
+    """
+    if content_id is not None:
+        return client.db.get_content(ID=content_id)
+    latest = client._latest_content(1)
+    return client.db.get_content(ID=latest[0].ID) if latest else None
+
+def main(argv=None) -> int:
+    """曲の全属性を表示するデバッグコマンド"""
+    from .rekordbox_client import RekordboxClient
+
+    parser = argparse.ArgumentParser(description="rekordboxの曲の全属性を表示する")
+    parser.add_argument("content_id", nargs="?", help="曲のID（省略時は最後に更新された曲）")
+    parser.add_argument("--db", dest="db_path", help="master.dbのパス")
+    parser.add_argument("--key", help="データベースキー")
+    parser.add_argument("--no-unlock", action="store_true", help="暗号化されていないデータベースを開く")
+    args = parser.parse_args(argv)
+
+    client = RekordboxClient(key=args.key, db_path=args.db_path, unlock=not args.no_unlock)
+    if not client.connect():
+        print("Could not connect to rekordbox database")
+        return 1
+    try:
+        track = find_track(client, args.content_id)
+        if track is None:
+            print("Track not found")
+            return 1
+        print(f"Available attributes for track {track.Title}:")
+        for attr, value in dump_track_attributes(track).items():
+            print(f"  {attr}: {value}")
+        return 0
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
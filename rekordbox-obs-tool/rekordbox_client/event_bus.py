@@ -0,0 +1,129 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+import logging
+import queue
+import threading
+
+# 配信スレッドを終了させるための番兵
+_STOP = object()
+
+class _Subscription:
+    """1つの購読者への配信キューと配信スレッド"""
+
+    def __init__(self, callback: Callable[[Any], None], event_types: Optional[Tuple[Type, ...]],
+                 maxsize: int, logger: logging.Logger):
+        self.callback = callback
+        self.event_types = event_types
+        self.logger = logger
+        self.dropped = 0
+        self.delivered = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name=f"EventBus-{getattr(callback, '__name__', 'subscriber')}", daemon=True
+        )
+        self._thread.start()
+
+    def accepts(self, event: Any) -> bool:
+        return self.event_types is None or isinstance(event, self.event_types)
+
+    def offer(self, event: Any) -> None:
+        """イベントをキューに入れる（満杯の場合は最も古いイベントを捨てる）"""
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(event)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def close(self, timeout: Optional[float]) -> None:
+        self.offer(_STOP)
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            event = self._queue.get()
+            if event is _STOP:
+                return
+            try:
+                self.callback(event)
+                self.delivered += 1
+            except Exception as e:
+                self.logger.error(f"Error in event subscriber: {e}")
+
+class EventBus:
+    """購読者ごとに上限付きのキューを持つpub/subバス
+
+    publishは購読者のキューに入れるだけで待たないため、配信元（ポーリング）が
+    購読者の処理時間に影響されることはない。購読者はそれぞれ専用のスレッドで順番に
+    イベントを受け取り、処理が追いつかずキューが満杯になった場合は古いイベントから捨てられる。
+    """
+
+    def __init__(self, maxsize: int = 100):
+        """
+        Args:
+            maxsize (int): 購読者ごとのキューに保持するイベント数の上限
+        """
+        self.maxsize = maxsize
+        self.logger = logging.getLogger(__name__)
+        self._subscriptions: List[_Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Any], None], event_types: Optional[Tuple[Type, ...]] = None,
+                  maxsize: Optional[int] = None) -> Callable[[], None]:
+        """イベントの購読を登録する
+
+        Args:
+            callback (Callable[[Any], None]): イベントごとに購読者のスレッドで呼び出される関数
+            event_types (Optional[Tuple[Type, ...]]): 受け取るイベントの型（Noneの場合はすべて）
+            maxsize (Optional[int]): この購読者のキューの上限（Noneの場合はバスの既定値）
+
+        Returns:
+            Callable[[], None]: 購読を解除する関数
+        """
+        subscription = _Subscription(callback, event_types, maxsize or self.maxsize, self.logger)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return lambda: self._unsubscribe(subscription)
+
+    def _unsubscribe(self, subscription: _Subscription, timeout: Optional[float] = 1.0) -> None:
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+        subscription.close(timeout)
+
+    def publish(self, event: Any) -> None:
+        """イベントを購読者に配信する（購読者の処理を待たない）"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.accepts(event):
+                subscription.offer(event)
+
+    @property
+    def stats(self) -> List[Dict[str, Any]]:
+        """購読者ごとの配信数・破棄数・未配信数"""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return [
+            {
+                'subscriber': getattr(s.callback, '__name__', repr(s.callback)),
+                'delivered': s.delivered,
+                'dropped': s.dropped,
+                'pending': s._queue.qsize(),
+            }
+            for s in subscriptions
+        ]
+
+    def close(self, timeout: Optional[float] = 1.0) -> None:
+        """すべての購読を解除し、配信スレッドを終了する"""
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscription in subscriptions:
+            subscription.close(timeout)
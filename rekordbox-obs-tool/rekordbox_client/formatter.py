@@ -0,0 +1,124 @@
+"""
+曲情報の一括整形
+
+問い合わせ結果の行（または列ごとの配列）をまとめてTrackInfoに変換する。
+列ごとに1回ずつ変換を行い、行ごとの属性確認や例外処理を避けることで、
+数千曲の履歴やライブラリ全体の表示でも数ミリ秒で整形できるようにする。
+"""
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+from datetime import datetime
+from utils.time_utils import format_duration
+from .key_index import KeyIndex, key_notations
+from .track_info import TrackInfo
+
+# 整形に使う列名（queries.TRACK_COLUMNSのラベル）と、列がない場合の既定値
+SOURCE_COLUMNS = {
+    'ID': None,
+    'Title': '',
+    'ArtistName': '',
+    'AlbumName': '',
+    'GenreName': '',
+    'BPM': 0,
+    'KeyID': None,
+    'KeyName': '',
+    'Rating': 0,
+    'Commnt': '',
+    'Length': 0,
+    'FolderPath': '',
+    'DJPlayCount': 0,
+    'AnalysisDataPath': '',
+    'updated_at': None,
+    'PlayedAt': None,
+}
+
+def scale_bpm(value: Any) -> float:
+    """100倍の整数値として保存されたBPMを実際のBPMに変換する（無効な値は0）"""
+    try:
+        bpm = float(value)
+    except (ValueError, TypeError):
+        return 0
+    return round(bpm / 100, 2) if bpm > 0 else 0
+
+def format_played_at(value: Optional[datetime]) -> Optional[str]:
+    """日時を「YYYY-MM-DD HH:MM:SS」形式に変換する（strftimeより高速なisoformatを使う）"""
+    if value is None:
+        return None
+    return value.isoformat(' ', 'seconds')[:19]
+
+class _LengthCache(dict):
+    """曲の長さ（秒）から表示文字列への変換結果を使い回す"""
+
+    def __missing__(self, seconds):
+        value = format_duration(seconds) if seconds else ''
+        self[seconds] = value
+        return value
+
+def format_columns(columns: Mapping[str, Sequence[Any]],
+                   keys: Optional[KeyIndex] = None) -> List[TrackInfo]:
+    """列ごとの配列をまとめて曲情報に変換する
+
+    Args:
+        columns (Mapping[str, Sequence[Any]]): 列名（SOURCE_COLUMNSのキー）と値の配列。
+            存在しない列は既定値で補う。PlayedAtがあれば再生時刻として使う
+        keys (Optional[KeyIndex]): KeyIDからキーを引く索引（KeyName列がある場合は不要）
+
+    Returns:
+        List[TrackInfo]: 行の順序を保った曲情報
+    """
+    count = max((len(values) for values in columns.values()), default=0)
+
+    def column(name):
+        values = columns.get(name)
+        if values is None:
+            return [SOURCE_COLUMNS[name]] * count
+        return values
+
+    def text(name):
+        return [value or '' for value in column(name)]
+
+    # 再生履歴の時刻があればそれを、なければupdated_atを再生時刻とする
+    played_at = [
+        played if played is not None else updated
+        for played, updated in zip(column('PlayedAt'), column('updated_at'))
+    ]
+    bpms = [scale_bpm(value) for value in column('BPM')]
+    if columns.get('KeyName') is None and keys is not None:
+        key_info = keys.lookup_many(column('KeyID'))
+    else:
+        key_info = [key_notations(name) for name in column('KeyName')]
+    durations = [value or 0 for value in column('Length')]
+    lengths = _LengthCache()
+
+    return [
+        TrackInfo(
+            content_id, timestamp, title, artist, album, genre, bpm, key[0], rating, comment,
+            duration, file_path, format_played_at(timestamp), play_count, lengths[duration],
+            key[1], key[2], analysis_path
+        )
+        for (content_id, timestamp, title, artist, album, genre, bpm, key, rating, comment,
+             duration, file_path, play_count, analysis_path) in zip(
+            column('ID'), played_at, text('Title'), text('ArtistName'), text('AlbumName'),
+            text('GenreName'), bpms, key_info, column('Rating'), text('Commnt'),
+            durations, text('FolderPath'), column('DJPlayCount'), text('AnalysisDataPath')
+        )
+    ]
+
+def format_rows(rows: Iterable[Any], keys: Optional[KeyIndex] = None) -> List[TrackInfo]:
+    """問い合わせ結果の行をまとめて曲情報に変換する
+
+    Args:
+        rows (Iterable[Any]): queries.track_query / play_query の行（名前付きの列を持つRow）
+        keys (Optional[KeyIndex]): KeyIDからキーを引く索引
+
+    Returns:
+        List[TrackInfo]: 行の順序を保った曲情報
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    columns: Dict[str, Sequence[Any]] = {}
+    for name, values in zip(fields, zip(*rows)):
+        if name in SOURCE_COLUMNS:
+            columns[name] = values
+    return format_columns(columns, keys)
@@ -1,6 +1,4 @@
 import os
-import sqlite3
-import binascii
 
 def get_database_path():
     """rekordboxデータベースのパスを取得する"""
@@ -16,39 +14,43 @@ def get_database_path():
     
     return db_path
 
-def get_database_key():
-    """rekordboxのデータベースキーを取得する"""
+def get_database_key(refresh=False, cache=False):
+    """rekordboxのデータベースキーを取得する
+
+    cacheを指定した場合、取得したキーはDatabaseKeyProviderのキャッシュファイルに保存され、
+    master.dbのヘッダーが変わらない限り、次回からはrekordboxの設定を読まずにキャッシュから返す
+    （Windows以外ではキーが平文で保存される。key_providerの説明を参照）。
+
+    Args:
+        refresh (bool): キャッシュを破棄して取得し直す
+        cache (bool): キャッシュファイルを読み書きする
+    """
+    from rekordbox_client.key_provider import DatabaseKeyProvider
+
     db_path = get_database_path()
     if not db_path:
         return None
 
+    provider = DatabaseKeyProvider(persist=cache)
     try:
-        # データベースファイルの先頭1024バイトを読み込む
-        with open(db_path, 'rb') as f:
-            header = f.read(1024)
-
-        # SQLCipher4のヘッダーを探す
-        if b'SQLite format 3' not in header:
-            print("Not a valid SQLite database file")
-            return None
-
-        # ヘッダーの後の16バイトがキーの可能性がある
-        key_data = header[100:116]  # SQLite header size is 100 bytes
-        key = binascii.hexlify(key_data).decode()
-        print(f"Found potential key: {key}")
-        
-        # キーが正しいかテストする
-        try:
-            conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
-            conn.close()
-            print("Warning: Database is not encrypted")
-            return None
-        except sqlite3.OperationalError:
-            print("Database is encrypted (this is expected)")
-            return key
+        if refresh:
+            provider.invalidate(db_path)
+        resolved = provider.resolve(db_path)
     except Exception as e:
         print(f"Error: {e}")
-    
+        resolved = None
+    else:
+        if resolved is None and provider.stats['discoveries'] == 0:
+            print("Warning: Database is not encrypted")
+            return None
+
+    if resolved is not None:
+        source = "cache" if provider.stats['hits'] else "rekordbox configuration"
+        print(f"Found key ({source}): {resolved.key}")
+        if cache:
+            print(f"Cached at: {provider.cache_path}")
+        return resolved.key
+
     print("Could not find database key")
     print("Please make sure:")
     print("1. Rekordbox is not running")
@@ -58,4 +60,5 @@ def get_database_key():
     return None
 
 if __name__ == "__main__":
-    get_database_key() 
\ No newline at end of file
+    import sys
+    get_database_key(refresh="--refresh" in sys.argv[1:], cache="--cache" in sys.argv[1:])
@@ -0,0 +1,119 @@
+"""
+キー（DjmdKey）の索引と表記の変換
+
+DjmdKeyを一度だけ読み込み、キーのIDから「キー名・Camelot表記・Open Key表記」を
+配列の添字で引けるようにする。テーブルが変更された場合だけ読み込み直す。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+import logging
+
+# 音名からピッチクラス（Cを0とする半音の数）への対応
+_PITCH_CLASSES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# キー名・Camelot表記・Open Key表記の組
+KeyNotation = Tuple[str, str, str]
+EMPTY_KEY: KeyNotation = ('', '', '')
+
+@lru_cache(maxsize=None)
+def key_notations(name: Optional[str]) -> KeyNotation:
+    """
+    rekordboxのキー名（"Am", "F#m", "Db" など）をCamelot表記とOpen Key表記に変換する
+
+    Args:
+        name (Optional[str]): rekordboxのキー名
+
+    Returns:
+        KeyNotation: (キー名, Camelot表記, Open Key表記)。解釈できない場合の表記は空文字列
+    """
+    if not name:
+        return EMPTY_KEY
+    text = name.strip()
+    pitch = _PITCH_CLASSES.get(text[:1].upper())
+    if pitch is None:
+        return (name, '', '')
+    rest = text[1:]
+    if rest[:1] in ('#', '♯'):
+        pitch, rest = pitch + 1, rest[1:]
+    elif rest[:1] in ('b', '♭'):
+        pitch, rest = pitch - 1, rest[1:]
+    if rest in ('m', 'min', 'minor'):
+        minor = True
+    elif rest in ('', 'maj', 'major'):
+        minor = False
+    else:
+        return (name, '', '')
+
+    # 短調は平行調（短3度上の長調）と同じ番号になる
+    major_pitch = (pitch + 3) % 12 if minor else pitch % 12
+    # 5度圏の位置（Cを0とする）から番号を求める。CamelotではCが8B、Open KeyではCが1d
+    position = (major_pitch * 7) % 12
+    camelot = f"{(position + 7) % 12 + 1}{'A' if minor else 'B'}"
+    open_key = f"{position + 1}{'m' if minor else 'd'}"
+    return (name, camelot, open_key)
+
+class KeyIndex:
+    """DjmdKeyのIDからキーの表記を引く索引
+
+    IDは数値の文字列であることがほとんどのため、整数に変換して配列の添字として引く。
+    数値でないIDは辞書で引く。
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._by_number: List[KeyNotation] = []
+        self._by_id: Dict[str, KeyNotation] = {}
+        self._signature = None
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def load(self, rows) -> None:
+        """(ID, キー名)の組から索引を作成する"""
+        by_id = {}
+        for key_id, name in rows:
+            by_id[str(key_id)] = key_notations(name)
+        numbers = [int(key_id) for key_id in by_id if key_id.isdigit()]
+        by_number = [EMPTY_KEY] * (max(numbers) + 1 if numbers else 0)
+        for number in numbers:
+            by_number[number] = by_id[str(number)]
+        self._by_id = by_id
+        self._by_number = by_number
+
+    def refresh(self, db) -> bool:
+        """DjmdKeyが変更されていれば読み込み直す
+
+        Args:
+            db: 接続済みのRekordbox6Database
+
+        Returns:
+            bool: 読み込み直した場合はTrue
+        """
+        from . import queries
+        signature = queries.key_signature(db)
+        if signature == self._signature:
+            return False
+        self.load(queries.key_rows(db))
+        self._signature = signature
+        self.logger.debug("Loaded %d keys", len(self._by_id))
+        return True
+
+    def invalidate(self) -> None:
+        """次のrefreshで必ず読み込み直すようにする"""
+        self._signature = None
+
+    def lookup(self, key_id: Any) -> KeyNotation:
+        """キーのIDから(キー名, Camelot表記, Open Key表記)を取得する（不明なIDは空文字列）"""
+        if key_id is None:
+            return EMPTY_KEY
+        if isinstance(key_id, int) or (isinstance(key_id, str) and key_id.isdigit()):
+            number = int(key_id)
+            if number < len(self._by_number):
+                return self._by_number[number]
+            return EMPTY_KEY
+        return self._by_id.get(str(key_id), EMPTY_KEY)
+
+    def lookup_many(self, key_ids) -> List[KeyNotation]:
+        """複数のキーのIDをまとめて引く"""
+        lookup = self.lookup
+        return [lookup(key_id) for key_id in key_ids]
@@ -0,0 +1,224 @@
+"""
+データベースキーの取得とキャッシュ
+
+暗号化されたmaster.dbに接続するたびに、pyrekordboxはrekordboxの設定からキーを探し、
+SQLCipherは256,000回のPBKDF2でキーからページの暗号鍵を導出する（接続の時間の大半）。
+DatabaseKeyProviderはキーを一度だけ取得して導出済みの暗号鍵（raw key）と合わせて
+キャッシュし、以降の接続では取得と導出の両方を省く。
+
+キャッシュは既定ではプロセスのメモリの中だけに持つ。persist=Trueの場合だけディスクに保存する。
+キーと暗号鍵はデータベースを復号できる秘密であり、Windowsではユーザーのアカウントに結び付いた
+DPAPI（CryptProtectData）で保護して保存する。それ以外のOSでは保護する手段がないため平文で
+保存し、ファイルの権限（0600）だけで守る。同じユーザーで動くプログラムやバックアップからは読めるため、
+共有のマシンではpersistを有効にしないこと。
+
+導出した暗号鍵はデータベースファイルの先頭16バイト（SQLCipherのソルト）に依存するため、
+キャッシュはデータベースのパスとソルトから求めた指紋で管理し、指紋が変わった場合だけ導出し直す。
+"""
+from typing import Any, Callable, Dict, NamedTuple, Optional
+import base64
+import ctypes
+import hashlib
+import json
+import logging
+import os
+import sys
+from utils.paths import user_cache_dir
+
+# SQLCipher 4の既定の鍵導出の設定（rekordboxのmaster.dbもこの設定で暗号化されている）
+SQLCIPHER_KDF_ITERATIONS = 256000
+SQLCIPHER_KEY_SIZE = 32
+SQLCIPHER_SALT_SIZE = 16
+
+# 暗号化されていないSQLiteファイルの先頭
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+# キャッシュファイルに保存する秘密の保護の方法（Noneは平文）
+SECRET_PROTECTION = 'dpapi' if sys.platform == 'win32' else None
+
+# CryptProtectDataでUIを表示しない
+_CRYPTPROTECT_UI_FORBIDDEN = 0x1
+
+class _DataBlob(ctypes.Structure):
+    """DPAPIのDATA_BLOB"""
+    _fields_ = [('cbData', ctypes.c_uint32), ('pbData', ctypes.POINTER(ctypes.c_char))]
+
+class ResolvedKey(NamedTuple):
+    """取得したキーと、SQLCipherに直接渡せる導出済みの暗号鍵（"x'...'" 形式）"""
+    key: str
+    raw_key: str
+
+def default_cache_path() -> str:
+    """キャッシュファイルの既定のパス（ユーザーごとのキャッシュディレクトリ）"""
+    return os.path.join(user_cache_dir(), 'db_keys.json')
+
+def read_salt(db_path: str) -> Optional[bytes]:
+    """SQLCipherのソルト（ファイルの先頭16バイト）を読む（暗号化されていなければNone）"""
+    with open(db_path, 'rb') as f:
+        salt = f.read(SQLCIPHER_SALT_SIZE)
+    if len(salt) < SQLCIPHER_SALT_SIZE or salt == SQLITE_HEADER:
+        return None
+    return salt
+
+def header_fingerprint(salt: bytes) -> str:
+    """ソルトから求めたキャッシュの指紋"""
+    return hashlib.sha256(salt).hexdigest()
+
+def derive_raw_key(key: str, salt: bytes) -> str:
+    """SQLCipherと同じ方法でキーから暗号鍵を導出し、PRAGMA keyに渡せる形式で返す"""
+    raw = hashlib.pbkdf2_hmac('sha512', key.encode(), salt, SQLCIPHER_KDF_ITERATIONS, SQLCIPHER_KEY_SIZE)
+    return f"x'{raw.hex()}'"
+
+def _dpapi(data: bytes, protect: bool) -> bytes:
+    """WindowsのDPAPIで現在のユーザーだけが復号できるように暗号化（または復号）する"""
+    crypt32 = ctypes.windll.crypt32
+    buffer = ctypes.create_string_buffer(data, len(data))
+    blob_in = _DataBlob(len(data), ctypes.cast(buffer, ctypes.POINTER(ctypes.c_char)))
+    blob_out = _DataBlob()
+    function = crypt32.CryptProtectData if protect else crypt32.CryptUnprotectData
+    if not function(ctypes.byref(blob_in), None, None, None, None, _CRYPTPROTECT_UI_FORBIDDEN,
+                    ctypes.byref(blob_out)):
+        raise ctypes.WinError()
+    try:
+        return ctypes.string_at(blob_out.pbData, blob_out.cbData)
+    finally:
+        ctypes.windll.kernel32.LocalFree(blob_out.pbData)
+
+class DatabaseKeyProvider:
+    """データベースキーを一度だけ取得し、導出済みの暗号鍵とともにキャッシュする
+
+    persist=Trueの場合だけキャッシュをファイルに保存する。ファイルは所有者だけが読み書きできる権限
+    （0600、ディレクトリは0700）で作成し、WindowsではキーをDPAPIで暗号化する（それ以外では平文）。
+    キャッシュの暗号鍵で復号できなかった場合はinvalidateで破棄し、次の接続で取得し直す。
+    """
+
+    def __init__(self, cache_path: Optional[str] = None,
+                 discover: Optional[Callable[[], Optional[str]]] = None, persist: bool = False):
+        """
+        Args:
+            cache_path (Optional[str]): キャッシュファイルのパス（Noneの場合はdefault_cache_path()）
+            discover (Optional[Callable[[], Optional[str]]]): キーを取得する関数
+                （Noneの場合はpyrekordboxでrekordboxの設定から取得する）
+            persist (bool): キャッシュをファイルに保存し、次回の起動でも使う
+                （Windows以外ではキーが平文で保存される。モジュールの説明を参照）
+        """
+        self.cache_path = cache_path or default_cache_path()
+        self.discover = discover
+        self.persist = persist
+        self.logger = logging.getLogger(__name__)
+        self._entries: Optional[Dict[str, Dict[str, str]]] = None
+        self._stats = {'hits': 0, 'misses': 0, 'discoveries': 0}
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの命中回数・導出し直した回数・キーを取得した回数"""
+        return dict(self._stats)
+
+    def resolve(self, db_path: str, key: Optional[str] = None) -> Optional[ResolvedKey]:
+        """データベースに接続するためのキーを取得する
+
+        Args:
+            db_path (str): master.dbのパス
+            key (Optional[str]): 設定で指定されたキー（Noneの場合はキャッシュか取得したキーを使う）
+
+        Returns:
+            Optional[ResolvedKey]: キーと導出済みの暗号鍵（暗号化されていなければNone）
+        """
+        salt = read_salt(db_path)
+        if salt is None:
+            return None
+        path = os.path.abspath(db_path)
+        fingerprint = header_fingerprint(salt)
+        entries = self._load()
+        entry = entries.get(path)
+        if (entry is not None and entry.get('fingerprint') == fingerprint
+                and (key is None or entry.get('key') == key)):
+            self._stats['hits'] += 1
+            return ResolvedKey(entry['key'], entry['raw_key'])
+
+        self._stats['misses'] += 1
+        # ヘッダーだけが変わった場合は、キャッシュのキーから導出し直す
+        if key is None and entry is not None:
+            key = entry.get('key')
+        if key is None:
+            key = self._discover()
+        if not key:
+            return None
+        resolved = ResolvedKey(key, derive_raw_key(key, salt))
+        entries[path] = {'fingerprint': fingerprint, 'key': resolved.key, 'raw_key': resolved.raw_key}
+        self._save(entries)
+        return resolved
+
+    def invalidate(self, db_path: str) -> None:
+        """データベースのキャッシュを破棄する（キャッシュのキーで復号できなかった場合など）"""
+        entries = self._load()
+        if entries.pop(os.path.abspath(db_path), None) is not None:
+            self._save(entries)
+
+    def _discover(self) -> Optional[str]:
+        self._stats['discoveries'] += 1
+        if self.discover is not None:
+            return self.discover()
+        from . import queries
+        return queries.discover_key()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if self._entries is None:
+            self._entries = {}
+            if not self.persist:
+                return self._entries
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    stored = json.load(f)
+            except FileNotFoundError:
+                return self._entries
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable key cache {self.cache_path}: {e}")
+                return self._entries
+            for path, entry in stored.items():
+                try:
+                    self._entries[path] = self._decode_entry(entry)
+                except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                    # 別のユーザー・マシンで保護されたなど、復号できないエントリは取得し直す
+                    self.logger.warning(f"Ignoring unreadable key cache entry for {path}: {e}")
+        return self._entries
+
+    @staticmethod
+    def _encode_entry(entry: Dict[str, str]) -> Dict[str, str]:
+        """ファイルに保存する形式に変換する（保護できる場合はキーと暗号鍵を暗号化する）"""
+        if SECRET_PROTECTION is None:
+            return dict(entry)
+        secret = json.dumps({'key': entry['key'], 'raw_key': entry['raw_key']}).encode()
+        return {
+            'fingerprint': entry['fingerprint'],
+            'protection': SECRET_PROTECTION,
+            'secret': base64.b64encode(_dpapi(secret, protect=True)).decode('ascii'),
+        }
+
+    @staticmethod
+    def _decode_entry(entry: Dict[str, str]) -> Dict[str, str]:
+        """ファイルに保存した形式から元に戻す"""
+        protection = entry.get('protection')
+        if protection is None:
+            return {'fingerprint': entry['fingerprint'], 'key': entry['key'], 'raw_key': entry['raw_key']}
+        if protection != 'dpapi':
+            raise ValueError(f"unknown protection {protection!r}")
+        secret = json.loads(_dpapi(base64.b64decode(entry['secret']), protect=False))
+        return {'fingerprint': entry['fingerprint'], 'key': secret['key'], 'raw_key': secret['raw_key']}
+
+    def _save(self, entries: Dict[str, Dict[str, str]]) -> None:
+        """所有者だけが読める一時ファイルに書き込んでから置き換える（persistの場合だけ）"""
+        if not self.persist:
+            return
+        directory = os.path.dirname(self.cache_path)
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            stored = {path: self._encode_entry(entry) for path, entry in entries.items()}
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(stored, f, indent=2)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            # キャッシュできなくても接続はできるため、警告だけ記録する
+            self.logger.warning(f"Failed to write key cache {self.cache_path}: {e}")
@@ -0,0 +1,161 @@
+from typing import Any, Callable, NamedTuple, Optional, Tuple, Type
+import logging
+import threading
+import time
+from .event_bus import EventBus
+from .poll_scheduler import AdaptivePollScheduler
+from .rekordbox_client import RekordboxClient
+from .track_info import TrackInfo
+
+class TrackStarted(NamedTuple):
+    """監視開始後やセッション終了後に最初の曲が検出された"""
+    track: TrackInfo
+    timestamp: float
+
+class TrackChanged(NamedTuple):
+    """再生中の曲が別の曲（または同じ曲の再生し直し）に変わった"""
+    track: TrackInfo
+    previous: TrackInfo
+    timestamp: float
+
+class SessionEnded(NamedTuple):
+    """最後の曲の検出からsession_timeout秒の間、新しい曲が検出されなかった"""
+    last_track: TrackInfo
+    timestamp: float
+
+NOW_PLAYING_EVENTS = (TrackStarted, TrackChanged, SessionEnded)
+
+class NowPlayingMonitor:
+    """RekordboxClientをバックグラウンドのスレッドでポーリングし、曲の変化をイベントとして配信する
+
+    イベントはEventBusを通じて購読者ごとのスレッドに届けられるため、OBSへの送信や
+    ログ出力などの購読者が遅くても曲の検出は止まらない。DatabaseWatcherを渡すと、
+    ファイルの変更を待つことで一定間隔より早く曲の変化を検出でき、データベースへの問い合わせは
+    ファイルが変更されたとき（と、取りこぼしに備えてsafety_intervalごと）だけになる。
+    AdaptivePollSchedulerを渡すと、一定間隔の代わりに曲の長さに合わせた間隔でポーリングする。
+    """
+
+    def __init__(self, client: RekordboxClient, bus: Optional[EventBus] = None,
+                 interval: float = 1.0, session_timeout: float = 1800.0, watcher=None,
+                 scheduler: Optional[AdaptivePollScheduler] = None, safety_interval: float = 60.0):
+        """
+        Args:
+            client (RekordboxClient): 曲情報を取得するクライアント
+            bus (Optional[EventBus]): イベントの配信先（Noneの場合は新しく作成する）
+            interval (float): ポーリングの間隔（秒）
+            session_timeout (float): この秒数だけ新しい曲がなければSessionEndedを配信する
+            watcher (Optional[DatabaseWatcher]): master.dbの変更を待つための監視
+            scheduler (Optional[AdaptivePollScheduler]): ポーリングの間隔を決めるスケジューラ
+                （Noneの場合はintervalの一定間隔）
+            safety_interval (float): watcherが変更を検知しなくても問い合わせる間隔（秒）
+        """
+        self.client = client
+        self.bus = bus or EventBus()
+        self.interval = interval
+        self.session_timeout = session_timeout
+        self.watcher = watcher
+        self.scheduler = scheduler
+        self.safety_interval = safety_interval
+        self.logger = logging.getLogger(__name__)
+        self._current_track: Optional[TrackInfo] = None
+        # SessionEndedを配信したときの曲（同じ曲のままでは新しいセッションとみなさない）
+        self._ended_track: Optional[TrackInfo] = None
+        self._last_change_time: Optional[float] = None
+        self._last_query_time = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def current_track(self) -> Optional[TrackInfo]:
+        """現在のセッションで最後に検出された曲（セッション外ではNone）"""
+        return self._current_track
+
+    @property
+    def current_interval(self) -> float:
+        """直近のポーリングの待ち時間（秒）"""
+        return self.scheduler.current_interval if self.scheduler is not None else self.interval
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, callback: Callable[[Any], None],
+                  event_types: Optional[Tuple[Type, ...]] = None) -> Callable[[], None]:
+        """イベントの購読を登録する（EventBus.subscribeと同じ）"""
+        return self.bus.subscribe(callback, event_types)
+
+    def poll_once(self) -> Optional[Any]:
+        """1回ポーリングし、配信したイベントを返す（変化がなければNone）"""
+        self._last_query_time = time.monotonic()
+        return self._update(self.client.get_current_track())
+
+    def _update(self, track: Optional[TrackInfo]) -> Optional[Any]:
+        """取得した曲から曲の変化とセッションの終了を判定して配信する（trackがNoneなら終了だけ）"""
+        now = time.monotonic()
+        event = None
+
+        if track is not None and track != self._current_track and track != self._ended_track:
+            previous, self._current_track = self._current_track, track
+            self._ended_track = None
+            self._last_change_time = now
+            if self.scheduler is not None:
+                self.scheduler.track_started(track, now)
+            if previous is None:
+                event = TrackStarted(track, time.time())
+            else:
+                event = TrackChanged(track, previous, time.time())
+        elif (self._current_track is not None and self.session_timeout
+              and now - self._last_change_time >= self.session_timeout):
+            event = SessionEnded(self._current_track, time.time())
+            self._ended_track, self._current_track = self._current_track, None
+            if self.scheduler is not None:
+                self.scheduler.track_started(None, now)
+
+        if event is not None:
+            self.bus.publish(event)
+        return event
+
+    def start(self) -> None:
+        """バックグラウンドのスレッドでポーリングを開始する"""
+        if self.is_running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="NowPlayingMonitor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """ポーリングを停止する（購読者への配信スレッドも終了する）"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.bus.close()
+
+    def _wait(self) -> bool:
+        """次のポーリングまで待つ（watcherがあればファイルの変更で早く起きる）
+
+        Returns:
+            bool: データベースに問い合わせる場合はTrue（watcherがない、ファイルが変更された、
+                またはsafety_intervalが過ぎた）。Falseの場合はセッションの終了だけを確認する
+        """
+        interval = self.scheduler.next_interval() if self.scheduler is not None else self.interval
+        if self.watcher is None:
+            self._stop_event.wait(interval)
+            return True
+        if self.watcher.wait_for_change(timeout=interval, stop_event=self._stop_event):
+            return True
+        return time.monotonic() - self._last_query_time >= self.safety_interval
+
+    def _run(self) -> None:
+        query = True
+        while not self._stop_event.is_set():
+            try:
+                if query:
+                    self.poll_once()
+                else:
+                    self._update(None)
+            except Exception as e:
+                self.logger.error(f"Error polling now playing: {e}")
+            if self._stop_event.is_set():
+                break
+            query = self._wait()
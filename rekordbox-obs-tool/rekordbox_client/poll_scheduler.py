@@ -0,0 +1,124 @@
+"""
+曲の長さに合わせたポーリング間隔の調整
+
+一定間隔のポーリングでは、曲の途中のほとんどの問い合わせが無駄になる一方で、曲の切り替えの
+検出は最大で1間隔分遅れる。AdaptivePollSchedulerは曲の長さと曲を最初に検出した時刻から
+切り替えの時刻を予想し、曲の途中では間隔を長く、予想時刻の付近では短くする。
+"""
+from typing import Any, Dict, Optional, Tuple
+import time
+from .track_info import TrackInfo
+
+class AdaptivePollScheduler:
+    """曲の長さから次のポーリングまでの間隔を決めるスケジューラ
+
+    切り替え位置（曲の長さに対する割合）とそのばらつきを実際の切り替えから学習し、
+    予想範囲の中ではmin_intervalで、範囲の外では範囲までの距離に比例した間隔で
+    ポーリングする。予想範囲を過ぎても曲が変わらなければ徐々に間隔を延ばし、
+    長い間変化がなければidle_intervalにする。曲が再生されていない間も、default_intervalから
+    idle_after秒かけてidle_intervalまで間隔を延ばす。
+    """
+
+    def __init__(self, min_interval: float = 0.5, max_interval: float = 30.0,
+                 idle_interval: float = 30.0, default_interval: float = 1.0,
+                 ramp: float = 0.5, mix_out_ratio: float = 0.85, mix_out_spread: float = 0.02,
+                 learning_rate: float = 0.3, idle_after: float = 600.0):
+        """
+        Args:
+            min_interval (float): 最短の間隔（秒）。切り替え予想時刻の付近で使う
+            max_interval (float): 曲の途中での最長の間隔（秒）
+            idle_interval (float): 長い間変化がない場合の間隔（秒）
+            default_interval (float): 曲の長さが分からない場合の間隔（秒）
+            ramp (float): 予想範囲までの秒数に掛けて間隔とする係数
+            mix_out_ratio (float): 曲の長さに対する切り替え位置の初期値
+            mix_out_spread (float): 切り替え位置のばらつき（曲の長さに対する割合）の初期値
+            learning_rate (float): 実際の切り替え位置を平均に反映する割合
+            idle_after (float): 最後の変化からこの秒数が過ぎたらidle_intervalにする
+                （曲がない場合はこの秒数をかけてidle_intervalまで延ばす）
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.default_interval = default_interval
+        self.ramp = ramp
+        self.mix_out_ratio = mix_out_ratio
+        self.mix_out_spread = mix_out_spread
+        self.learning_rate = learning_rate
+        self.idle_after = idle_after
+        self._duration = 0.0
+        self._started_at: Optional[float] = None
+        # 曲がなくなった（またはまだ曲を検出していない）時刻
+        self._idle_since: Optional[float] = None
+        self._current_interval = default_interval
+        self._polls = 0
+        self._total_interval = 0.0
+
+    @property
+    def current_interval(self) -> float:
+        """最後に決めた間隔（秒）"""
+        return self._current_interval
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """ポーリング回数・平均間隔・現在の間隔・学習した切り替え位置"""
+        return {
+            'polls': self._polls,
+            'average_interval': self._total_interval / self._polls if self._polls else None,
+            'current_interval': self._current_interval,
+            'mix_out_ratio': self.mix_out_ratio,
+            'mix_out_spread': self.mix_out_spread,
+        }
+
+    def expected_window(self) -> Optional[Tuple[float, float]]:
+        """曲の開始からの経過秒数で表した、切り替えが予想される範囲（曲の長さが分からなければNone）"""
+        if self._started_at is None or self._duration <= 0:
+            return None
+        # ばらつきの2倍に、最短の間隔1回分の余裕を加える
+        margin = 2 * self.mix_out_spread * self._duration + self.min_interval
+        center = self.mix_out_ratio * self._duration
+        return (center - margin, center + margin)
+
+    def track_started(self, track: Optional[TrackInfo], now: Optional[float] = None) -> None:
+        """新しい曲を検出したことを記録し、前の曲の切り替え位置を学習する
+
+        Args:
+            track (Optional[TrackInfo]): 検出した曲（Noneの場合は曲なし）
+            now (Optional[float]): 検出した時刻（time.monotonic()の値）
+        """
+        now = time.monotonic() if now is None else now
+        if self._started_at is not None and self._duration > 0:
+            ratio = (now - self._started_at) / self._duration
+            # 曲の途中で止めた・極端に長く流したなどの外れ値は学習に使わない
+            if 0.3 <= ratio <= 1.2:
+                deviation = ratio - self.mix_out_ratio
+                self.mix_out_ratio += self.learning_rate * deviation
+                self.mix_out_spread += self.learning_rate * (abs(deviation) - self.mix_out_spread)
+        self._duration = float(track.duration or 0) if track is not None else 0.0
+        self._started_at = now if track is not None else None
+        self._idle_since = now if track is None else None
+
+    def next_interval(self, now: Optional[float] = None) -> float:
+        """次のポーリングまでの間隔（秒）を決める"""
+        now = time.monotonic() if now is None else now
+        window = self.expected_window()
+        if self._started_at is None:
+            # 曲がない間は、最後の変化からの経過時間に比例してidle_intervalまで延ばす
+            if self._idle_since is None:
+                self._idle_since = now
+            progress = min((now - self._idle_since) / self.idle_after, 1.0) if self.idle_after > 0 else 1.0
+            interval = max(self.default_interval,
+                           self.default_interval + (self.idle_interval - self.default_interval) * progress)
+        elif window is None:
+            interval = self.default_interval
+        else:
+            elapsed = now - self._started_at
+            if elapsed >= window[1] + self.idle_after:
+                interval = self.idle_interval
+            else:
+                # 予想範囲からの距離に比例させる（範囲の前後どちらに離れていても間隔を延ばす）
+                distance = max(window[0] - elapsed, elapsed - window[1], 0.0)
+                interval = min(max(distance * self.ramp, self.min_interval), self.max_interval)
+        self._current_interval = interval
+        self._polls += 1
+        self._total_interval += interval
+        return interval
@@ -0,0 +1,150 @@
+"""
+再生中の曲の経過時間・残り時間の表示
+
+経過時間をデータベースから取得すると、表示を1秒ごとに更新するためだけに毎秒問い合わせる
+ことになる。NowPlayingTextは曲を検出した時刻と曲の長さ（Length）から経過時間・残り時間を
+手元で計算するため、データベースのポーリング間隔と表示の更新間隔を切り離せる。
+表示される文字列が変わったときだけ送信先に渡す。
+"""
+from typing import Any, Callable, Dict, Optional
+import logging
+import math
+import threading
+import time
+from utils.time_utils import format_duration
+from .now_playing import SessionEnded, TrackChanged, TrackStarted
+from .track_info import TrackInfo
+
+class NowPlayingText:
+    """曲情報と経過時間・残り時間を埋め込んだ表示用の文字列を作る
+
+    表示フォーマットではTrackInfoの項目に加えて {elapsed}（経過時間）と
+    {remaining}（残り時間）が使える。どちらも曲の長さを上限・0を下限として
+    utils.time_utils.format_duration の形式（HH:MM:SS）で表示する。
+    """
+
+    def __init__(self, format_str: str, on_change: Optional[Callable[[str], Any]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            format_str (str): 表示フォーマット（例: "{title} - {artist} {elapsed}/{remaining}"）
+            on_change (Optional[Callable[[str], Any]]): 表示が変わったときに呼び出す関数
+                （OBSManager.submit_textなど）
+            clock (Callable[[], float]): 現在時刻を返す関数（秒）
+        """
+        self.format_str = format_str
+        self.on_change = on_change
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        self._track: Optional[TrackInfo] = None
+        self._fields: Dict[str, Any] = {}
+        self._started_at = 0.0
+        self._text: Optional[str] = None
+        self._invalid_format: Optional[str] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def track(self) -> Optional[TrackInfo]:
+        return self._track
+
+    @property
+    def text(self) -> Optional[str]:
+        """最後に送信した（tickで確定した）表示"""
+        return self._text
+
+    def set_track(self, track: Optional[TrackInfo], started_at: Optional[float] = None) -> None:
+        """表示する曲を切り替える
+
+        Args:
+            track (Optional[TrackInfo]): 再生中の曲（Noneの場合は表示を空にする）
+            started_at (Optional[float]): 曲を検出した時刻（clockの値、Noneの場合は現在時刻）
+        """
+        with self._lock:
+            self._track = track
+            # 曲の項目は曲ごとに一度だけ辞書にし、毎秒は時間の2項目だけを書き換える
+            self._fields = track.to_dict() if track is not None else {}
+            self._started_at = self.clock() if started_at is None else started_at
+        self._wakeup.set()
+
+    def on_event(self, event: Any) -> None:
+        """NowPlayingMonitorのイベントを受け取る（NowPlayingMonitor.subscribeに渡す）"""
+        if isinstance(event, (TrackStarted, TrackChanged)):
+            # イベントが配信されるまでの遅れを差し引いて、検出した時刻を開始時刻とする
+            delay = max(time.time() - event.timestamp, 0.0)
+            self.set_track(event.track, self.clock() - delay)
+        elif isinstance(event, SessionEnded):
+            self.set_track(None)
+
+    def render(self, now: Optional[float] = None) -> str:
+        """現在の表示を作る"""
+        with self._lock:
+            if self._track is None:
+                return ''
+            elapsed, remaining = self._progress(self.clock() if now is None else now)
+            fields = self._fields
+            fields['elapsed'] = format_duration(elapsed)
+            # 経過時間は切り捨て・残り時間は切り上げとし、2つの合計を曲の長さに合わせる
+            fields['remaining'] = format_duration(math.ceil(remaining))
+            try:
+                return self.format_str.format_map(fields)
+            except (KeyError, IndexError, ValueError) as e:
+                # 毎秒作り直すため、同じフォーマットのエラーは一度だけ記録する
+                if self._invalid_format != self.format_str:
+                    self._invalid_format = self.format_str
+                    self.logger.error(f"Invalid display format {self.format_str!r}: {e}")
+                return self._track.title
+
+    def tick(self, now: Optional[float] = None) -> Optional[str]:
+        """表示を作り直し、前回から変わっていればon_changeに渡して返す（変わらなければNone）"""
+        text = self.render(now)
+        if text == self._text:
+            return None
+        self._text = text
+        if self.on_change is not None:
+            try:
+                self.on_change(text)
+            except Exception as e:
+                self.logger.error(f"Error updating now playing text: {e}")
+        return text
+
+    def start(self) -> None:
+        """バックグラウンドのスレッドで毎秒表示を更新する"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="NowPlayingText", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """表示の更新を停止する"""
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _progress(self, now: float):
+        """(経過秒数, 残り秒数)"""
+        duration = max(float(self._track.duration or 0), 0.0)
+        elapsed = max(now - self._started_at, 0.0)
+        if duration:
+            elapsed = min(elapsed, duration)
+        return elapsed, max(duration - elapsed, 0.0)
+
+    def _next_tick(self, now: float) -> float:
+        """表示の秒が次に変わるまでの秒数"""
+        with self._lock:
+            if self._track is None:
+                return 1.0
+            elapsed = now - self._started_at
+        # 経過時間の秒の区切りに合わせる（少し後ろにずらして切り捨ての境界を越える）
+        return 1.0 - (elapsed % 1.0) + 0.001 if elapsed >= 0 else -elapsed
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._wakeup.clear()
+            self.tick()
+            self._wakeup.wait(self._next_tick(self.clock()))
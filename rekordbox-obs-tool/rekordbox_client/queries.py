@@ -0,0 +1,229 @@
+"""
+pyrekordbox・SQLAlchemyを使うデータベース処理
+
+これらのライブラリ（とSQLCipherのバインディング）は読み込みに時間がかかるため、
+このモジュールはデータベースに接続するときに初めてインポートされる。
+RekordboxClientなどの他のモジュールはトップレベルでこのモジュールをインポートしないこと。
+"""
+from typing import List, Optional
+from datetime import datetime
+from pyrekordbox.db6 import Rekordbox6Database
+from pyrekordbox.db6.tables import (
+    DjmdAlbum, DjmdArtist, DjmdContent, DjmdGenre, DjmdHistory, DjmdKey, DjmdSongHistory
+)
+from sqlalchemy import String, create_engine, func, text, type_coerce
+from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError
+from .rekordbox_client import format_db_timestamp
+
+# 曲情報の整形に必要な列（関連テーブルの名前は結合して同じ行で取得する）
+# キーは行数が少なく変更も稀なため結合せず、KeyIDからKeyIndexで引く
+TRACK_COLUMNS = (
+    DjmdContent.ID,
+    DjmdContent.Title,
+    DjmdContent.BPM,
+    DjmdContent.Rating,
+    DjmdContent.Commnt,
+    DjmdContent.Length,
+    DjmdContent.FolderPath,
+    DjmdContent.DJPlayCount,
+    DjmdContent.AnalysisDataPath,
+    DjmdContent.KeyID,
+    DjmdContent.created_at,
+    DjmdContent.updated_at,
+    DjmdContent.rb_local_usn,
+    DjmdContent.rb_local_deleted,
+    DjmdArtist.Name.label('ArtistName'),
+    DjmdAlbum.Name.label('AlbumName'),
+    DjmdGenre.Name.label('GenreName'),
+)
+
+def open_database(path: Optional[str], key: Optional[str], unlock: bool,
+                  raw_key: Optional[str] = None) -> Rekordbox6Database:
+    """master.dbを開き、読み取れることを確認する
+
+    Args:
+        path (Optional[str]): master.dbのパス
+        key (Optional[str]): データベースキー
+        unlock (bool): データベースを復号するか
+        raw_key (Optional[str]): 導出済みの暗号鍵（"x'...'" 形式）。指定した場合は
+            pyrekordboxにキーを渡さず、SQLCipherの鍵導出を省いたエンジンで開く
+    """
+    if unlock and raw_key:
+        # pyrekordboxは "402fd" で始まるキーしか受け付けないため、暗号化なしで作成してから
+        # 導出済みの暗号鍵を使うエンジンに差し替える（エンジンは最初の問い合わせまで接続しない）
+        from sqlcipher3 import dbapi2 as sqlcipher3
+        db = Rekordbox6Database(path=path, unlock=False)
+        db.close()
+        db.engine.dispose()
+        db.engine = create_engine(
+            URL.create('sqlite+pysqlcipher', password=raw_key, database=str(path)),
+            module=sqlcipher3
+        )
+        db.open()
+    else:
+        db = Rekordbox6Database(path=path, key=key, unlock=unlock)
+    probe(db)
+    return db
+
+def discover_key() -> Optional[str]:
+    """pyrekordboxでrekordboxの設定からデータベースキーを取得する（見つからなければNone）"""
+    from pyrekordbox.config import get_config
+    for version in ('rekordbox7', 'rekordbox6'):
+        key = get_config(version).get('dp')
+        if key:
+            return key
+    return None
+
+def default_db_path() -> Optional[str]:
+    """pyrekordboxの設定からrekordbox 6のmaster.dbのパスを取得する（見つからなければNone）"""
+    from pyrekordbox.config import get_config
+    return get_config('rekordbox6').get('db_path') or None
+
+def probe(db) -> None:
+    """sqlite_masterを読み、ファイルが開けて復号できることを確認する"""
+    db.session.execute(text("SELECT count(*) FROM sqlite_master")).scalar()
+
+def is_connection_error(e: Exception) -> bool:
+    """データベース接続に関するエラーかどうか"""
+    return isinstance(e, DBAPIError)
+
+def track_query(db):
+    """曲情報の整形に必要な列だけを持つフラットな行を返すクエリを作成する
+
+    アーティスト・アルバム・ジャンルは外部結合で同時に取得するため、
+    曲ごとに関連テーブルを遅延読み込みする追加の問い合わせは発生しない。
+    """
+    return (
+        db.query(*TRACK_COLUMNS)
+        .outerjoin(DjmdArtist, DjmdContent.ArtistID == DjmdArtist.ID)
+        .outerjoin(DjmdAlbum, DjmdContent.AlbumID == DjmdAlbum.ID)
+        .outerjoin(DjmdGenre, DjmdContent.GenreID == DjmdGenre.ID)
+    )
+
+def latest_content(db, limit: int, since: Optional[datetime] = None,
+                   since_usn: Optional[int] = None) -> List:
+    """updated_atの新しい順に曲を取得する
+
+    ソートと件数制限はデータベース側で行い、1回の問い合わせで最大limit件の行だけを取得する。
+
+    Args:
+        db: 接続済みのRekordbox6Database
+        limit (int): 取得する曲数の上限
+        since (Optional[datetime]): この時刻より後に更新された曲だけを取得する
+        since_usn (Optional[int]): このrb_local_usnより後に変更された曲だけを取得する
+    """
+    # updated_atは「YYYY-MM-DD HH:MM:SS.fff +00:00」形式の文字列として保存されているため、
+    # 同じ書式の文字列同士で比較する
+    updated_at = type_coerce(DjmdContent.updated_at, String)
+    query = track_query(db).filter(DjmdContent.updated_at.isnot(None))
+    if since_usn is not None:
+        # rb_local_usn (djmd_content__rb_local_usn__ID) のインデックスで変更行だけに絞り込む
+        query = query.filter(DjmdContent.rb_local_usn > since_usn)
+    if since is not None:
+        query = query.filter(updated_at > format_db_timestamp(since))
+    return query.order_by(updated_at.desc()).limit(limit).all()
+
+def changed_content(db, since_usn: Optional[int], limit: int) -> List:
+    """rb_local_usnの順（変更順）に、since_usnより後に変更された曲を取得する
+
+    Args:
+        db: 接続済みのRekordbox6Database
+        since_usn (Optional[int]): このrb_local_usnより後の変更だけを取得する（Noneの場合は先頭から）
+        limit (int): 取得する行数の上限
+    """
+    query = track_query(db)
+    if since_usn is not None:
+        query = query.filter(DjmdContent.rb_local_usn > since_usn)
+    return query.order_by(DjmdContent.rb_local_usn).limit(limit).all()
+
+def max_local_usn(db) -> Optional[int]:
+    """djmdContentの最大rb_local_usnを取得する（インデックスのみで解決する軽量な問い合わせ）"""
+    return db.query(func.max(DjmdContent.rb_local_usn)).scalar()
+
+def key_signature(db):
+    """DjmdKeyの変更を検出するための値（行数・最大rb_local_usn・最新のupdated_at）"""
+    return tuple(db.query(
+        func.count(DjmdKey.ID), func.max(DjmdKey.rb_local_usn),
+        func.max(type_coerce(DjmdKey.updated_at, String))
+    ).one())
+
+def key_rows(db) -> List:
+    """DjmdKeyの(ID, キー名)をすべて取得する"""
+    return db.query(DjmdKey.ID, DjmdKey.ScaleName).all()
+
+# DjmdHistory.Attribute: 0 = 履歴リスト（1回のセッション）、1 = 年・月ごとのフォルダ
+HISTORY_ATTRIBUTE_LIST = 0
+
+def play_query(db):
+    """再生履歴（DjmdSongHistory）の行に曲情報の列を加えたクエリを作成する
+
+    各行はtrack_queryの列に加え、HistoryID・TrackNo・PlayedAt（履歴に記録された時刻）を持つ。
+    """
+    return (
+        track_query(db)
+        .add_columns(
+            DjmdSongHistory.HistoryID,
+            DjmdSongHistory.TrackNo,
+            DjmdSongHistory.created_at.label('PlayedAt'),
+        )
+        .join(DjmdSongHistory, DjmdSongHistory.ContentID == DjmdContent.ID)
+        .filter(DjmdSongHistory.rb_local_deleted == 0)
+    )
+
+def max_play_usn(db) -> Optional[int]:
+    """djmdSongHistoryの最大rb_local_usnを取得する（履歴が空の場合はNone）"""
+    return db.query(func.max(DjmdSongHistory.rb_local_usn)).scalar()
+
+def latest_play(db):
+    """最後に記録された再生を取得する
+
+    rb_local_usnは書き込み順に増えるため、インデックスを降順にたどって1行だけ読む。
+    """
+    return play_query(db).order_by(DjmdSongHistory.rb_local_usn.desc()).limit(1).first()
+
+def latest_session(db):
+    """最新の履歴リスト（セッション）を取得する"""
+    return (
+        db.query(DjmdHistory)
+        .filter(DjmdHistory.Attribute == HISTORY_ATTRIBUTE_LIST, DjmdHistory.rb_local_deleted == 0)
+        .order_by(DjmdHistory.DateCreated.desc(), type_coerce(DjmdHistory.created_at, String).desc())
+        .first()
+    )
+
+def session_plays(db, history_id: str) -> List:
+    """1つのセッションの再生を再生順（TrackNo順）に取得する
+
+    HistoryIDのインデックスで絞り込むため、処理量はセッションの曲数に比例する。
+    """
+    return (
+        play_query(db)
+        .filter(DjmdSongHistory.HistoryID == history_id)
+        .order_by(DjmdSongHistory.TrackNo)
+        .all()
+    )
+
+def recent_plays(db, limit: int, since: Optional[datetime] = None) -> List:
+    """新しいセッションから順に、各セッションの最後の再生から遡って取得する
+
+    Args:
+        db: 接続済みのRekordbox6Database
+        limit (int): 取得する再生数の上限
+        since (Optional[datetime]): この日以降に作成されたセッションだけを対象にする
+    """
+    query = (
+        play_query(db)
+        .join(DjmdHistory, DjmdHistory.ID == DjmdSongHistory.HistoryID)
+        .filter(DjmdHistory.Attribute == HISTORY_ATTRIBUTE_LIST, DjmdHistory.rb_local_deleted == 0)
+    )
+    if since is not None:
+        query = query.filter(DjmdHistory.DateCreated >= since.strftime('%Y-%m-%d'))
+    return (
+        query.order_by(
+            DjmdHistory.DateCreated.desc(),
+            type_coerce(DjmdHistory.created_at, String).desc(),
+            DjmdSongHistory.TrackNo.desc(),
+        )
+        .limit(limit)
+        .all()
+    )
@@ -1,186 +1,534 @@
-from typing import Dict, List, Optional
-import pyrekordbox
-from pyrekordbox.db6 import Rekordbox6Database
+from typing import Any, Dict, List, Optional, Tuple
 import logging
-import re
-from datetime import datetime, timedelta
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from utils.time_utils import format_duration
+from . import formatter
+from .key_index import KeyIndex, key_notations
+from .track_info import TrackInfo
+
+def format_db_timestamp(value: datetime) -> str:
+    """datetimeをupdated_at列と同じ書式（UTC・ミリ秒精度）の文字列に変換する
+
+    Args:
+        value (datetime): 日時（タイムゾーンなしの場合はローカル時刻とみなす）
+    """
+    utc = value.astimezone(timezone.utc)
+    return f"{utc.strftime('%Y-%m-%d %H:%M:%S')}.{utc.microsecond // 1000:03d} +00:00"
 
 class RekordboxClient:
-    def __init__(self, key: Optional[str] = None):
+    """rekordboxのmaster.dbから再生中の曲や履歴を取得するクライアント
+
+    pyrekordbox・SQLAlchemyは接続時に初めて読み込む（rekordbox_client.queries）ため、
+    インスタンスの作成やモジュールのインポートだけでは重いライブラリは読み込まれない。
+    """
+
+    # 1回のポーリングで取得する最新曲の行数
+    POLL_LIMIT = 1
+    # 接続に失敗したときの再接続までの待ち時間（秒）。失敗するたびに倍にし、上限で止める
+    RECONNECT_BASE_DELAY = 1.0
+    RECONNECT_MAX_DELAY = 30.0
+
+    def __init__(self, key: Optional[str] = None, db_path: Optional[str] = None, unlock: bool = True,
+                 snapshot: bool = False, snapshot_path: Optional[str] = None, key_provider=None,
+                 snapshot_refresh_interval: float = 1.0):
+        """
+        Args:
+            key (Optional[str]): データベースキー（Noneの場合はpyrekordboxが取得する）
+            db_path (Optional[str]): master.dbのパス（Noneの場合はpyrekordboxの設定から取得する）
+            unlock (bool): データベースを復号するか
+            snapshot (bool): 稼働中のmaster.dbではなく、ページ単位で更新するローカルのコピーを読む
+                （rekordboxの書き込みとロックで競合しない。rekordbox_client.snapshotを参照）
+            snapshot_path (Optional[str]): コピーのパス（Noneの場合は一時ディレクトリに作成する）
+            key_provider (Optional[DatabaseKeyProvider]): キーと導出済みの暗号鍵のキャッシュ
+                （指定した場合、2回目以降の接続ではキーの取得とSQLCipherの鍵導出を省く）
+            snapshot_refresh_interval (float): コピーを更新する最小の間隔（秒）。rekordboxが
+                書き込み続けている間も、コピーの更新と接続し直しはこの間隔に1回までにする
+        """
         self.db = None
         self.key = key
+        self.db_path = db_path
+        self.unlock = unlock
+        self.snapshot = snapshot
+        self.snapshot_path = snapshot_path
+        self.key_provider = key_provider
+        self.snapshot_refresh_interval = snapshot_refresh_interval
         self.logger = logging.getLogger(__name__)
+        self._snapshot = None
+        self._last_snapshot_refresh = 0.0
+        # スナップショットに接続し直すときに使う導出済みの暗号鍵（(指紋, ResolvedKey)）
+        self._snapshot_key = None
         self._last_played_track = None
         self._last_check_time = None
+        # 前回のポーリングで確認した最新のupdated_atとrb_local_usn（ハイウォーターマーク）
+        self._last_updated_at = None
+        self._last_local_usn = None
+        # 前回のポーリングで確認した再生履歴（djmdSongHistory）の最大rb_local_usn
+        self._last_play_usn = None
+        # DjmdKeyの索引（キーのIDからキー名・Camelot・Open Key表記を引く）
+        self._keys = KeyIndex()
+        # 接続の管理（接続時のファイルの識別子と再接続のバックオフ）
+        self._db_file_id = None
+        self._reconnect_delay = 0.0
+        self._next_connect_time = 0.0
+        self._connect_stats = {
+            'attempts': 0,
+            'failures': 0,
+            'last_duration': None,
+            'total_duration': 0.0,
+        }
 
     def connect(self) -> bool:
-        """rekordboxデータベースに接続する"""
+        """rekordboxデータベースに接続する
+
+        接続済みのハンドルがあれば閉じてから開き直す。接続直後に軽い問い合わせを行い、
+        SQLCipherの復号まで済ませてから接続成功とする。所要時間はconnection_statsに記録される。
+        """
+        return self._connect()
+
+    def _connect(self, same_database: bool = False) -> bool:
+        """接続する（same_databaseの場合は同じデータベースの更新したコピーを開き直すだけとみなす）
+
+        same_databaseでなければ、開いたファイルは以前と別物の可能性があるため、ウォーターマークと
+        キーの索引を取り直す。スナップショットの更新で開き直す場合は論理的に同じデータベースなので、
+        差分の問い合わせを続けられるよう保持する。
+        """
+        self._release()
+        self._connect_stats['attempts'] += 1
+        start = time.perf_counter()
+        resolved = None
         try:
-            self.db = Rekordbox6Database(key=self.key)
-            self.logger.info("Successfully connected to rekordbox database")
+            from . import queries
+            path = self._refresh_snapshot(queries).path if self.snapshot else self.db_path
+            resolved = self._resolve_key(queries)
+            db = queries.open_database(path, self.key, self.unlock,
+                                       raw_key=resolved.raw_key if resolved else None)
+        except Exception as e:
+            if resolved is not None:
+                # キャッシュの暗号鍵が合わない可能性があるため、次の接続では取得し直す
+                if self.key_provider is not None:
+                    self.key_provider.invalidate(self.database_path)
+                self._snapshot_key = None
+            self._record_connect_time(start)
+            self._connect_stats['failures'] += 1
+            self._schedule_reconnect()
+            self.logger.error(f"Failed to connect to rekordbox database: {e} "
+                              f"(retrying in {self._reconnect_delay:.1f}s)")
+            return False
+
+        duration = self._record_connect_time(start)
+        self.db = db
+        self._db_file_id = self._file_id()
+        self._reconnect_delay = 0.0
+        self._next_connect_time = 0.0
+        if same_database:
+            self.logger.debug("Reopened updated database snapshot (%.1f ms)", duration * 1000)
+            return True
+        # 開き直したファイルは以前と別物の可能性があるため、ウォーターマークを取り直す
+        self._last_updated_at = None
+        self._last_local_usn = None
+        self._last_play_usn = None
+        self._keys.invalidate()
+        self.logger.info(f"Successfully connected to rekordbox database ({duration * 1000:.1f} ms)")
+        return True
+
+    def ensure_connected(self) -> bool:
+        """接続済みのハンドルを再利用し、必要な場合だけ再接続する
+
+        master.dbが置き換えられていれば開き直す。接続に失敗した後はバックオフ期間が
+        過ぎるまで再接続を試みないため、ポーリングのたびに復号や鍵の取得をやり直すことはない。
+
+        Returns:
+            bool: 使用できる接続がある場合はTrue
+        """
+        if self.db is not None:
+            if self._db_file_id is None or self._file_id() == self._db_file_id:
+                if self._snapshot is None or not self._snapshot_changed():
+                    return True
+                # コピーのページを書き換えたため、キャッシュを持たない新しい接続で読み直す
+                # （元のファイルは同じなので、ウォーターマークとキーの索引はそのまま使う）
+                return self._connect(same_database=True)
+            self.logger.warning("Database file was replaced, reconnecting")
+            self._release()
+        if time.monotonic() < self._next_connect_time:
+            return False
+        return self.connect()
+
+    def is_alive(self) -> bool:
+        """接続が使用できるかを軽い問い合わせで確認する"""
+        if self.db is None:
+            return False
+        if self._db_file_id is not None and self._file_id() != self._db_file_id:
+            return False
+        try:
+            from . import queries
+            queries.probe(self.db)
             return True
         except Exception as e:
-            self.logger.error(f"Failed to connect to rekordbox database: {e}")
+            self.logger.warning(f"Database health check failed: {e}")
+            return False
+
+    @property
+    def connection_stats(self) -> Dict[str, Any]:
+        """接続の統計情報（試行回数・失敗回数・接続時間）"""
+        stats = dict(self._connect_stats)
+        stats['average_duration'] = stats['total_duration'] / stats['attempts'] if stats['attempts'] else None
+        stats['connected'] = self.db is not None
+        stats['reconnect_delay'] = self._reconnect_delay
+        if self._snapshot is not None:
+            stats['snapshot'] = self._snapshot.stats
+        return stats
+
+    def _resolve_key(self, queries):
+        """key_providerからキーと導出済みの暗号鍵を取得する（使わない場合はNone）
+
+        スナップショットのコピーは元のファイルと同じソルトを持つため、元のパスでキャッシュする。
+        key_providerがなくてもスナップショットを読む場合は、コピーが更新されるたびに接続し直すため、
+        最初の接続で導出した暗号鍵をメモリに保持して使い回す（_snapshot_session_key）。
+        """
+        if not self.unlock:
+            return None
+        if self.key_provider is None:
+            return self._snapshot_session_key(queries) if self._snapshot is not None else None
+        if not self.database_path:
+            self.db_path = queries.default_db_path()
+        path = self.database_path
+        return self.key_provider.resolve(path, self.key) if path else None
+
+    def _snapshot_session_key(self, queries):
+        """スナップショットの暗号鍵を一度だけ導出し、ソルトが変わるまで使い回す
+
+        キーを取得できない場合や暗号化されていない場合はNone（pyrekordboxに任せる）。
+        """
+        from .key_provider import ResolvedKey, derive_raw_key, header_fingerprint, read_salt
+        salt = read_salt(self._snapshot.path)
+        if salt is None:
+            return None
+        fingerprint = header_fingerprint(salt)
+        if self._snapshot_key is not None and self._snapshot_key[0] == fingerprint:
+            return self._snapshot_key[1]
+        key = self.key or queries.discover_key()
+        if not key:
+            return None
+        resolved = ResolvedKey(key, derive_raw_key(key, salt))
+        self._snapshot_key = (fingerprint, resolved)
+        return resolved
+
+    def _refresh_snapshot(self, queries):
+        """ローカルのコピーを作成（または更新）して返す"""
+        if self._snapshot is None:
+            from .snapshot import DatabaseSnapshot
+            source = self.db_path or queries.default_db_path()
+            if not source:
+                raise FileNotFoundError("rekordbox database path is not configured")
+            self._snapshot = DatabaseSnapshot(source, self.snapshot_path)
+        self._snapshot.refresh()
+        self._last_snapshot_refresh = time.monotonic()
+        return self._snapshot
+
+    def _snapshot_changed(self) -> bool:
+        """稼働中のmaster.dbの変更をコピーに反映し、コピーが変わったかを返す
+
+        前回の更新からsnapshot_refresh_interval秒が経つまでは、ファイルを確認せずにFalseを返す。
+        """
+        now = time.monotonic()
+        if now - self._last_snapshot_refresh < self.snapshot_refresh_interval:
+            return False
+        self._last_snapshot_refresh = now
+        try:
+            return self._snapshot.refresh()
+        except OSError as e:
+            # 読み取れなければ以前のコピーを使い続ける
+            self.logger.warning(f"Failed to refresh database snapshot: {e}")
             return False
 
-    def get_current_track(self) -> Optional[Dict]:
-        """現在再生中の曲情報を取得する"""
+    def _file_id(self) -> Optional[Tuple[int, int]]:
+        """master.dbのファイルの識別子（デバイス, inode）"""
+        path = self.database_path
+        if not path:
+            return None
         try:
-            if not self.db:
-                if not self.connect():
-                    return None
+            st = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return None
+        return st.st_dev, st.st_ino
 
-            # データベースから最新の再生情報を取得
-            content = self.db.get_content()
-            if not content:
-                return None
+    def _record_connect_time(self, start: float) -> float:
+        duration = time.perf_counter() - start
+        self._connect_stats['last_duration'] = duration
+        self._connect_stats['total_duration'] += duration
+        return duration
 
-            # 最新の更新時刻を持つ曲を探す
-            current_time = datetime.now()
-            recent_tracks = []
-            
-            for track in content:
-                if hasattr(track, 'updated_at') and track.updated_at:
-                    recent_tracks.append((track, track.updated_at))
-
-            if recent_tracks:
-                # 最新の更新時刻を持つ曲を選択
-                recent_tracks.sort(key=lambda x: x[1], reverse=True)
-                track = recent_tracks[0][0]
-                
-                # 前回と異なる曲の場合、ログに記録
-                if (self._last_played_track is None or 
-                    track.Title != self._last_played_track.get('title')):
-                    self.logger.info(f"New track detected: {track.Title} (Last updated: {track.updated_at})")
-                    self._last_played_track = self._format_track_info(track)
-                    self._last_check_time = current_time
-                
+    def _schedule_reconnect(self) -> None:
+        """次の再接続までの待ち時間を指数的に延ばす"""
+        if self._reconnect_delay:
+            self._reconnect_delay = min(self._reconnect_delay * 2, self.RECONNECT_MAX_DELAY)
+        else:
+            self._reconnect_delay = self.RECONNECT_BASE_DELAY
+        self._next_connect_time = time.monotonic() + self._reconnect_delay
+
+    def _handle_db_error(self, e: Exception) -> None:
+        """接続に関するエラーであれば接続を破棄し、次回のポーリングで再接続させる"""
+        from . import queries
+        if queries.is_connection_error(e):
+            self.logger.warning(f"Database connection lost, scheduling reconnect: {e}")
+            self._release()
+            self._schedule_reconnect()
+
+    def _release(self) -> None:
+        """現在の接続を破棄する"""
+        db, self.db = self.db, None
+        self._db_file_id = None
+        if db is None:
+            return
+        try:
+            if db.session is not None:
+                db.close()
+            db.engine.dispose()
+        except Exception as e:
+            self.logger.debug("Error releasing database connection: %s", e)
+
+    @property
+    def database_path(self) -> Optional[str]:
+        """接続中（または接続予定）のmaster.dbのパス"""
+        if self.db_path:
+            return self.db_path
+        if self._snapshot is not None:
+            return self._snapshot.source_path
+        if self.db:
+            return self.db.engine.url.database
+        return None
+
+    @property
+    def analysis_root(self) -> Optional[str]:
+        """曲の解析ファイルのパス（AnalysisDataPath）の起点（master.dbと同じディレクトリのshare）"""
+        path = self.database_path
+        return os.path.join(os.path.dirname(path), 'share') if path else None
+
+    def _track_query(self):
+        """曲情報の整形に必要な列だけを持つフラットな行を返すクエリを作成する"""
+        from . import queries
+        return queries.track_query(self.db)
+
+    def _latest_content(self, limit: int, since: Optional[datetime] = None,
+                        since_usn: Optional[int] = None) -> List:
+        """updated_atの新しい順に曲を取得する
+
+        Args:
+            limit (int): 取得する曲数の上限
+            since (Optional[datetime]): この時刻より後に更新された曲だけを取得する
+            since_usn (Optional[int]): このrb_local_usnより後に変更された曲だけを取得する
+        """
+        from . import queries
+        return queries.latest_content(self.db, limit, since=since, since_usn=since_usn)
+
+    def _max_local_usn(self) -> Optional[int]:
+        """djmdContentの最大rb_local_usnを取得する"""
+        from . import queries
+        return queries.max_local_usn(self.db)
+
+    def _key_index(self) -> KeyIndex:
+        """DjmdKeyが変更されていれば読み込み直したキーの索引を取得する"""
+        if self.db is not None:
+            self._keys.refresh(self.db)
+        return self._keys
+
+    def _max_play_usn(self) -> Optional[int]:
+        """djmdSongHistoryの最大rb_local_usnを取得する（再生履歴がなければNone）"""
+        from . import queries
+        return queries.max_play_usn(self.db)
+
+    def get_current_track(self) -> Optional[TrackInfo]:
+        """現在再生中の曲情報を取得する
+
+        rekordboxの再生履歴（DjmdSongHistory）に記録された最後の再生を現在の曲とする。
+        再生履歴が1件もないデータベースでは、最後に更新された曲を現在の曲とみなす。
+        接続できない間やデータベースのエラー時は、最後に取得した曲情報を返す。
+        """
+        try:
+            if not self.ensure_connected():
                 return self._last_played_track
-            else:
-                # 更新時刻を持つ曲が見つからない場合
-                self._last_played_track = None
-                self._last_check_time = None
-                return None
+
+            play_usn = self._max_play_usn()
+            if play_usn is not None:
+                return self._current_track_from_history(play_usn)
+
+            # rekordboxが何も書き込んでいなければ前回の曲情報をそのまま返す
+            local_usn = self._max_local_usn()
+            if (local_usn is not None and local_usn == self._last_local_usn
+                    and self._last_played_track is not None):
+                return self._last_played_track
+
+            # 前回確認した時点より新しく更新された曲だけを問い合わせる
+            recent_tracks = self._latest_content(
+                self.POLL_LIMIT, since=self._last_updated_at, since_usn=self._last_local_usn
+            )
+            self._last_local_usn = local_usn
+            if not recent_tracks:
+                # 新しい更新がなければ前回の曲情報をそのまま返す
+                return self._last_played_track
+
+            # 最新の更新時刻を持つ曲を選択
+            current_time = datetime.now()
+            track = recent_tracks[0]
+            self._last_updated_at = track.updated_at
+
+            # 前回と異なる曲（IDかupdated_atが異なる）の場合、ログに記録
+            # タイトルではなく同一性で比較するため、同名の別曲や再生し直しも検出できる
+            if (self._last_played_track is None or
+                (track.ID, track.updated_at) != self._last_played_track.identity):
+                self.logger.info(f"New track detected: {track.Title} (Last updated: {track.updated_at})")
+                self._last_played_track = self._format_track_info(track)
+                self._last_check_time = current_time
+
+            return self._last_played_track
 
         except Exception as e:
             self.logger.error(f"Error getting current track: {e}")
-            return None
+            self._handle_db_error(e)
+            return self._last_played_track
+
+    def _current_track_from_history(self, play_usn: int) -> Optional[TrackInfo]:
+        """再生履歴に最後に記録された曲を取得する
 
-    def _format_track_info(self, track) -> Dict:
-        """曲情報を整形する"""
+        曲のメタデータの編集や解析では再生履歴は増えないため、現在の曲として誤検出しない。
+
+        Args:
+            play_usn (int): djmdSongHistoryの現在の最大rb_local_usn
+        """
+        # 再生履歴に書き込みがなければ前回の曲情報をそのまま返す
+        if play_usn == self._last_play_usn and self._last_played_track is not None:
+            return self._last_played_track
+
+        from . import queries
+        play = queries.latest_play(self.db)
+        self._last_play_usn = play_usn
+        if play is None:
+            return self._last_played_track
+
+        # 同じ曲でも再生し直せば記録時刻が変わるため、新しい再生として検出できる
+        if (self._last_played_track is None or
+                (play.ID, play.PlayedAt) != self._last_played_track.identity):
+            self.logger.info(f"New track detected: {play.Title} (Played at: {play.PlayedAt})")
+            self._last_played_track = self._format_track_info(play, played_at=play.PlayedAt)
+            self._last_check_time = datetime.now()
+        return self._last_played_track
+
+    def _format_track_info(self, track, played_at: Optional[datetime] = None) -> TrackInfo:
+        """曲情報を整形する
+
+        ポーリングのたびに呼ばれるため、属性の走査やログ文字列の生成は行わない。
+
+        Args:
+            track: queries.TRACK_COLUMNSを持つ行（ArtistName等の関連名を含むフラットな行）
+            played_at (Optional[datetime]): 再生履歴に記録された時刻（Noneの場合はupdated_atを使う）
+        """
         try:
-            # キー情報から名前部分を抽出
-            key_str = str(track.Key) if hasattr(track, 'Key') and track.Key else ''
-            key_match = re.search(r'Name=([^)]+)', key_str)
-            key = key_match.group(1) if key_match else ''
-
-            # BPM情報を取得（デバッグ情報を追加）
-            bpm = 0
-            if hasattr(track, 'BPM'):  # 大文字のBPMを試す
-                try:
-                    bpm_value = float(track.BPM)
-                    # BPMは100倍の整数値として保存されているため、100で割る
-                    bpm = round(bpm_value / 100, 2) if bpm_value > 0 else 0
-                    self.logger.info(f"Raw BPM value for {track.Title}: {track.BPM}, Converted: {bpm}")
-                except (ValueError, TypeError) as e:
-                    self.logger.error(f"Error converting BPM for {track.Title}: {e}")
-                    bpm = 0
+            # キーはKeyIDから索引で引く（キー名が行に含まれていればそれを使う）
+            if hasattr(track, 'KeyName') and track.KeyName:
+                key, key_camelot, key_open = key_notations(track.KeyName)
+            elif hasattr(track, 'KeyID'):
+                key, key_camelot, key_open = self._key_index().lookup(track.KeyID)
             else:
-                self.logger.warning(f"No BPM attribute found for track: {track.Title}")
-
-            # 日付情報を取得（updated_atを使用）
-            last_played = None
-            if hasattr(track, 'updated_at'):
-                try:
-                    last_played = track.updated_at
-                    self.logger.info(f"Last played date for {track.Title}: {last_played}")
-                except Exception as e:
-                    self.logger.error(f"Error getting updated_at for {track.Title}: {e}")
-                    last_played = None
-            else:
-                self.logger.warning(f"No updated_at found for track: {track.Title}")
-
-            # 利用可能な属性をログに出力
-            self.logger.info(f"Available attributes for track {track.Title}:")
-            for attr in dir(track):
-                if not attr.startswith('_'):
-                    try:
-                        value = getattr(track, attr)
-                        self.logger.info(f"  {attr}: {value}")
-                    except Exception as e:
-                        self.logger.error(f"Error getting attribute {attr}: {e}")
-
-            return {
-                "title": track.Title if hasattr(track, 'Title') else '',
-                "artist": track.Artist.Name if hasattr(track, 'Artist') and track.Artist else '',
-                "album": track.Album.Name if hasattr(track, 'Album') and track.Album else '',
-                "genre": track.Genre.Name if hasattr(track, 'Genre') and track.Genre else '',
-                "bpm": bpm,
-                "key": key,
-                "rating": track.Rating if hasattr(track, 'Rating') else 0,
-                "comment": track.Comment if hasattr(track, 'Comment') else '',
-                "duration": track.Duration if hasattr(track, 'Duration') else 0,
-                "file_path": track.Path if hasattr(track, 'Path') else '',
-                "last_played": last_played.strftime('%Y-%m-%d %H:%M:%S') if last_played else None,
-                "play_count": track.DJPlayCount if hasattr(track, 'DJPlayCount') else 0
-            }
+                key, key_camelot, key_open = '', '', ''
+
+            # BPMは100倍の整数値として保存されているため、100で割る
+            # （全属性の確認が必要な場合は rekordbox_client.diagnostics を使う）
+            bpm = formatter.scale_bpm(track.BPM) if hasattr(track, 'BPM') else 0
+
+            # 日付情報を取得（再生履歴の時刻がなければupdated_atを使用）
+            last_played = played_at
+            if last_played is None:
+                last_played = track.updated_at if hasattr(track, 'updated_at') else None
+            duration = track.Length if hasattr(track, 'Length') else 0
+
+            return TrackInfo(
+                content_id=track.ID if hasattr(track, 'ID') else None,
+                updated_at=last_played,
+                title=track.Title if hasattr(track, 'Title') else '',
+                artist=track.ArtistName if hasattr(track, 'ArtistName') and track.ArtistName else '',
+                album=track.AlbumName if hasattr(track, 'AlbumName') and track.AlbumName else '',
+                genre=track.GenreName if hasattr(track, 'GenreName') and track.GenreName else '',
+                bpm=bpm,
+                key=key,
+                rating=track.Rating if hasattr(track, 'Rating') else 0,
+                comment=track.Commnt if hasattr(track, 'Commnt') else '',
+                duration=duration,
+                file_path=track.FolderPath if hasattr(track, 'FolderPath') else '',
+                last_played=formatter.format_played_at(last_played),
+                play_count=track.DJPlayCount if hasattr(track, 'DJPlayCount') else 0,
+                length=format_duration(duration) if duration else '',
+                key_camelot=key_camelot,
+                key_open=key_open,
+                analysis_path=track.AnalysisDataPath if hasattr(track, 'AnalysisDataPath') else ''
+            )
         except Exception as e:
             self.logger.error(f"Error formatting track info: {e}")
-            return {
-                "title": "", "artist": "", "album": "", "genre": "",
-                "bpm": 0, "key": "", "rating": 0, "comment": "",
-                "duration": 0, "file_path": "", "last_played": None,
-                "play_count": 0
-            }
-
-    def get_history(self, limit: int = 10, days: int = 7) -> List[Dict]:
+            return TrackInfo()
+
+    def get_history(self, limit: int = 10, days: int = 7) -> List[TrackInfo]:
         """最近再生した曲の履歴を取得する
 
+        新しいセッションから順に、各セッション内では後に再生した曲から順に返す。
+        再生履歴が1件もないデータベースでは、更新日時の新しい曲を再生履歴とみなす。
+
         Args:
             limit (int): 取得する曲数の上限
             days (int): 何日前までの履歴を取得するか
         """
         try:
-            if not self.db:
-                if not self.connect():
-                    return []
-
-            content = self.db.get_content()
-            if not content:
+            if not self.ensure_connected():
                 return []
 
             # 一週間前の日時を計算
             week_ago = datetime.now() - timedelta(days=days)
             self.logger.info(f"Filtering tracks played after: {week_ago}")
 
-            # updated_atを持つ曲をフィルタリング
-            history = []
-            for track in content:
-                if hasattr(track, 'updated_at') and track.updated_at:
-                    try:
-                        # 一週間以内の曲のみを追加
-                        if track.updated_at > week_ago:
-                            history.append((track, track.updated_at))
-                            self.logger.info(f"Found recent track: {track.Title} (updated at {track.updated_at})")
-                    except Exception as e:
-                        self.logger.error(f"Error checking updated_at for track {track.Title}: {e}")
-                        continue
-
-            # 日付でソートして最新順に並び替え
-            history.sort(key=lambda x: x[1], reverse=True)
+            if self._max_play_usn() is not None:
+                from . import queries
+                plays = queries.recent_plays(self.db, limit, since=week_ago)
+                self.logger.info(f"Found {len(plays)} tracks in history")
+                return formatter.format_rows(plays, self._key_index())
+
+            # 期間内で更新日時の新しい曲をデータベース側で絞り込む
+            history = self._latest_content(limit, since=week_ago)
             self.logger.info(f"Found {len(history)} tracks in history")
 
-            # 指定された数の曲情報を返す
-            return [self._format_track_info(track) for track, _ in history[:limit]]
+            # 指定された数の曲情報をまとめて整形して返す
+            return formatter.format_rows(history, self._key_index())
         except Exception as e:
             self.logger.error(f"Error getting history: {e}")
+            self._handle_db_error(e)
+            return []
+
+    def get_session_history(self, history_id: Optional[str] = None) -> List[TrackInfo]:
+        """1つのセッション（rekordboxの履歴リスト）のセットリストを再生順に取得する
+
+        Args:
+            history_id (Optional[str]): DjmdHistoryのID（Noneの場合は最新のセッション）
+        """
+        try:
+            if not self.ensure_connected():
+                return []
+
+            from . import queries
+            if history_id is None:
+                session = queries.latest_session(self.db)
+                if session is None:
+                    return []
+                history_id = session.ID
+            return formatter.format_rows(queries.session_plays(self.db, history_id), self._key_index())
+        except Exception as e:
+            self.logger.error(f"Error getting session history: {e}")
+            self._handle_db_error(e)
             return []
 
     def close(self):
         """データベース接続を閉じる"""
         if self.db:
-            try:
-                self.db.close()
-                self.logger.info("Database connection closed")
-            except Exception as e:
-                self.logger.error(f"Error closing database connection: {e}") 
\ No newline at end of file
+            self._release()
+            self.logger.info("Database connection closed")
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
@@ -0,0 +1,282 @@
+"""
+master.dbの読み取り専用スナップショット
+
+rekordboxが解析やインポートで書き込んでいる間に稼働中のmaster.dbを直接読むと、
+rekordboxのロックと競合してビジーエラーや読み取りの遅延が起きる。DatabaseSnapshotは
+master.db（とコミット済みのWAL）をSQLiteのロックを取らずにバイト列として読み、
+ローカルのコピーのうち変わったページだけを書き換える。クライアントはコピーを開くため、
+rekordboxの書き込みに待たされることはない。
+
+SQLCipherで暗号化されたページも暗号化されたまま比較・コピーするため、鍵は必要ない。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+# SQLCipher 4・SQLiteの既定のページサイズ（WALがなくページサイズが分からない場合に使う）
+DEFAULT_PAGE_SIZE = 4096
+
+# WALファイルのヘッダー（32バイト）とフレームのヘッダー（24バイト）
+_WAL_HEADER = struct.Struct('>IIIIIIII')
+_WAL_FRAME_HEADER = struct.Struct('>IIIIII')
+_WAL_MAGIC = (0x377f0682, 0x377f0683)
+
+FileSignature = Tuple[Optional[Tuple[int, int, int]], Optional[Tuple[int, int, int]]]
+
+def read_wal(path: str) -> Tuple[Optional[int], Dict[int, bytes], Optional[int]]:
+    """WALファイルからコミット済みのページを読み取る
+
+    ヘッダーと同じソルトを持つフレームのうち、最後のコミットフレームまでを有効とする
+    （後のフレームが同じページを上書きする）。チェックサムの検証は行わない。
+
+    Args:
+        path (str): WALファイルのパス
+
+    Returns:
+        Tuple[Optional[int], Dict[int, bytes], Optional[int]]:
+            (ページサイズ, ページ番号（1始まり）からページの内容, コミット後のページ数)。
+            WALがないか空の場合は (None, {}, None)
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None, {}, None
+    if len(data) < _WAL_HEADER.size:
+        return None, {}, None
+    magic, _, page_size, _, salt1, salt2, _, _ = _WAL_HEADER.unpack_from(data)
+    if magic not in _WAL_MAGIC or page_size < 512:
+        return None, {}, None
+
+    committed: Dict[int, bytes] = {}
+    pending: Dict[int, bytes] = {}
+    db_pages = None
+    frame_size = _WAL_FRAME_HEADER.size + page_size
+    offset = _WAL_HEADER.size
+    while offset + frame_size <= len(data):
+        pgno, commit_pages, frame_salt1, frame_salt2, _, _ = _WAL_FRAME_HEADER.unpack_from(data, offset)
+        if (frame_salt1, frame_salt2) != (salt1, salt2):
+            # 以前のチェックポイントより前に書かれた古いフレーム
+            break
+        start = offset + _WAL_FRAME_HEADER.size
+        pending[pgno] = data[start:start + page_size]
+        if commit_pages:
+            committed.update(pending)
+            pending.clear()
+            db_pages = commit_pages
+        offset += frame_size
+    return page_size, committed, db_pages
+
+def read_wal_salt(path: str) -> Optional[Tuple[int, int]]:
+    """WALファイルのヘッダーのソルト（チェックポイントの後にWALを使い直すたびに変わる）
+
+    Returns:
+        Optional[Tuple[int, int]]: (salt1, salt2)。WALがないか不正な場合はNone
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_WAL_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < _WAL_HEADER.size:
+        return None
+    magic, _, _, _, salt1, salt2, _, _ = _WAL_HEADER.unpack(header)
+    if magic not in _WAL_MAGIC:
+        return None
+    return salt1, salt2
+
+class DatabaseSnapshot:
+    """master.dbのローカルコピーをページ単位で最新に保つ
+
+    refreshはmaster.dbと-walのサイズ・更新時刻が変わっていなければ何もしない。
+    変わっていれば、読み取り中にファイルが書き換えられていないことを確認したうえで
+    変わったページだけをコピーに書き込む。書き込みが続いていて一貫した状態を
+    読み取れなければ、以前のコピーをそのまま使う。
+
+    前回の更新からmaster.db本体が変わらず、WALも同じ世代（ソルトが同じ）であれば、
+    変わり得るのはWALに書かれたページだけなので、そのページだけを比較する。
+    本体が変わった場合（チェックポイントの後など）だけファイル全体を比較する。
+    """
+
+    def __init__(self, source_path: str, snapshot_path: Optional[str] = None, max_attempts: int = 3):
+        """
+        Args:
+            source_path (str): 稼働中のmaster.dbのパス
+            snapshot_path (Optional[str]): コピーのパス（Noneの場合は一時ディレクトリに作成する）
+            max_attempts (int): 読み取り中にファイルが変更された場合に読み直す回数
+        """
+        self.source_path = source_path
+        self._temp_dir = None
+        if snapshot_path is None:
+            self._temp_dir = tempfile.mkdtemp(prefix='rekordbox-snapshot-')
+            snapshot_path = os.path.join(self._temp_dir, os.path.basename(source_path))
+        self.path = snapshot_path
+        self.max_attempts = max_attempts
+        self.logger = logging.getLogger(__name__)
+        self._signature: Optional[FileSignature] = None
+        self._wal_salt: Optional[Tuple[int, int]] = None
+        self._stats = {
+            'refreshes': 0,
+            'pages_written': 0,
+            'full_compares': 0,
+            'unstable': 0,
+            'last_duration': None,
+        }
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """更新回数・書き込んだページ数・全体を比較した回数・読み取りを諦めた回数・最後の更新の所要時間"""
+        return dict(self._stats)
+
+    def _file_signature(self) -> FileSignature:
+        """master.dbと-walの（サイズ, 更新時刻, inode）"""
+        result = []
+        for path in (self.source_path, self.source_path + '-wal'):
+            try:
+                st = os.stat(path)
+                result.append((st.st_size, st.st_mtime_ns, st.st_ino))
+            except FileNotFoundError:
+                result.append(None)
+        return tuple(result)
+
+    def refresh(self) -> bool:
+        """コピーを最新にする
+
+        Returns:
+            bool: コピーの内容が変わった場合はTrue（開いている接続は開き直す必要がある）
+        """
+        signature = self._file_signature()
+        if signature == self._signature and os.path.exists(self.path):
+            return False
+
+        start = time.perf_counter()
+        for _ in range(self.max_attempts):
+            before = self._file_signature()
+            if before[0] is None:
+                raise FileNotFoundError(self.source_path)
+            wal_salt = read_wal_salt(self.source_path + '-wal')
+            if not os.path.exists(self.path):
+                changes = None
+                written = self._copy_full()
+            else:
+                # 本体が前回のままで、WALも同じ世代であればWALのページだけを比較する
+                wal_only = (self._signature is not None and before[0] == self._signature[0]
+                            and wal_salt is not None and wal_salt == self._wal_salt)
+                changes = self._collect_changes(wal_only)
+            if self._file_signature() != before:
+                # 読み取り中に書き込まれたため、一貫した状態ではない
+                continue
+            if changes is not None:
+                written = self._apply(*changes)
+            elif not self._install_full():
+                continue
+            self._signature = before
+            self._wal_salt = wal_salt
+            self._stats['refreshes'] += 1
+            self._stats['pages_written'] += written
+            self._stats['last_duration'] = time.perf_counter() - start
+            if written:
+                self.logger.debug("Snapshot refreshed: %d pages written", written)
+            return written > 0
+
+        self._stats['unstable'] += 1
+        self.logger.warning("Database kept changing while reading, using the previous snapshot")
+        return False
+
+    def close(self) -> None:
+        """一時ディレクトリに作成したコピーを削除する"""
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+
+    def _copy_full(self) -> int:
+        """最初のコピー：一時ファイルに丸ごとコピーし、WALのページを反映する"""
+        partial = self.path + '.partial'
+        shutil.copyfile(self.source_path, partial)
+        page_size, wal_pages, db_pages = read_wal(self.source_path + '-wal')
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        with open(partial, 'r+b') as f:
+            for pgno, page in wal_pages.items():
+                f.seek((pgno - 1) * page_size)
+                f.write(page)
+            if db_pages is not None:
+                f.truncate(db_pages * page_size)
+            f.seek(0, os.SEEK_END)
+            return f.tell() // page_size
+
+    def _install_full(self) -> bool:
+        partial = self.path + '.partial'
+        if not os.path.exists(partial):
+            return False
+        # コピーの横に古いWAL・ジャーナルが残っていると、開いたときに誤って反映されるため削除する
+        for suffix in ('-wal', '-shm', '-journal'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+        os.replace(partial, self.path)
+        return True
+
+    def _collect_changes(self, wal_only: bool = False) -> Tuple[List[Tuple[int, bytes]], int, int]:
+        """コピーと異なるページを集める（書き込みはファイルが安定していることを確認してから行う）
+
+        Args:
+            wal_only (bool): WALに書かれたページだけを比較する（master.db本体が前回の更新から
+                変わっていない場合）
+
+        Returns:
+            Tuple[List[Tuple[int, bytes]], int, int]: ([(ページ番号, 内容)], ページサイズ, ページ数)
+        """
+        page_size, wal_pages, db_pages = read_wal(self.source_path + '-wal')
+        if wal_only and page_size:
+            return self._collect_wal_changes(page_size, wal_pages, db_pages)
+        self._stats['full_compares'] += 1
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        changes = []
+        pgno = 0
+        with open(self.source_path, 'rb') as source, open(self.path, 'rb') as copy:
+            while True:
+                page = source.read(page_size)
+                current = copy.read(page_size)
+                if not page:
+                    break
+                pgno += 1
+                page = wal_pages.pop(pgno, page)
+                if page != current:
+                    changes.append((pgno, page))
+        # master.dbより後ろに追加されたページはWALにだけ存在する
+        changes.extend(sorted(wal_pages.items()))
+        if wal_pages:
+            pgno = max(pgno, max(wal_pages))
+        return changes, page_size, db_pages if db_pages is not None else pgno
+
+    def _collect_wal_changes(self, page_size: int, wal_pages: Dict[int, bytes],
+                             db_pages: Optional[int]) -> Tuple[List[Tuple[int, bytes]], int, int]:
+        """WALのページだけをコピーの同じページと比較する"""
+        changes = []
+        with open(self.path, 'rb') as copy:
+            for pgno, page in sorted(wal_pages.items()):
+                copy.seek((pgno - 1) * page_size)
+                if copy.read(page_size) != page:
+                    changes.append((pgno, page))
+            copy.seek(0, os.SEEK_END)
+            copy_pages = copy.tell() // page_size
+        if db_pages is None:
+            db_pages = max([copy_pages] + list(wal_pages))
+        return changes, page_size, db_pages
+
+    def _apply(self, changes: List[Tuple[int, bytes]], page_size: int, db_pages: int) -> int:
+        with open(self.path, 'r+b') as f:
+            for pgno, page in changes:
+                f.seek((pgno - 1) * page_size)
+                f.write(page)
+            size = db_pages * page_size
+            f.seek(0, os.SEEK_END)
+            truncated = f.tell() > size
+            if truncated:
+                f.truncate(size)
+        return len(changes) or int(truncated)
@@ -0,0 +1,76 @@
+import sqlite3
+import pytest
+from datetime import datetime, timedelta
+from rekordbox_client.rekordbox_client import format_db_timestamp
+from benchmarks.synthetic_db import _insert_rows, create_synthetic_database
+
+def _max_usn(conn):
+    """rekordboxと同様に、テーブルをまたいだ通し番号としてrb_local_usnの最大値を取得する"""
+    return conn.execute(
+        "SELECT MAX(usn) FROM (SELECT MAX(rb_local_usn) AS usn FROM djmdContent "
+        "UNION ALL SELECT MAX(rb_local_usn) FROM djmdSongHistory)"
+    ).fetchone()[0] or 0
+
+@pytest.fixture
+def synthetic_db(tmp_path):
+    """50曲を持つ検証用データベースのパスを提供するfixture"""
+    return create_synthetic_database(str(tmp_path / "master.db"), num_tracks=50)
+
+def _touch_content(db_path, content_id, minutes=1, **columns):
+    """rekordboxによる曲の更新（updated_atとrb_local_usnの更新）を再現する"""
+    conn = sqlite3.connect(db_path)
+    try:
+        values = dict(columns)
+        values["updated_at"] = format_db_timestamp(datetime.now() + timedelta(minutes=minutes))
+        values["rb_local_usn"] = _max_usn(conn) + 1
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        conn.execute(
+            f"UPDATE djmdContent SET {assignments} WHERE ID = ?",
+            tuple(values.values()) + (content_id,)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+@pytest.fixture
+def touch_track(synthetic_db):
+    """synthetic_dbの曲の更新を再現するfixture"""
+    return lambda content_id, minutes=1, **columns: _touch_content(
+        synthetic_db, content_id, minutes, **columns
+    )
+
+@pytest.fixture
+def history_db(tmp_path):
+    """50曲と3セッション（各10曲）の再生履歴を持つ検証用データベースのパスを提供するfixture"""
+    return create_synthetic_database(
+        str(tmp_path / "history.db"), num_tracks=50, history_sessions=3, tracks_per_session=10
+    )
+
+@pytest.fixture
+def play_track(history_db):
+    """rekordboxによる再生履歴の記録（最新セッションへの追加）を再現するfixture"""
+    def play(content_id, minutes=1):
+        conn = sqlite3.connect(history_db)
+        try:
+            history_id, track_no = conn.execute(
+                "SELECT HistoryID, MAX(TrackNo) FROM djmdSongHistory "
+                "WHERE HistoryID = (SELECT MAX(CAST(ID AS INTEGER)) FROM djmdHistory)"
+            ).fetchone()
+            play_id = conn.execute("SELECT COUNT(*) FROM djmdSongHistory").fetchone()[0] + 1
+            played_at = format_db_timestamp(datetime.now() + timedelta(minutes=minutes))
+            _insert_rows(conn, "djmdSongHistory", [{
+                "ID": str(play_id), "HistoryID": history_id, "ContentID": content_id,
+                "TrackNo": track_no + 1, "UUID": f"song-history-uuid-{play_id}",
+                "rb_local_usn": _max_usn(conn) + 1, "created_at": played_at, "updated_at": played_at,
+            }])
+            conn.commit()
+        finally:
+            conn.close()
+    return play
+
+@pytest.fixture
+def touch_history_track(history_db):
+    """history_dbの曲の更新（メタデータの編集や解析）を再現するfixture"""
+    return lambda content_id, minutes=1, **columns: _touch_content(
+        history_db, content_id, minutes, **columns
+    )
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from rekordbox_client import queries
+from rekordbox_client.rekordbox_client import RekordboxClient
+from rekordbox_client.change_feed import (
+    ContentChangeFeed, CHANGE_ADDED, CHANGE_UPDATED, CHANGE_DELETED
+)
+
+class TestContentChangeFeed:
+    @pytest.fixture
+    def client(self, synthetic_db):
+        client = RekordboxClient(db_path=synthetic_db, unlock=False)
+        yield client
+        client.close()
+
+    @pytest.fixture
+    def feed(self, client):
+        return ContentChangeFeed(client)
+
+    def test_first_poll_starts_from_latest(self, feed):
+        """最初のポーリングでは既存の行を通知しないことのテスト"""
+        assert list(feed.poll()) == []
+        assert feed.watermark[0] == 50
+        assert list(feed.poll()) == []
+
+    def test_poll_returns_only_changed_rows(self, feed, touch_track):
+        """変更された行だけが変更順に返されることのテスト"""
+        feed.poll()
+        touch_track('7')
+        touch_track('3', Title='Renamed')
+
+        changes = list(feed.poll())
+        assert [c.content_id for c in changes] == ['7', '3']
+        assert [c.change_type for c in changes] == [CHANGE_UPDATED, CHANGE_UPDATED]
+        assert changes[1].title == 'Renamed'
+        assert feed.watermark[0] == 52
+
+        # 変更がなければ何も返さない
+        assert list(feed.poll()) == []
+
+    def test_poll_detects_deleted_rows(self, feed, touch_track):
+        """削除フラグの付いた行が削除イベントになることのテスト"""
+        feed.poll()
+        touch_track('5', rb_local_deleted=1)
+        changes = list(feed.poll())
+        assert len(changes) == 1
+        assert changes[0].change_type == CHANGE_DELETED
+
+    def test_replay_from_beginning_in_batches(self, client):
+        """先頭から再生する場合にバッチをまたいで全行が返されることのテスト"""
+        feed = ContentChangeFeed(client, batch_size=7, start_from_latest=False)
+        changes = list(feed.poll())
+        assert [c.content_id for c in changes] == [str(i) for i in range(1, 51)]
+        assert all(c.change_type == CHANGE_ADDED for c in changes)
+        assert list(feed.poll()) == []
+
+    def test_failed_batch_keeps_watermark(self, client, monkeypatch):
+        """途中のバッチで失敗したらウォーターマークを進めず、接続し直して同じ行から取得することのテスト"""
+        feed = ContentChangeFeed(client, batch_size=7, start_from_latest=False)
+        changed_content = queries.changed_content
+        calls = []
+
+        def failing(db, since_usn, limit):
+            calls.append(since_usn)
+            if len(calls) == 2:
+                raise OperationalError("SELECT", {}, Exception("database is locked"))
+            return changed_content(db, since_usn, limit)
+
+        monkeypatch.setattr(queries, 'changed_content', failing)
+        assert list(feed.poll()) == []
+        assert feed.watermark == (None, None)
+        assert client.db is None
+
+        client._next_connect_time = 0.0
+        changes = list(feed.poll())
+        assert [c.content_id for c in changes] == [str(i) for i in range(1, 51)]
+
+    def test_subscribers_receive_changes(self, feed, touch_track):
+        """購読者への通知と購読解除のテスト"""
+        received = []
+        failing_calls = []
+
+        def failing_subscriber(change):
+            failing_calls.append(change)
+            raise RuntimeError("subscriber error")
+
+        unsubscribe = feed.subscribe(received.append)
+        feed.subscribe(failing_subscriber)
+        feed.poll()
+
+        touch_track('1')
+        feed.poll()
+        assert [c.content_id for c in received] == ['1']
+        assert len(failing_calls) == 1  # 例外を出す購読者がいても他の購読者には届く
+
+        unsubscribe()
+        touch_track('2')
+        feed.poll()
+        assert [c.content_id for c in received] == ['1']
@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+import pytest
+from rekordbox_client.db_watcher import DatabaseWatcher
+
+def write_later(path, data, delay=0.05):
+    """別スレッドで少し遅れてファイルに書き込む"""
+    def write():
+        time.sleep(delay)
+        with open(path, 'ab') as f:
+            f.write(data)
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "master.db"
+    path.write_bytes(b"SQLite format 3\0")
+    return path
+
+@pytest.fixture(params=[
+    False,
+    pytest.param(True, marks=pytest.mark.skipif(
+        not sys.platform.startswith('linux'), reason="inotify is only available on Linux")),
+])
+def watcher(request, db_file):
+    watcher = DatabaseWatcher(str(db_file), debounce=0.05, poll_interval=0.02,
+                              use_inotify=request.param)
+    assert watcher.mode == ('inotify' if request.param else 'stat')
+    yield watcher
+    watcher.close()
+
+def test_timeout_without_changes(watcher):
+    """変更がなければタイムアウトすることのテスト"""
+    assert watcher.wait_for_change(timeout=0.1) is False
+
+def test_detects_wal_write(watcher, db_file):
+    """WALファイルへの書き込みを検出することのテスト"""
+    thread = write_later(str(db_file) + "-wal", b"frame")
+    assert watcher.wait_for_change(timeout=2) is True
+    thread.join()
+    # 同じ変更は再度通知されない
+    assert watcher.wait_for_change(timeout=0.1) is False
+
+def test_ignores_unrelated_files(watcher, db_file):
+    """監視対象外のファイルの変更を無視することのテスト"""
+    thread = write_later(str(db_file.parent / "other.db"), b"data")
+    thread2 = write_later(str(db_file) + "-shm", b"data")
+    assert watcher.wait_for_change(timeout=0.2) is False
+    thread.join()
+    thread2.join()
+
+def test_debounces_burst_of_writes(watcher, db_file):
+    """連続した書き込みが1回の通知にまとめられることのテスト"""
+    def burst():
+        for _ in range(5):
+            with open(db_file, 'ab') as f:
+                f.write(b"page")
+            time.sleep(0.01)
+    thread = threading.Thread(target=burst)
+    thread.start()
+    assert watcher.wait_for_change(timeout=2) is True
+    thread.join()
+    assert watcher.wait_for_change(timeout=0.1) is False
+
+def test_continuous_writes_are_reported(watcher, db_file):
+    """書き込みが続いて落ち着かなくても、max_debounceかタイムアウトで変更を通知することのテスト"""
+    stop = threading.Event()
+
+    def writer():
+        while not stop.is_set():
+            with open(db_file, 'ab') as f:
+                f.write(b"page")
+            time.sleep(0.01)
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        watcher.max_debounce = 0.2
+        start = time.monotonic()
+        assert watcher.wait_for_change(timeout=5) is True
+        assert time.monotonic() - start < 1
+
+        watcher.max_debounce = 10
+        start = time.monotonic()
+        assert watcher.wait_for_change(timeout=0.3) is True
+        assert time.monotonic() - start < 1
+    finally:
+        stop.set()
+        thread.join()
+
+def test_run_calls_callback_on_change(watcher, db_file):
+    """監視ループが変更時にcallbackを呼び出すことのテスト"""
+    calls = []
+    stop_event = threading.Event()
+
+    def callback():
+        calls.append(time.monotonic())
+        stop_event.set()
+
+    loop = threading.Thread(target=watcher.run, args=(callback, stop_event))
+    loop.start()
+    write_later(str(db_file), b"page").join()
+    loop.join(timeout=3)
+    assert not loop.is_alive()
+    assert len(calls) == 1
+
+def test_stop_event_interrupts_wait(watcher, db_file):
+    """stop_eventがセットされたら、変更の待機中やデバウンス中でもすぐに戻ることのテスト"""
+    stop_event = threading.Event()
+    threading.Timer(0.05, stop_event.set).start()
+    start = time.monotonic()
+    assert watcher.wait_for_change(timeout=10, stop_event=stop_event) is False
+    assert time.monotonic() - start < 1
+
+    # 書き込みを検出した後のデバウンス中に停止された場合
+    watcher.debounce = 10
+    stop_event.clear()
+    write_later(str(db_file), b"page").join()
+    threading.Timer(0.05, stop_event.set).start()
+    start = time.monotonic()
+    assert watcher.wait_for_change(timeout=10, stop_event=stop_event) is False
+    assert time.monotonic() - start < 1
@@ -0,0 +1,75 @@
+import os
+import time
+import pytest
+from rekordbox_client.device_library import EXPORT_PATH, DeviceLibraryClient, read_string
+from benchmarks.synthetic_pdb import create_synthetic_export, encode_string
+
+@pytest.fixture
+def export_root(tmp_path):
+    """50曲と2つの履歴プレイリスト（各10曲）を持つエクスポート先のメディアを提供するfixture"""
+    create_synthetic_export(
+        str(tmp_path / EXPORT_PATH), num_tracks=50, history_sessions=2, tracks_per_session=10
+    )
+    return str(tmp_path)
+
+class TestReadString:
+    @pytest.mark.parametrize("value", ["", "Track 1", "x" * 200, "トラック 1"])
+    def test_round_trip(self, value):
+        """短いASCII・長いASCII・UTF-16の文字列を読めることのテスト"""
+        assert read_string(b'\x00' + encode_string(value), 1) == value
+
+class TestDeviceLibraryClient:
+    def test_track_fields(self, export_root):
+        """曲情報がmaster.dbの合成データと同じ値で整形されることのテスト"""
+        client = DeviceLibraryClient(export_root)
+        try:
+            assert client.connect()
+            assert len(client) == 50
+            track = client.get_track(14)
+            assert (track.content_id, track.title, track.artist, track.album) == \
+                ('14', "Track 14", "Artist 4", "Album 2")
+            assert track.genre == "Disco"
+            assert track.bpm == 121.3
+            assert (track.key, track.key_camelot) == ("D#m", "2A")
+            assert track.duration == 193
+            assert track.file_path == "/Contents/Artist 4/Track 14.mp3"
+            assert client.get_track(999) is None
+        finally:
+            client.close()
+
+    def test_current_track_from_history(self, export_root):
+        """最新の履歴プレイリストの最後の曲を現在の曲とすることのテスト"""
+        client = DeviceLibraryClient(os.path.join(export_root, EXPORT_PATH))
+        try:
+            assert client.get_current_track().title == "Track 20"
+            assert [t.title for t in client.get_history(limit=3)] == ["Track 20", "Track 19", "Track 18"]
+        finally:
+            client.close()
+
+    def test_unicode_titles(self, tmp_path):
+        """UTF-16で保存された曲名を読めることのテスト"""
+        path = create_synthetic_export(str(tmp_path / "export.pdb"), num_tracks=3, title_format="トラック {}")
+        client = DeviceLibraryClient(path)
+        try:
+            assert client.get_track(2).title == "トラック 2"
+        finally:
+            client.close()
+
+    def test_missing_export(self, tmp_path):
+        """export.pdbがない場合は接続に失敗することのテスト"""
+        client = DeviceLibraryClient(str(tmp_path))
+        assert not client.connect()
+        assert client.get_current_track() is None
+
+    def test_large_export_opens_quickly(self, tmp_path):
+        """2万曲のエクスポートを1秒未満で開けることのテスト"""
+        path = create_synthetic_export(str(tmp_path / "export.pdb"), num_tracks=20000)
+        client = DeviceLibraryClient(path)
+        try:
+            start = time.perf_counter()
+            assert client.connect()
+            assert time.perf_counter() - start < 1.0
+            assert len(client) == 20000
+            assert client.get_track(20000).title == "Track 20000"
+        finally:
+            client.close()
@@ -0,0 +1,60 @@
+import logging
+import pytest
+from rekordbox_client.rekordbox_client import RekordboxClient
+from rekordbox_client import diagnostics
+
+class TestDiagnostics:
+    @pytest.fixture
+    def client(self, synthetic_db):
+        client = RekordboxClient(db_path=synthetic_db, unlock=False)
+        assert client.connect()
+        yield client
+        client.close()
+
+    def test_dump_track_attributes(self, client):
+        """曲の全属性を取得できることのテスト"""
+        track = diagnostics.find_track(client, "3")
+        attributes = diagnostics.dump_track_attributes(track)
+        assert attributes["Title"] == "Track 3"
+        assert attributes["ArtistName"] == "Artist 3"
+        assert attributes["BPM"] == 12020
+        assert not any(name.startswith('_') for name in attributes)
+
+    def test_find_latest_track(self, client):
+        """ID省略時に最後に更新された曲が対象になることのテスト"""
+        assert diagnostics.find_track(client).Title == "Track 50"
+
+    def test_log_track_attributes_is_opt_in(self, client, caplog):
+        """診断用ログカテゴリが有効な場合だけ出力されることのテスト"""
+        track = diagnostics.find_track(client, "3")
+        with caplog.at_level(logging.INFO, logger=diagnostics.logger.name):
+            diagnostics.log_track_attributes(track)
+        assert caplog.records == []
+
+        with caplog.at_level(logging.DEBUG, logger=diagnostics.logger.name):
+            diagnostics.log_track_attributes(track)
+        assert any("ArtistName" in record.getMessage() for record in caplog.records)
+
+    def test_format_track_info_does_not_introspect(self, client):
+        """通常の整形処理で属性の走査が行われないことのテスト"""
+        row = client._latest_content(1)[0]
+
+        class NoIntrospection:
+            def __init__(self, row):
+                self.__dict__.update(row._asdict())
+
+            def __dir__(self):
+                raise AssertionError("dir() must not be called on the hot path")
+
+        result = client._format_track_info(NoIntrospection(row))
+        assert result["title"] == "Track 50"
+        assert result["artist"] == "Artist 5"
+
+    def test_main(self, synthetic_db, capsys):
+        """デバッグコマンドのテスト"""
+        assert diagnostics.main(["7", "--db", synthetic_db, "--no-unlock"]) == 0
+        output = capsys.readouterr().out
+        assert "Available attributes for track Track 7" in output
+        assert "ArtistName: Artist 2" in output
+
+        assert diagnostics.main(["999", "--db", synthetic_db, "--no-unlock"]) == 1
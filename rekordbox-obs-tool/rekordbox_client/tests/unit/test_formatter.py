@@ -0,0 +1,63 @@
+import time
+import pytest
+from datetime import datetime
+from rekordbox_client import formatter, queries
+from rekordbox_client.rekordbox_client import RekordboxClient
+from benchmarks.synthetic_db import create_synthetic_database
+
+class TestFormatter:
+    @pytest.fixture
+    def client(self, history_db):
+        client = RekordboxClient(db_path=history_db, unlock=False)
+        assert client.connect()
+        yield client
+        client.close()
+
+    def test_format_rows_matches_single_row_formatting(self, client):
+        """一括整形の結果が1行ずつの整形と一致することのテスト"""
+        rows = queries.recent_plays(client.db, 30)
+        tracks = formatter.format_rows(rows, client._key_index())
+        expected = [client._format_track_info(row, played_at=row.PlayedAt) for row in rows]
+        assert [t.to_dict() for t in tracks] == [t.to_dict() for t in expected]
+        assert [t.identity for t in tracks] == [t.identity for t in expected]
+
+        # 再生履歴のない行はupdated_atを再生時刻とする
+        rows = queries.latest_content(client.db, 5)
+        assert [t.updated_at for t in formatter.format_rows(rows)] == [row.updated_at for row in rows]
+
+    def test_format_columns(self):
+        """列ごとの配列からの整形のテスト"""
+        tracks = formatter.format_columns({
+            'ID': ['1', '2', '3'],
+            'Title': ['A', None, 'C'],
+            'BPM': [12800, 'invalid', None],
+            'KeyName': ['Am', None, 'F#'],
+            'Length': [229, 3725, None],
+            'updated_at': [datetime(2024, 1, 2, 3, 4, 5, 678000), None, None],
+        })
+        assert [t.title for t in tracks] == ['A', '', 'C']
+        assert [t.bpm for t in tracks] == [128.0, 0, 0]
+        assert [t.length for t in tracks] == ['00:03:49', '01:02:05', '']
+        assert [t.key_camelot for t in tracks] == ['8A', '', '2B']
+        assert tracks[0].last_played == '2024-01-02 03:04:05'
+        assert tracks[1].last_played is None
+        assert tracks[2].artist == '' and tracks[2].play_count == 0 and tracks[2].rating == 0
+        assert formatter.format_columns({}) == []
+        assert formatter.format_rows([]) == []
+
+    def test_format_large_history(self, tmp_path):
+        """2,000曲の履歴を短時間で整形できることのテスト"""
+        db_path = create_synthetic_database(
+            str(tmp_path / "large.db"), num_tracks=500, history_sessions=20, tracks_per_session=100
+        )
+        client = RekordboxClient(db_path=db_path, unlock=False)
+        try:
+            assert client.connect()
+            rows = queries.recent_plays(client.db, 2000)
+            start = time.perf_counter()
+            tracks = formatter.format_rows(rows)
+            elapsed = time.perf_counter() - start
+        finally:
+            client.close()
+        assert len(tracks) == 2000
+        assert elapsed < 0.5
@@ -0,0 +1,84 @@
+import sqlite3
+import pytest
+from sqlalchemy import event
+from rekordbox_client.rekordbox_client import RekordboxClient
+
+def _session_content_ids(db_path, history_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT ContentID FROM djmdSongHistory WHERE HistoryID = ? ORDER BY TrackNo", (history_id,)
+        )]
+    finally:
+        conn.close()
+
+class TestPlayHistory:
+    @pytest.fixture
+    def client(self, history_db):
+        client = RekordboxClient(db_path=history_db, unlock=False)
+        yield client
+        client.close()
+
+    def test_current_track_from_history(self, client, history_db):
+        """再生履歴の最後の再生が現在の曲になることのテスト"""
+        last_content_id = _session_content_ids(history_db, '3')[-1]
+        result = client.get_current_track()
+        assert result.content_id == last_content_id
+        # 最後に更新された曲（Track 50）ではない
+        assert result.title != "Track 50"
+        assert result.last_played is not None
+
+    def test_metadata_edit_is_not_a_new_track(self, client, touch_history_track):
+        """曲の編集や解析による更新を再生として扱わないことのテスト"""
+        result1 = client.get_current_track()
+        touch_history_track('1', Rating=5)
+        assert client.get_current_track() is result1
+
+    def test_new_play_and_replay(self, client, play_track):
+        """新しい再生と同じ曲の再生し直しを検出することのテスト"""
+        result1 = client.get_current_track()
+
+        play_track('7')
+        result2 = client.get_current_track()
+        assert result2.title == "Track 7"
+
+        # 同じ曲をもう一度再生した場合も新しい再生として扱う
+        play_track('7', minutes=5)
+        result3 = client.get_current_track()
+        assert result3.content_id == result2.content_id
+        assert result3 != result2
+        assert result1 != result2
+
+    def test_idle_poll_single_query(self, client):
+        """再生履歴に変化がなければ最大値の確認だけで済むことのテスト"""
+        client.get_current_track()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(client.db.engine, "before_cursor_execute", record)
+        try:
+            client.get_current_track()
+        finally:
+            event.remove(client.db.engine, "before_cursor_execute", record)
+        assert len(statements) == 1
+        assert "max(" in statements[0] and "djmdSongHistory" in statements[0]
+
+    def test_session_history(self, client, history_db):
+        """セッションのセットリストを再生順に取得することのテスト"""
+        setlist = client.get_session_history()
+        assert [track.content_id for track in setlist] == _session_content_ids(history_db, '3')
+
+        setlist = client.get_session_history('1')
+        assert [track.content_id for track in setlist] == _session_content_ids(history_db, '1')
+        assert all(track.artist and track.key for track in setlist)
+
+        assert client.get_session_history('missing') == []
+
+    def test_get_history_across_sessions(self, client, history_db):
+        """新しいセッションから順に、後の再生から遡って取得することのテスト"""
+        history = client.get_history(limit=15, days=30)
+        expected = (list(reversed(_session_content_ids(history_db, '3')))
+                    + list(reversed(_session_content_ids(history_db, '2')))[:5])
+        assert [track.content_id for track in history] == expected
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+# パッケージのインポートにかけてよい時間（マイクロ秒）
+# pyrekordbox・SQLAlchemyを読み込むと1秒近くかかるため、それを検出できる値にしている
+IMPORT_BUDGET_US = 300_000
+
+# 接続する（波形を描画する）まで読み込んではいけない重いモジュール
+HEAVY_MODULES = ('pyrekordbox', 'sqlalchemy', 'sqlcipher3', 'numpy')
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+def _import_times(code: str):
+    """新しいインタープリタで -X importtime を使い、モジュールごとの累積時間を取得する"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+class TestImportTime:
+    def test_heavy_modules_are_not_imported(self):
+        """パッケージのインポートとクライアントの作成では重いモジュールを読み込まないことのテスト"""
+        times = _import_times(
+            "import rekordbox_client; rekordbox_client.RekordboxClient(); "
+            "rekordbox_client.ContentChangeFeed(rekordbox_client.RekordboxClient())"
+        )
+        assert 'rekordbox_client' in times
+        loaded = [name for name in times if name.split('.')[0] in HEAVY_MODULES]
+        assert loaded == []
+
+    def test_import_time_budget(self):
+        """パッケージのインポート時間が予算内であることのテスト"""
+        times = _import_times("import rekordbox_client")
+        assert times['rekordbox_client'] < IMPORT_BUDGET_US
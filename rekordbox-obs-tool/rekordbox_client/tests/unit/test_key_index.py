@@ -0,0 +1,65 @@
+import sqlite3
+import pytest
+from sqlalchemy import event
+from rekordbox_client.key_index import EMPTY_KEY, KeyIndex, key_notations
+from rekordbox_client.rekordbox_client import RekordboxClient
+
+class TestKeyNotations:
+    @pytest.mark.parametrize("name, camelot, open_key", [
+        ("C", "8B", "1d"), ("Am", "8A", "1m"),
+        ("G", "9B", "2d"), ("Em", "9A", "2m"),
+        ("B", "1B", "6d"), ("G#m", "1A", "6m"), ("Abm", "1A", "6m"),
+        ("F#", "2B", "7d"), ("Gb", "2B", "7d"), ("D#m", "2A", "7m"), ("Ebm", "2A", "7m"),
+        ("Db", "3B", "8d"), ("Bbm", "3A", "8m"),
+        ("F", "7B", "12d"), ("Dm", "7A", "12m"), ("Cm", "5A", "10m"),
+    ])
+    def test_key_notations(self, name, camelot, open_key):
+        """キー名からCamelot表記・Open Key表記への変換のテスト"""
+        assert key_notations(name) == (name, camelot, open_key)
+
+    def test_unknown_key(self):
+        """解釈できないキー名のテスト"""
+        assert key_notations(None) == EMPTY_KEY
+        assert key_notations("") == EMPTY_KEY
+        assert key_notations("8A") == ("8A", "", "")
+        assert key_notations("Cx") == ("Cx", "", "")
+
+class TestKeyIndex:
+    def test_lookup(self):
+        """IDからの索引のテスト"""
+        index = KeyIndex()
+        index.load([("1", "C"), ("2", "Am"), ("uuid-key", "Em")])
+        assert index.lookup("1") == ("C", "8B", "1d")
+        assert index.lookup(2) == ("Am", "8A", "1m")
+        assert index.lookup("uuid-key") == ("Em", "9A", "2m")
+        assert index.lookup("99") == EMPTY_KEY
+        assert index.lookup(None) == EMPTY_KEY
+        assert len(index) == 3
+
+    def test_refresh_only_when_table_changes(self, synthetic_db, touch_track):
+        """DjmdKeyが変更された場合だけ読み込み直すことのテスト"""
+        client = RekordboxClient(db_path=synthetic_db, unlock=False)
+        try:
+            assert client.connect()
+            statements = []
+
+            def record(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(client.db.engine, "before_cursor_execute", record)
+            assert client.get_current_track()["key"] == "Am"
+            touch_track('1')
+            assert client.get_current_track()["key_camelot"] == "8B"
+            event.remove(client.db.engine, "before_cursor_execute", record)
+            assert len([st for st in statements if 'FROM "djmdKey"' in st and 'count(' not in st]) == 1
+
+            # キーの名前が変更されれば読み込み直す
+            conn = sqlite3.connect(synthetic_db)
+            conn.execute("UPDATE djmdKey SET ScaleName = 'Cm', rb_local_usn = 1000 WHERE ID = '1'")
+            conn.commit()
+            conn.close()
+            touch_track('1', minutes=2)
+            track = client.get_current_track()
+            assert (track.key, track.key_camelot, track.key_open) == ("Cm", "5A", "10m")
+        finally:
+            client.close()
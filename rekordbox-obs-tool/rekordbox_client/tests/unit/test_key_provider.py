@@ -0,0 +1,123 @@
+import json
+import os
+import stat
+import sys
+import pytest
+from rekordbox_client import key_provider
+from rekordbox_client.key_provider import DatabaseKeyProvider, derive_raw_key, read_salt
+from rekordbox_client.rekordbox_client import RekordboxClient
+from benchmarks.synthetic_db import SYNTHETIC_KEY, create_synthetic_database
+
+@pytest.fixture(scope="module")
+def encrypted_db(tmp_path_factory):
+    pytest.importorskip("sqlcipher3")
+    return create_synthetic_database(
+        str(tmp_path_factory.mktemp("encrypted") / "master.db"), num_tracks=20,
+        history_sessions=1, key=SYNTHETIC_KEY
+    )
+
+class CountingDiscovery:
+    def __init__(self, key=SYNTHETIC_KEY):
+        self.key = key
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.key
+
+class TestDatabaseKeyProvider:
+    def test_unencrypted_database(self, synthetic_db, tmp_path):
+        """暗号化されていないデータベースではキーを取得しないことのテスト"""
+        discover = CountingDiscovery()
+        provider = DatabaseKeyProvider(str(tmp_path / "keys.json"), discover=discover)
+        assert provider.resolve(synthetic_db) is None
+        assert discover.calls == 0
+
+    def test_discovers_once_and_caches(self, encrypted_db, tmp_path):
+        """キーの取得と導出は一度だけで、以降はキャッシュファイルから読むことのテスト"""
+        cache_path = str(tmp_path / "cache" / "keys.json")
+        discover = CountingDiscovery()
+        resolved = DatabaseKeyProvider(cache_path, discover=discover, persist=True).resolve(encrypted_db)
+        assert resolved.key == SYNTHETIC_KEY
+        assert resolved.raw_key == derive_raw_key(SYNTHETIC_KEY, read_salt(encrypted_db))
+
+        # 別のインスタンス（次回の起動）でも取得しない
+        provider = DatabaseKeyProvider(cache_path, discover=discover, persist=True)
+        assert provider.resolve(encrypted_db) == resolved
+        assert discover.calls == 1
+        assert provider.stats == {'hits': 1, 'misses': 0, 'discoveries': 0}
+        if sys.platform != 'win32':
+            assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+            assert stat.S_IMODE(os.stat(os.path.dirname(cache_path)).st_mode) == 0o700
+
+    def test_rederives_when_header_changes(self, encrypted_db, tmp_path):
+        """ヘッダー（ソルト）が変わった場合はキャッシュのキーから導出し直すことのテスト"""
+        cache_path = str(tmp_path / "keys.json")
+        discover = CountingDiscovery()
+        DatabaseKeyProvider(cache_path, discover=discover, persist=True).resolve(encrypted_db)
+        with open(cache_path, encoding='utf-8') as f:
+            entries = json.load(f)
+        entries[os.path.abspath(encrypted_db)]['fingerprint'] = 'stale'
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+
+        provider = DatabaseKeyProvider(cache_path, discover=discover, persist=True)
+        assert provider.resolve(encrypted_db).key == SYNTHETIC_KEY
+        assert provider.stats['misses'] == 1
+        assert discover.calls == 1
+
+    def test_memory_only_by_default(self, encrypted_db, tmp_path):
+        """persistを指定しなければキーをファイルに保存しないことのテスト"""
+        cache_path = tmp_path / "keys.json"
+        discover = CountingDiscovery()
+        provider = DatabaseKeyProvider(str(cache_path), discover=discover)
+        assert provider.resolve(encrypted_db) == provider.resolve(encrypted_db)
+        assert discover.calls == 1
+        assert not cache_path.exists()
+
+    def test_protected_secrets(self, encrypted_db, tmp_path, monkeypatch):
+        """保護できる場合はキーと暗号鍵を平文でファイルに書かないことのテスト"""
+        monkeypatch.setattr(key_provider, 'SECRET_PROTECTION', 'dpapi')
+        monkeypatch.setattr(key_provider, '_dpapi', lambda data, protect: data[::-1])
+        cache_path = tmp_path / "keys.json"
+        discover = CountingDiscovery()
+        resolved = DatabaseKeyProvider(str(cache_path), discover=discover, persist=True).resolve(encrypted_db)
+        stored = cache_path.read_text(encoding='utf-8')
+        assert SYNTHETIC_KEY not in stored and resolved.raw_key not in stored
+        assert json.loads(stored)[os.path.abspath(encrypted_db)]['protection'] == 'dpapi'
+
+        provider = DatabaseKeyProvider(str(cache_path), discover=discover, persist=True)
+        assert provider.resolve(encrypted_db) == resolved
+        assert discover.calls == 1
+
+class TestClientWithKeyProvider:
+    def test_cached_connect_skips_key_derivation(self, encrypted_db, tmp_path):
+        """キャッシュした暗号鍵での接続が速く、同じ結果を返すことのテスト"""
+        provider = DatabaseKeyProvider(str(tmp_path / "keys.json"), discover=CountingDiscovery())
+        provider.resolve(encrypted_db)
+
+        plain = RekordboxClient(db_path=encrypted_db, key=SYNTHETIC_KEY)
+        cached = RekordboxClient(db_path=encrypted_db, key_provider=provider)
+        try:
+            assert plain.connect() and cached.connect()
+            assert cached.get_current_track() == plain.get_current_track()
+            assert (cached.connection_stats['last_duration']
+                    < plain.connection_stats['last_duration'] / 5)
+        finally:
+            plain.close()
+            cached.close()
+
+    def test_invalid_cached_key_is_discarded(self, encrypted_db, tmp_path):
+        """キャッシュの暗号鍵で開けなければ破棄し、次の接続で取得し直すことのテスト"""
+        discover = CountingDiscovery()
+        provider = DatabaseKeyProvider(str(tmp_path / "keys.json"), discover=discover)
+        provider.resolve(encrypted_db)
+        provider._entries[os.path.abspath(encrypted_db)]['raw_key'] = "x'" + "00" * 32 + "'"
+
+        client = RekordboxClient(db_path=encrypted_db, key_provider=provider)
+        try:
+            assert not client.connect()
+            assert client.connect()
+            assert discover.calls == 2
+        finally:
+            client.close()
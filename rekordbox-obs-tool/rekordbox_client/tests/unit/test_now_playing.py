@@ -0,0 +1,190 @@
+import threading
+import time
+import pytest
+from rekordbox_client.db_watcher import DatabaseWatcher
+from rekordbox_client.event_bus import EventBus
+from rekordbox_client.now_playing import NowPlayingMonitor, SessionEnded, TrackChanged, TrackStarted
+from rekordbox_client.rekordbox_client import RekordboxClient
+
+class TestEventBus:
+    def test_slow_subscriber_does_not_block(self):
+        """遅い購読者がいても配信元と他の購読者が止まらないことのテスト"""
+        bus = EventBus(maxsize=5)
+        release = threading.Event()
+        received = []
+        all_received = threading.Event()
+
+        def slow(event):
+            release.wait(5)
+
+        def fast(event):
+            received.append(event)
+            if len(received) == 100:
+                all_received.set()
+
+        bus.subscribe(slow)
+        bus.subscribe(fast, maxsize=200)
+        start = time.perf_counter()
+        for i in range(100):
+            bus.publish(i)
+        assert time.perf_counter() - start < 0.5
+
+        assert all_received.wait(5)
+        assert received == list(range(100))
+        stats = {s['subscriber']: s for s in bus.stats}
+        assert stats['slow']['dropped'] > 0
+        release.set()
+        bus.close()
+
+    def test_event_type_filter_and_unsubscribe(self):
+        """イベントの型による絞り込みと購読解除のテスト"""
+        bus = EventBus()
+        received = []
+        done = threading.Event()
+
+        def on_text(event):
+            received.append(event)
+            done.set()
+
+        unsubscribe = bus.subscribe(on_text, event_types=(str,))
+        bus.publish(1)
+        bus.publish("a")
+        assert done.wait(5)
+        unsubscribe()
+        bus.publish("b")
+        assert received == ["a"]
+        assert bus.stats == []
+        bus.close()
+
+class TestNowPlayingMonitor:
+    @pytest.fixture
+    def client(self, history_db):
+        client = RekordboxClient(db_path=history_db, unlock=False)
+        yield client
+        client.close()
+
+    def test_poll_events(self, client, play_track):
+        """曲の検出・変化のイベントのテスト"""
+        monitor = NowPlayingMonitor(client)
+        try:
+            started = monitor.poll_once()
+            assert isinstance(started, TrackStarted)
+            assert monitor.poll_once() is None
+
+            play_track('7')
+            changed = monitor.poll_once()
+            assert isinstance(changed, TrackChanged)
+            assert changed.track.title == "Track 7"
+            assert changed.previous == started.track
+            assert monitor.current_track == changed.track
+        finally:
+            monitor.stop()
+
+    def test_session_ended(self, client, play_track):
+        """一定時間曲が変わらなければセッションが終了することのテスト"""
+        monitor = NowPlayingMonitor(client, session_timeout=0.05)
+        try:
+            last = monitor.poll_once().track
+            time.sleep(0.06)
+            ended = monitor.poll_once()
+            assert isinstance(ended, SessionEnded)
+            assert ended.last_track == last
+            assert monitor.current_track is None
+
+            # 同じ曲のままでは新しいセッションは始まらない
+            assert monitor.poll_once() is None
+
+            play_track('9')
+            assert isinstance(monitor.poll_once(), TrackStarted)
+        finally:
+            monitor.stop()
+
+    def test_background_monitor(self, client, play_track):
+        """バックグラウンドのスレッドで変化を検出して購読者に届けることのテスト"""
+        monitor = NowPlayingMonitor(client, interval=0.02)
+        events = []
+        changed = threading.Event()
+
+        def on_event(event):
+            events.append(event)
+            if isinstance(event, TrackChanged):
+                changed.set()
+
+        monitor.subscribe(on_event)
+        monitor.start()
+        try:
+            time.sleep(0.1)
+            play_track('11')
+            assert changed.wait(5)
+        finally:
+            monitor.stop()
+        assert not monitor.is_running
+        assert isinstance(events[0], TrackStarted)
+        assert events[-1].track.title == "Track 11"
+
+    def test_watcher_queries_only_on_change(self, client, play_track):
+        """watcherがあればファイルが変更されたときだけ問い合わせることのテスト"""
+        class FakeWatcher:
+            def __init__(self):
+                self.changed = threading.Event()
+
+            def wait_for_change(self, timeout=None, stop_event=None):
+                changed = self.changed.wait(timeout)
+                self.changed.clear()
+                return changed
+
+        watcher = FakeWatcher()
+        monitor = NowPlayingMonitor(client, interval=0.01, watcher=watcher)
+        queries = []
+        original = client.get_current_track
+
+        def get_current_track():
+            queries.append(time.monotonic())
+            return original()
+
+        client.get_current_track = get_current_track
+        changed = threading.Event()
+        monitor.subscribe(lambda event: changed.set(), (TrackChanged,))
+        monitor.start()
+        try:
+            time.sleep(0.2)
+            # 変更がなければ最初の1回しか問い合わせない
+            assert len(queries) == 1
+            play_track('12')
+            watcher.changed.set()
+            assert changed.wait(5)
+            assert len(queries) == 2
+        finally:
+            monitor.stop()
+
+    def test_watcher_safety_interval(self, client):
+        """変更が検知されなくてもsafety_intervalごとに問い合わせることのテスト"""
+        class IdleWatcher:
+            def wait_for_change(self, timeout=None, stop_event=None):
+                stop_event.wait(timeout)
+                return False
+
+        monitor = NowPlayingMonitor(client, interval=0.01, watcher=IdleWatcher(), safety_interval=0.05)
+        queries = []
+        original = client.get_current_track
+        client.get_current_track = lambda: queries.append(1) or original()
+        monitor.start()
+        try:
+            time.sleep(0.3)
+        finally:
+            monitor.stop()
+        assert 2 <= len(queries) <= 10
+
+    def test_stop_interrupts_watcher(self, client, history_db):
+        """watcherで待っている間でもstop()がすぐに戻ることのテスト"""
+        watcher = DatabaseWatcher(history_db, debounce=0.05)
+        monitor = NowPlayingMonitor(client, interval=60, watcher=watcher)
+        monitor.start()
+        try:
+            time.sleep(0.1)
+        finally:
+            start = time.monotonic()
+            monitor.stop()
+            watcher.close()
+        assert time.monotonic() - start < 1
+        assert not monitor.is_running
@@ -0,0 +1,98 @@
+import random
+import pytest
+from rekordbox_client.now_playing import NowPlayingMonitor
+from rekordbox_client.poll_scheduler import AdaptivePollScheduler
+from rekordbox_client.rekordbox_client import RekordboxClient
+from rekordbox_client.track_info import TrackInfo
+
+def make_track(duration):
+    return TrackInfo('1', None, duration=duration)
+
+class TestAdaptivePollScheduler:
+    def test_interval_follows_track_position(self):
+        """曲の途中では長く、切り替え予想時刻の付近では短くなることのテスト"""
+        scheduler = AdaptivePollScheduler()
+        assert scheduler.next_interval(0.0) == scheduler.default_interval
+
+        scheduler.track_started(make_track(300), now=0.0)
+        start, end = scheduler.expected_window()
+        assert start < 0.85 * 300 < end
+        assert scheduler.next_interval(10.0) == scheduler.max_interval
+        assert scheduler.next_interval(start - 4) == pytest.approx(2.0)
+        assert scheduler.next_interval(0.85 * 300) == scheduler.min_interval
+        # 予想範囲を過ぎると再び間隔を延ばす
+        assert scheduler.next_interval(end + 10) == pytest.approx(5.0)
+        assert scheduler.next_interval(end + scheduler.idle_after) == scheduler.idle_interval
+        assert scheduler.current_interval == scheduler.idle_interval
+        assert scheduler.stats['polls'] == 6
+
+    def test_unknown_duration(self):
+        """曲の長さが分からない場合は既定の間隔になることのテスト"""
+        scheduler = AdaptivePollScheduler(default_interval=2.0)
+        scheduler.track_started(make_track(0), now=0.0)
+        assert scheduler.expected_window() is None
+        assert scheduler.next_interval(100.0) == 2.0
+
+    def test_backs_off_without_track(self):
+        """曲がない間はidle_intervalまで間隔を延ばし、曲を検出したら戻ることのテスト"""
+        scheduler = AdaptivePollScheduler(default_interval=1.0, idle_interval=30.0, idle_after=600.0)
+        assert scheduler.next_interval(0.0) == 1.0
+        assert scheduler.next_interval(300.0) == pytest.approx(15.5)
+        assert scheduler.next_interval(900.0) == 30.0
+
+        scheduler.track_started(make_track(0), now=1000.0)
+        assert scheduler.next_interval(2000.0) == 1.0
+        # 曲がなくなった時刻から延ばし直す
+        scheduler.track_started(None, now=2000.0)
+        assert scheduler.next_interval(2000.0) == 1.0
+        assert scheduler.next_interval(2600.0) == 30.0
+
+    def test_learns_mix_out_point(self):
+        """実際の切り替え位置を学習し、外れ値は無視することのテスト"""
+        scheduler = AdaptivePollScheduler(mix_out_ratio=0.85, learning_rate=0.5)
+        scheduler.track_started(make_track(200), now=0.0)
+        scheduler.track_started(make_track(200), now=150.0)
+        assert scheduler.mix_out_ratio == pytest.approx(0.8)
+        # 曲の途中で止めた場合は学習しない
+        scheduler.track_started(make_track(200), now=160.0)
+        assert scheduler.mix_out_ratio == pytest.approx(0.8)
+
+    def test_fewer_polls_and_faster_detection_than_fixed_interval(self):
+        """一定間隔（1秒）より問い合わせが大幅に少なく、検出の遅れも小さいことのテスト"""
+        rng = random.Random(1)
+        scheduler = AdaptivePollScheduler()
+        now, polls, fixed_polls, delays = 0.0, 0, 0, []
+        duration = rng.uniform(240, 420)
+        scheduler.track_started(make_track(duration), now=now)
+        start = now
+        for _ in range(40):
+            change = start + duration * rng.gauss(0.85, 0.01)
+            fixed_polls += int(change - start) + 1
+            while now < change:
+                now += scheduler.next_interval(now)
+                polls += 1
+            delays.append(now - change)
+            duration = rng.uniform(240, 420)
+            scheduler.track_started(make_track(duration), now=now)
+            start = change
+
+        assert fixed_polls / polls >= 8
+        # 一定間隔での検出の遅れは平均で間隔の半分
+        assert sum(delays) / len(delays) < 0.5
+
+class TestMonitorWithScheduler:
+    def test_monitor_reports_scheduler_interval(self, history_db, play_track):
+        """NowPlayingMonitorが曲の検出をスケジューラに伝えることのテスト"""
+        client = RekordboxClient(db_path=history_db, unlock=False)
+        scheduler = AdaptivePollScheduler()
+        monitor = NowPlayingMonitor(client, scheduler=scheduler)
+        try:
+            assert monitor.current_interval == scheduler.default_interval
+            monitor.poll_once()
+            assert scheduler.expected_window() is not None
+            monitor._stop_event.set()
+            monitor._wait()
+            assert monitor.current_interval == scheduler.max_interval
+        finally:
+            monitor.stop()
+            client.close()
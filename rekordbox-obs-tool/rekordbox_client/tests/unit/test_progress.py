@@ -0,0 +1,83 @@
+import threading
+import time
+from rekordbox_client.now_playing import SessionEnded, TrackChanged
+from rekordbox_client.progress import NowPlayingText
+from rekordbox_client.track_info import TrackInfo
+
+def make_track(duration=200):
+    return TrackInfo('1', None, title="Track 1", artist="Artist", duration=duration)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class TestNowPlayingText:
+    def test_elapsed_and_remaining(self):
+        """検出した時刻と曲の長さから経過時間・残り時間を計算することのテスト"""
+        clock = FakeClock()
+        display = NowPlayingText("{title} {elapsed}/{remaining}", clock=clock)
+        assert display.render() == ''
+
+        display.set_track(make_track(200))
+        assert display.render() == "Track 1 00:00:00/00:03:20"
+        clock.now += 65.4
+        assert display.render() == "Track 1 00:01:05/00:02:15"
+        # 最後の1秒の間は残り時間を0:00にしない
+        clock.now += 134.2
+        assert display.render() == "Track 1 00:03:19/00:00:01"
+        # 曲の長さを過ぎても経過時間は曲の長さで止まる
+        clock.now += 1000
+        assert display.render() == "Track 1 00:03:20/00:00:00"
+
+    def test_tick_pushes_only_changes(self):
+        """表示が変わったときだけon_changeが呼ばれることのテスト"""
+        clock = FakeClock()
+        pushed = []
+        display = NowPlayingText("{title} {elapsed}", on_change=pushed.append, clock=clock)
+        display.set_track(make_track())
+        assert display.tick() == "Track 1 00:00:00"
+        clock.now += 0.5
+        assert display.tick() is None
+        clock.now += 0.6
+        assert display.tick() == "Track 1 00:00:01"
+        assert pushed == ["Track 1 00:00:00", "Track 1 00:00:01"]
+
+    def test_invalid_format_falls_back_to_title(self):
+        """表示フォーマットに存在しない項目があればタイトルを表示することのテスト"""
+        display = NowPlayingText("{title} {unknown}", clock=FakeClock())
+        display.set_track(make_track())
+        assert display.render() == "Track 1"
+
+    def test_monitor_events(self):
+        """NowPlayingMonitorのイベントで曲を切り替えることのテスト"""
+        clock = FakeClock()
+        display = NowPlayingText("{title} {elapsed}", clock=clock)
+        track = make_track()
+        # 配信が2秒遅れた場合は、検出した時刻から数える
+        display.on_event(TrackChanged(track, make_track(), time.time() - 2))
+        assert display.track == track
+        assert display.render() == "Track 1 00:00:02"
+        display.on_event(SessionEnded(track, time.time()))
+        assert display.track is None
+
+    def test_background_tick(self):
+        """バックグラウンドのスレッドでデータベースを使わずに表示を更新することのテスト"""
+        pushed = []
+        updated = threading.Event()
+
+        def on_change(text):
+            pushed.append(text)
+            if len(pushed) == 2:
+                updated.set()
+
+        display = NowPlayingText("{elapsed}", on_change=on_change)
+        display.set_track(make_track(), started_at=time.monotonic() - 0.9)
+        display.start()
+        try:
+            assert updated.wait(5)
+        finally:
+            display.stop()
+        assert pushed[:2] == ["00:00:00", "00:00:01"]
@@ -1,22 +1,27 @@
+import os
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime
 from unittest.mock import Mock, patch
+from pyrekordbox.db6 import Rekordbox6Database
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
 from rekordbox_client.rekordbox_client import RekordboxClient
+from benchmarks.synthetic_db import create_synthetic_database
 
 class TestRekordboxClient:
     @pytest.fixture
     def mock_track(self):
         track = Mock()
         track.Title = "Test Track"
-        track.Artist = Mock(Name="Test Artist")
-        track.Album = Mock(Name="Test Album")
-        track.Genre = Mock(Name="Test Genre")
+        track.ArtistName = "Test Artist"
+        track.AlbumName = "Test Album"
+        track.GenreName = "Test Genre"
         track.BPM = 12800  # 128.00 BPM
-        track.Key = "Name=Cm"
+        track.KeyName = "Cm"
         track.Rating = 5
-        track.Comment = "Test Comment"
-        track.Duration = 180
-        track.Path = "/path/to/track"
+        track.Commnt = "Test Comment"
+        track.Length = 180
+        track.FolderPath = "/path/to/track"
         track.DJPlayCount = 10
         track.updated_at = datetime.now()
         return track
@@ -25,88 +30,231 @@ class TestRekordboxClient:
     def client(self):
         return RekordboxClient()
 
-    def test_get_current_track_basic(self, client, mock_track):
-        # モックデータベースの設定
-        mock_db = Mock()
-        mock_db.get_content.return_value = [mock_track]
-        client.db = mock_db
+    @pytest.fixture
+    def db_client(self, synthetic_db):
+        client = RekordboxClient(db_path=synthetic_db, unlock=False)
+        yield client
+        client.close()
 
+    def test_get_current_track_basic(self, db_client):
         # テスト実行
-        result = client.get_current_track()
+        result = db_client.get_current_track()
 
-        # 結果の検証
+        # 結果の検証（最後に更新された曲が選択されることを確認）
         assert result is not None
-        assert result["title"] == "Test Track"
-        assert result["artist"] == "Test Artist"
-        assert result["bpm"] == 128.00
-        assert result["key"] == "Cm"
-        assert result["play_count"] == 10
-
-    def test_get_current_track_multiple_tracks(self, client, mock_track):
-        # 複数の曲を用意（異なる更新時刻）
-        older_track = Mock()
-        older_track.Title = "Old Track"
-        older_track.Artist = Mock(Name="Old Artist")
-        older_track.updated_at = datetime.now() - timedelta(minutes=30)
+        assert result["title"] == "Track 50"
+        assert result["artist"] == "Artist 5"
+        assert result["album"] == "Album 2"
+        assert result["genre"] == "Techno"
+        assert result["key"] == "Am"
+        assert result["bpm"] == 124.9
+        assert result["duration"] == 229
+        assert db_client.database_path == db_client.db_path
 
-        newer_track = Mock()
-        newer_track.Title = "New Track"
-        newer_track.Artist = Mock(Name="New Artist")
-        newer_track.updated_at = datetime.now()
+    def test_get_current_track_multiple_tracks(self, db_client, touch_track):
+        db_client.get_current_track()
 
-        # モックデータベースの設定
-        mock_db = Mock()
-        mock_db.get_content.return_value = [older_track, newer_track]
-        client.db = mock_db
+        # 古い曲をrekordbox側で更新したことにする
+        touch_track('10')
 
         # テスト実行
-        result = client.get_current_track()
+        result = db_client.get_current_track()
 
         # 結果の検証（最新の曲が選択されることを確認）
         assert result is not None
-        assert result["title"] == "New Track"
-        assert result["artist"] == "New Artist"
-
-    def test_get_current_track_cache_behavior(self, client, mock_track):
-        # モックデータベースの設定
-        mock_db = Mock()
-        mock_db.get_content.return_value = [mock_track]
-        client.db = mock_db
+        assert result["title"] == "Track 10"
 
+    def test_get_current_track_cache_behavior(self, db_client, touch_track):
         # 1回目の呼び出し
-        result1 = client.get_current_track()
+        result1 = db_client.get_current_track()
         assert result1 is not None
-        assert result1["title"] == "Test Track"
+        assert result1["title"] == "Track 50"
 
-        # 同じ曲で2回目の呼び出し
-        result2 = client.get_current_track()
-        assert result2 is not None
-        assert result2["title"] == "Test Track"
-        assert result1 == result2  # キャッシュが使用されていることを確認
+        # 更新がない状態で2回目の呼び出し
+        with patch.object(db_client, '_format_track_info') as format_track:
+            result2 = db_client.get_current_track()
+        assert result2 is result1  # キャッシュが使用されていることを確認
+        format_track.assert_not_called()
 
-        # 異なる曲での呼び出し
-        new_track = mock_track
-        new_track.Title = "New Track"
-        new_track.updated_at = datetime.now()
-        mock_db.get_content.return_value = [new_track]
+        # 異なる曲が更新された状態での呼び出し
+        touch_track('1', Title='New Track')
 
-        result3 = client.get_current_track()
+        result3 = db_client.get_current_track()
         assert result3 is not None
         assert result3["title"] == "New Track"
         assert result1 != result3  # 新しい曲情報が取得されていることを確認
 
+    def test_get_current_track_detects_replay(self, db_client, touch_track):
+        """同じ曲の再生し直しや同名の別曲を検出することのテスト"""
+        result1 = db_client.get_current_track()
+
+        # 同じ曲が再び更新された場合
+        touch_track('50', minutes=1)
+        result2 = db_client.get_current_track()
+        assert result2.title == result1.title
+        assert result2 != result1
+
+        # 同じタイトルを持つ別の曲の場合
+        touch_track('49', minutes=2, Title='Track 50')
+        result3 = db_client.get_current_track()
+        assert result3.title == result1.title
+        assert result3.content_id == '49'
+        assert result3 != result2
+
+    def test_get_current_track_queries_only_latest_rows(self, db_client, touch_track):
+        """ポーリングで最新の行だけを問い合わせることのテスト"""
+        assert db_client.connect()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db_client.db.engine, "before_cursor_execute", record)
+        try:
+            db_client.get_current_track()
+            assert any("ORDER BY" in st and "LIMIT" in st for st, _ in statements)
+
+            # 更新がなければrb_local_usnの最大値（再生履歴と曲）を確認するだけで済む
+            statements.clear()
+            db_client.get_current_track()
+            assert len(statements) == 2
+            assert all("max(" in st for st, _ in statements)
+
+            # 更新があればハイウォーターマークより新しい行だけが対象になる
+            touch_track('5')
+            statements.clear()
+            assert db_client.get_current_track()["title"] == "Track 5"
+        finally:
+            event.remove(db_client.db.engine, "before_cursor_execute", record)
+
+        content_queries = [(st, p) for st, p in statements if 'FROM "djmdContent"' in st]
+        statement, parameters = content_queries[-1]
+        assert "rb_local_usn >" in statement and "LIMIT" in statement
+        assert 50 in parameters
+
+    def test_format_track_info(self, client, mock_track):
+        """曲情報フォーマットのテスト"""
+        result = client._format_track_info(mock_track)
+        assert result["title"] == "Test Track"
+        assert result["artist"] == "Test Artist"
+        assert result["album"] == "Test Album"
+        assert result["bpm"] == 128.00
+        assert result["key"] == "Cm"
+        assert result["comment"] == "Test Comment"
+        assert result["duration"] == 180
+        assert result["play_count"] == 10
+
+    def test_get_history_single_round_trip(self, db_client):
+        """履歴の取得と整形が1回の問い合わせで済むことのテスト"""
+        assert db_client.connect()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db_client.db.engine, "before_cursor_execute", record)
+        try:
+            history = db_client.get_history(limit=20)
+        finally:
+            event.remove(db_client.db.engine, "before_cursor_execute", record)
+
+        assert len(history) == 20
+        assert all(track["artist"] and track["key"] for track in history)
+        assert len([st for st in statements if 'FROM "djmdContent"' in st]) == 1
+
+    def test_get_history(self, db_client):
+        """履歴取得のテスト"""
+        history = db_client.get_history(limit=5)
+        assert [track["title"] for track in history] == [f"Track {i}" for i in range(50, 45, -1)]
+
+        # 期間外の曲は含まれない
+        history = db_client.get_history(limit=100, days=0)
+        assert history == []
+
     def test_database_connection(self, client):
         """データベース接続のテスト"""
         # 正常な接続
         mock_db = Mock()
-        with patch('rekordbox_client.rekordbox_client.Rekordbox6Database', return_value=mock_db):
+        with patch('rekordbox_client.queries.Rekordbox6Database', return_value=mock_db):
             assert client.connect() is True
 
         # 接続エラー
-        with patch('rekordbox_client.rekordbox_client.Rekordbox6Database', side_effect=Exception("Connection failed")):
+        with patch('rekordbox_client.queries.Rekordbox6Database', side_effect=Exception("Connection failed")):
             assert client.connect() is False
 
-    def test_get_current_track_error_cases(self, client):
+    def test_connection_is_reused(self, db_client, touch_track):
+        """ポーリングのたびに接続し直さないことのテスト"""
+        with patch('rekordbox_client.queries.Rekordbox6Database',
+                   wraps=Rekordbox6Database) as open_db:
+            db_client.get_current_track()
+            touch_track('3')
+            assert db_client.get_current_track()["title"] == "Track 3"
+            db_client.get_history(limit=5)
+        assert open_db.call_count == 1
+        assert db_client.is_alive()
+
+        stats = db_client.connection_stats
+        assert stats['attempts'] == 1 and stats['failures'] == 0
+        assert stats['connected'] is True
+        assert stats['last_duration'] > 0
+
+    def test_reconnect_backoff(self, tmp_path):
+        """接続失敗後は待ち時間を倍にしながら再接続することのテスト"""
+        client = RekordboxClient(db_path=str(tmp_path / "missing.db"), unlock=False)
+        with patch('rekordbox_client.rekordbox_client.time.monotonic', return_value=100.0):
+            assert client.get_current_track() is None
+            assert client.connection_stats['reconnect_delay'] == client.RECONNECT_BASE_DELAY
+
+            # バックオフ期間中は接続を試みない
+            with patch.object(client, 'connect') as connect:
+                assert client.get_current_track() is None
+            connect.assert_not_called()
+
+        delays = []
+        for now in (101.0, 103.0, 107.0, 115.0, 131.0, 200.0, 300.0):
+            with patch('rekordbox_client.rekordbox_client.time.monotonic', return_value=now):
+                client.get_current_track()
+            delays.append(client.connection_stats['reconnect_delay'])
+        assert delays == [2.0, 4.0, 8.0, 16.0, 30.0, 30.0, 30.0]
+        assert client.connection_stats['failures'] == 8
+
+        # 接続できればバックオフはリセットされる
+        client.db_path = create_synthetic_database(str(tmp_path / "missing.db"), num_tracks=3)
+        with patch('rekordbox_client.rekordbox_client.time.monotonic', return_value=400.0):
+            assert client.get_current_track()["title"] == "Track 3"
+        assert client.connection_stats['reconnect_delay'] == 0.0
+        client.close()
+
+    def test_reconnect_after_connection_error(self, db_client):
+        """接続のエラー時は最後の曲情報を返し、後で再接続することのテスト"""
+        last_track = db_client.get_current_track()
+        assert last_track is not None
+
+        with patch.object(db_client, '_max_local_usn',
+                          side_effect=OperationalError("SELECT", {}, Exception("disk I/O error"))):
+            assert db_client.get_current_track() is last_track
+        assert db_client.db is None
+
+        # バックオフ期間が過ぎれば再接続して取得を再開する
+        db_client._next_connect_time = 0.0
+        assert db_client.get_current_track() is last_track
+        assert db_client.db is not None
+        assert db_client.connection_stats['attempts'] == 2
+
+    def test_reconnect_when_database_file_replaced(self, db_client, synthetic_db):
+        """master.dbが置き換えられたら開き直すことのテスト"""
+        db_client.get_current_track()
+        old_db = db_client.db
+
+        # rekordboxが新しいファイルを書き出して置き換えた場合
+        replacement = create_synthetic_database(synthetic_db + ".new", num_tracks=5)
+        os.replace(replacement, synthetic_db)
+        assert not db_client.is_alive()
+
+        assert db_client.get_current_track()["title"] == "Track 5"
+        assert db_client.db is not old_db
+
+    def test_get_current_track_error_cases(self, client, tmp_path):
         """エラーケースのテスト"""
         # データベース未接続の状態を作成
         client.db = None
@@ -114,13 +262,17 @@ class TestRekordboxClient:
             assert client.get_current_track() is None
 
         # 空のコンテンツ
-        mock_db = Mock()
-        mock_db.get_content.return_value = []
-        client.db = mock_db
-        assert client.get_current_track() is None
+        empty_client = RekordboxClient(
+            db_path=create_synthetic_database(str(tmp_path / "empty.db"), num_tracks=0),
+            unlock=False
+        )
+        assert empty_client.get_current_track() is None
+        empty_client.close()
 
         # データベースエラー
-        mock_db.get_content.side_effect = Exception("Database error")
+        mock_db = Mock()
+        client.db = mock_db
+        mock_db.query.side_effect = Exception("Database error")
         assert client.get_current_track() is None
 
     def test_format_track_info_error_cases(self, client):
@@ -128,15 +280,15 @@ class TestRekordboxClient:
         # 最小限の属性しか持たない曲
         minimal_track = Mock()
         minimal_track.Title = "Minimal Track"
-        minimal_track.Artist = None
-        minimal_track.Album = None
-        minimal_track.Genre = None
+        minimal_track.ArtistName = None
+        minimal_track.AlbumName = None
+        minimal_track.GenreName = None
         minimal_track.BPM = None
-        minimal_track.Key = None
+        minimal_track.KeyName = None
         minimal_track.Rating = None
-        minimal_track.Comment = None
-        minimal_track.Duration = None
-        minimal_track.Path = None
+        minimal_track.Commnt = None
+        minimal_track.Length = None
+        minimal_track.FolderPath = None
         minimal_track.DJPlayCount = None
         minimal_track.updated_at = None
         
@@ -152,14 +304,14 @@ class TestRekordboxClient:
         invalid_bpm_track = Mock()
         invalid_bpm_track.Title = "Invalid BPM Track"
         invalid_bpm_track.BPM = "invalid"
-        invalid_bpm_track.Artist = None
-        invalid_bpm_track.Album = None
-        invalid_bpm_track.Genre = None
-        invalid_bpm_track.Key = None
+        invalid_bpm_track.ArtistName = None
+        invalid_bpm_track.AlbumName = None
+        invalid_bpm_track.GenreName = None
+        invalid_bpm_track.KeyName = None
         invalid_bpm_track.Rating = None
-        invalid_bpm_track.Comment = None
-        invalid_bpm_track.Duration = None
-        invalid_bpm_track.Path = None
+        invalid_bpm_track.Commnt = None
+        invalid_bpm_track.Length = None
+        invalid_bpm_track.FolderPath = None
         invalid_bpm_track.DJPlayCount = None
         invalid_bpm_track.updated_at = None
         
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import time
+import pytest
+from rekordbox_client.rekordbox_client import RekordboxClient
+from rekordbox_client.snapshot import DatabaseSnapshot, read_wal
+from benchmarks.synthetic_db import SYNTHETIC_KEY, create_synthetic_database
+
+def _rows(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+@pytest.fixture
+def wal_db(history_db):
+    """WALモードに切り替え、rekordboxのように接続を開いたままにしたデータベース
+
+    最後の接続が閉じるとWALがmaster.dbに反映されるため、テストの間は接続を開いておく。
+    """
+    conn = sqlite3.connect(history_db)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    # 共有メモリを開くために一度読み取る
+    conn.execute("SELECT COUNT(*) FROM djmdContent").fetchall()
+    yield history_db
+    conn.close()
+
+class TestDatabaseSnapshot:
+    def test_copies_committed_wal_pages(self, wal_db, play_track, tmp_path):
+        """master.dbに反映される前のWALのページもコピーに含めることのテスト"""
+        play_track('7')
+        assert read_wal(wal_db + '-wal')[1]
+
+        snapshot = DatabaseSnapshot(wal_db, str(tmp_path / "snapshot" / "master.db"))
+        os.makedirs(os.path.dirname(snapshot.path))
+        assert snapshot.refresh()
+        sql = "SELECT ContentID FROM djmdSongHistory ORDER BY rb_local_usn DESC LIMIT 1"
+        assert _rows(snapshot.path, sql) == [('7',)]
+        # 変更がなければファイルを読まない
+        assert not snapshot.refresh()
+        assert snapshot.stats['refreshes'] == 1
+
+    def test_incremental_refresh(self, wal_db, play_track, tmp_path):
+        """変更のあったページだけを書き込むことのテスト"""
+        snapshot = DatabaseSnapshot(wal_db)
+        try:
+            snapshot.refresh()
+            total_pages = snapshot.stats['pages_written']
+            play_track('9')
+            assert snapshot.refresh()
+            written = snapshot.stats['pages_written'] - total_pages
+            assert 0 < written < total_pages / 4
+            assert _rows(snapshot.path, "SELECT COUNT(*) FROM djmdSongHistory") == \
+                _rows(wal_db, "SELECT COUNT(*) FROM djmdSongHistory")
+            assert _rows(snapshot.path, "PRAGMA integrity_check") == [('ok',)]
+        finally:
+            snapshot.close()
+        assert not os.path.exists(snapshot.path)
+
+    def test_compares_only_wal_pages_until_checkpoint(self, wal_db, play_track):
+        """本体が変わらなければWALのページだけを比較し、チェックポイントの後は全体を比較することのテスト"""
+        sql = "SELECT ContentID FROM djmdSongHistory ORDER BY rb_local_usn DESC LIMIT 1"
+        snapshot = DatabaseSnapshot(wal_db)
+        try:
+            play_track('3')
+            snapshot.refresh()
+            full_compares = snapshot.stats['full_compares']
+
+            for track_id in ('5', '7'):
+                play_track(track_id)
+                assert snapshot.refresh()
+                assert _rows(snapshot.path, sql) == [(track_id,)]
+            assert snapshot.stats['full_compares'] == full_compares
+
+            # チェックポイントでWALの内容が本体に移ると、全体を比較する
+            checkpoint = sqlite3.connect(wal_db)
+            checkpoint.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            checkpoint.close()
+            play_track('9')
+            assert snapshot.refresh()
+            assert snapshot.stats['full_compares'] == full_compares + 1
+            assert _rows(snapshot.path, sql) == [('9',)]
+            assert _rows(snapshot.path, "PRAGMA integrity_check") == [('ok',)]
+        finally:
+            snapshot.close()
+
+    def test_keeps_previous_copy_while_source_changes(self, history_db, monkeypatch):
+        """読み取り中にファイルが変わり続ける場合は以前のコピーを使うことのテスト"""
+        snapshot = DatabaseSnapshot(history_db)
+        try:
+            snapshot.refresh()
+            calls = iter(range(1000))
+            monkeypatch.setattr(snapshot, '_file_signature', lambda: (next(calls), None))
+            assert not snapshot.refresh()
+            assert snapshot.stats['unstable'] == 1
+        finally:
+            snapshot.close()
+
+class TestSnapshotClient:
+    def test_reads_while_rekordbox_holds_lock(self, history_db, play_track):
+        """rekordboxが書き込み中（排他ロック中）でも待たずに読めることのテスト"""
+        client = RekordboxClient(db_path=history_db, unlock=False, snapshot=True,
+                                 snapshot_refresh_interval=0)
+        try:
+            assert client.get_current_track() is not None
+            play_track('11')
+            assert client.get_current_track().title == "Track 11"
+
+            writer = sqlite3.connect(history_db, isolation_level=None)
+            writer.execute("BEGIN EXCLUSIVE")
+            try:
+                start = time.perf_counter()
+                track = client.get_current_track()
+                assert time.perf_counter() - start < 1.0
+                assert track.title == "Track 11"
+            finally:
+                writer.execute("ROLLBACK")
+                writer.close()
+            assert client.connection_stats['snapshot']['refreshes'] == 2
+        finally:
+            client.close()
+
+    def test_encrypted_database(self, tmp_path):
+        """SQLCipherで暗号化されたページを暗号化されたままコピーして読めることのテスト"""
+        pytest.importorskip("sqlcipher3")
+        db_path = create_synthetic_database(
+            str(tmp_path / "master.db"), num_tracks=20, history_sessions=1, key=SYNTHETIC_KEY
+        )
+        client = RekordboxClient(db_path=db_path, key=SYNTHETIC_KEY, snapshot=True)
+        try:
+            assert client.get_current_track() is not None
+            assert client.connection_stats['snapshot']['pages_written'] > 0
+        finally:
+            client.close()
+
+    def test_refresh_is_rate_limited(self, history_db, play_track):
+        """snapshot_refresh_intervalの間はコピーを更新せず、接続し直さないことのテスト"""
+        client = RekordboxClient(db_path=history_db, unlock=False, snapshot=True,
+                                 snapshot_refresh_interval=0.3)
+        try:
+            first = client.get_current_track()
+            for track_id in ('3', '5', '7'):
+                play_track(track_id)
+                assert client.get_current_track() == first
+            assert client.connection_stats['attempts'] == 1
+            time.sleep(0.3)
+            assert client.get_current_track().title == "Track 7"
+            assert client.connection_stats['attempts'] == 2
+        finally:
+            client.close()
+
+    def test_snapshot_update_keeps_watermarks(self, history_db, play_track, monkeypatch):
+        """コピーの更新で開き直してもウォーターマークとキーの索引を保持することのテスト"""
+        client = RekordboxClient(db_path=history_db, unlock=False, snapshot=True,
+                                 snapshot_refresh_interval=0)
+        try:
+            client.get_current_track()
+            play_usn = client._last_play_usn
+            assert play_usn is not None
+            invalidated = []
+            monkeypatch.setattr(client._keys, 'invalidate', lambda: invalidated.append(1))
+
+            play_track('13')
+            assert client.ensure_connected()
+            assert client.connection_stats['attempts'] == 2
+            assert client._last_play_usn == play_usn
+            assert invalidated == []
+            assert client.get_current_track().title == "Track 13"
+        finally:
+            client.close()
+
+    def test_encrypted_reconnect_reuses_derived_key(self, tmp_path, monkeypatch):
+        """コピーが更新されて接続し直すときは、キーからの鍵導出をやり直さないことのテスト"""
+        pytest.importorskip("sqlcipher3")
+        from rekordbox_client import key_provider
+        db_path = create_synthetic_database(
+            str(tmp_path / "master.db"), num_tracks=20, history_sessions=1, key=SYNTHETIC_KEY
+        )
+        derivations = []
+        derive = key_provider.derive_raw_key
+        monkeypatch.setattr(key_provider, 'derive_raw_key',
+                            lambda key, salt: derivations.append(key) or derive(key, salt))
+        client = RekordboxClient(db_path=db_path, key=SYNTHETIC_KEY, snapshot=True,
+                                 snapshot_refresh_interval=0)
+        try:
+            assert client.get_current_track() is not None
+            # コピーが変わったときと同じ手順（破棄して接続し直す）
+            assert client.connect()
+            assert client.connect()
+            assert client.get_current_track() is not None
+            assert client.connection_stats['attempts'] == 3
+            assert derivations == [SYNTHETIC_KEY]
+        finally:
+            client.close()
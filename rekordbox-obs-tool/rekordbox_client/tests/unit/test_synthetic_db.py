@@ -0,0 +1,60 @@
+import sqlite3
+import pytest
+from rekordbox_client.rekordbox_client import RekordboxClient
+from benchmarks.synthetic_db import SYNTHETIC_KEY, create_synthetic_database, main
+
+def _count(db_path, table):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+class TestSyntheticDatabase:
+    def test_row_counts(self, tmp_path):
+        """曲・関連テーブル・再生履歴の行数のテスト"""
+        db_path = create_synthetic_database(
+            str(tmp_path / "master.db"), num_tracks=120, history_sessions=4, tracks_per_session=15
+        )
+        assert _count(db_path, "djmdContent") == 120
+        assert _count(db_path, "djmdArtist") == 12
+        assert _count(db_path, "djmdAlbum") == 10
+        assert _count(db_path, "djmdKey") == 24
+        assert _count(db_path, "djmdHistory") == 4
+        assert _count(db_path, "djmdSongHistory") == 60
+
+        # rb_local_usnはテーブルをまたいで重複しない
+        conn = sqlite3.connect(db_path)
+        try:
+            usns = [row[0] for row in conn.execute(
+                "SELECT rb_local_usn FROM djmdContent UNION ALL SELECT rb_local_usn FROM djmdHistory "
+                "UNION ALL SELECT rb_local_usn FROM djmdSongHistory"
+            )]
+        finally:
+            conn.close()
+        assert len(usns) == len(set(usns))
+
+    def test_encrypted_database(self, tmp_path):
+        """SQLCipherで暗号化したデータベースをキーで開けることのテスト"""
+        pytest.importorskip("sqlcipher3")
+        db_path = create_synthetic_database(
+            str(tmp_path / "master.db"), num_tracks=20, history_sessions=1, key=SYNTHETIC_KEY
+        )
+
+        with pytest.raises(sqlite3.DatabaseError):
+            _count(db_path, "djmdContent")
+
+        client = RekordboxClient(db_path=db_path, key=SYNTHETIC_KEY)
+        try:
+            assert client.connect()
+            assert client.get_current_track() is not None
+        finally:
+            client.close()
+
+    def test_command_line(self, tmp_path, capsys):
+        """コマンドラインからの作成のテスト"""
+        db_path = str(tmp_path / "cli.db")
+        assert main([db_path, "30", "--sessions", "2", "--tracks-per-session", "5"]) == 0
+        assert _count(db_path, "djmdContent") == 30
+        assert _count(db_path, "djmdSongHistory") == 10
+        assert "Synthetic database created" in capsys.readouterr().out
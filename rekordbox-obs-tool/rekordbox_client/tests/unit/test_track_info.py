@@ -0,0 +1,56 @@
+import pickle
+from datetime import datetime, timedelta
+import pytest
+from rekordbox_client.track_info import TrackInfo
+
+class TestTrackInfo:
+    @pytest.fixture
+    def track(self):
+        return TrackInfo(
+            content_id="1", updated_at=datetime(2024, 1, 1, 12, 0, 0),
+            title="Test Track", artist="Test Artist", bpm=128.0, key="Cm", duration=180
+        )
+
+    def test_slots(self, track):
+        """__slots__によりインスタンス辞書を持たないことのテスト"""
+        assert not hasattr(track, '__dict__')
+        with pytest.raises(AttributeError):
+            track.unknown = 1
+
+    def test_equality_by_identity(self, track):
+        """IDとupdated_atで同一性を判定することのテスト"""
+        same = TrackInfo(content_id="1", updated_at=track.updated_at, title="Other Title")
+        replayed = TrackInfo(content_id="1", updated_at=track.updated_at + timedelta(minutes=5),
+                             title="Test Track")
+        same_title = TrackInfo(content_id="2", updated_at=track.updated_at, title="Test Track")
+
+        assert track == same
+        assert hash(track) == hash(same)
+        assert track != replayed
+        assert track != same_title
+        assert len({track, same, replayed, same_title}) == 3
+
+    def test_mapping_access(self, track):
+        """辞書形式での読み取りのテスト"""
+        assert track["title"] == "Test Track"
+        assert track.get("bpm") == 128.0
+        assert track.get("content_id") is None  # 表示用の項目以外は含まない
+        assert track.get("missing", "default") == "default"
+        with pytest.raises(KeyError):
+            track["missing"]
+        assert "{title} - {artist} ({bpm} BPM, Key: {key})".format_map(track) == \
+            "Test Track - Test Artist (128.0 BPM, Key: Cm)"
+
+    def test_to_dict(self, track):
+        """辞書への変換のテスト"""
+        data = track.to_dict()
+        assert list(data.keys()) == list(TrackInfo.FIELDS)
+        assert data["duration"] == 180
+        assert dict(track) == data
+
+    def test_pickle(self, track):
+        """別プロセスへの送信用のpickleのテスト"""
+        restored = pickle.loads(pickle.dumps(track))
+        assert restored == track
+        assert restored.to_dict() == track.to_dict()
+        assert b'title' not in pickle.dumps(track)
@@ -0,0 +1,159 @@
+import os
+import struct
+import zlib
+import numpy as np
+from rekordbox_client.device_library import DeviceLibraryClient
+from rekordbox_client.rekordbox_client import RekordboxClient
+from benchmarks.synthetic_db import analysis_data_path, create_synthetic_database
+from benchmarks.synthetic_pdb import create_synthetic_export
+from rekordbox_client.waveform import (
+    WaveformCache, analysis_version, encode_png, find_sections, read_preview, render_image,
+    resolve_analysis_path
+)
+
+def _section(tag, header, data):
+    return struct.pack('>4sII', tag, 12 + len(header), 12 + len(header) + len(data)) + header + data
+
+def _write_anlz(path, *sections):
+    """PMAIヘッダーとセクションからなる解析ファイルを書き込む"""
+    body = b''.join(sections)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('>4sIIIIII', b'PMAI', 28, 28 + len(body), 1, 0x10000, 0x10000, 0) + body)
+
+def write_analysis(dat_path, columns=400, color=False):
+    """波形プレビュー（PWAV）と、colorなら.EXTにカラー波形（PWV4）を持つ解析ファイルを作成する"""
+    preview = bytes((i % 32) | (i % 8) << 5 for i in range(columns))
+    _write_anlz(
+        dat_path,
+        _section(b'PPTH', struct.pack('>I', 4), b'\x00/\x00\x00'),
+        _section(b'PWAV', struct.pack('>II', len(preview), 0x10000), preview),
+    )
+    if color:
+        entries = bytes(b for i in range(1200) for b in (0, 127, 0, 100, 50, (i % 128)))
+        _write_anlz(
+            os.path.splitext(dat_path)[0] + '.EXT',
+            _section(b'PWV3', struct.pack('>III', 1, 4, 0x960000), b'\x00' * 4),
+            _section(b'PWV4', struct.pack('>III', 6, 1200, 0), entries),
+        )
+    return dat_path
+
+class TestAnalysisFile:
+    def test_find_sections(self, tmp_path):
+        """ANLZファイルのセクションの位置を求められることのテスト"""
+        path = write_analysis(str(tmp_path / "ANLZ0000.DAT"))
+        with open(path, 'rb') as f:
+            sections = find_sections(f.read())
+        assert list(sections) == ['PPTH', 'PWAV']
+        assert find_sections(b'not an analysis file') == {}
+
+    def test_blue_preview(self, tmp_path):
+        """.DATの波形プレビューの高さと白さを復号することのテスト"""
+        preview = read_preview(write_analysis(str(tmp_path / "ANLZ0000.DAT")))
+        assert preview.heights.shape == (400,)
+        assert preview.heights[31] == 1.0 and preview.heights[32] == 0.0
+        assert preview.colors.shape == (400, 3)
+        # 白さが大きいほど明るい
+        assert preview.colors[7].sum() > preview.colors[0].sum()
+
+    def test_color_preview_is_preferred(self, tmp_path):
+        """.EXTがあればカラー波形を使うことのテスト"""
+        preview = read_preview(write_analysis(str(tmp_path / "ANLZ0000.DAT"), color=True))
+        assert preview.heights.shape == (1200,)
+        assert tuple(preview.colors[0]) == (255, 127, 0)
+        assert preview.heights[127] == 1.0
+
+    def test_missing_file(self, tmp_path):
+        """解析ファイルがない場合はNoneを返すことのテスト"""
+        assert read_preview(str(tmp_path / "ANLZ0000.DAT")) is None
+
+class TestImage:
+    def test_render_is_bottom_aligned(self, tmp_path):
+        """波形を下揃えで描画し、波形のない部分を透明にすることのテスト"""
+        preview = read_preview(write_analysis(str(tmp_path / "ANLZ0000.DAT")))
+        image = render_image(preview, width=200, height=31)
+        assert image.shape == (31, 200, 4)
+        # 2列ずつまとめた最大の高さ（列15は高さ15/31）
+        alpha = image[:, 7, 3]
+        assert alpha[-15:].tolist() == [255] * 15 and alpha[:-15].tolist() == [0] * 16
+
+    def test_png(self):
+        """有効なPNGに変換できることのテスト"""
+        image = np.zeros((4, 3, 4), dtype=np.uint8)
+        image[1, 2] = (1, 2, 3, 255)
+        png = encode_png(image)
+        assert png.startswith(b'\x89PNG\r\n\x1a\n')
+        length, tag = struct.unpack_from('>I4s', png, 8)
+        assert tag == b'IHDR'
+        assert struct.unpack_from('>II', png, 16) == (3, 4)
+        assert struct.unpack_from('>I', png, 16 + length)[0] == zlib.crc32(png[12:16 + length])
+        idat = png.index(b'IDAT')
+        raw = zlib.decompress(png[idat + 4:idat + struct.unpack_from('>I', png, idat - 4)[0] + 4])
+        assert len(raw) == 4 * (1 + 3 * 4)
+        assert raw[1 * 13 + 1 + 2 * 4:1 * 13 + 1 + 3 * 4] == bytes((1, 2, 3, 255))
+
+class TestWaveformCache:
+    def test_renders_once_per_track(self, tmp_path):
+        """一度描画した曲は解析ファイルを読まずにキャッシュのパスを返すことのテスト"""
+        db_path = create_synthetic_database(str(tmp_path / "master.db"), num_tracks=5)
+        client = RekordboxClient(db_path=db_path, unlock=False)
+        try:
+            track = client.get_current_track()
+            analysis = resolve_analysis_path(client.analysis_root, track.analysis_path)
+            assert analysis == os.path.join(
+                str(tmp_path), 'share', *analysis_data_path(5).strip('/').split('/')
+            )
+            write_analysis(analysis)
+
+            cache = WaveformCache(str(tmp_path / "waveforms"), width=100, height=20)
+            path = cache.image_for(track, client.analysis_root)
+            assert path == cache.path_for('5', analysis_version(analysis))
+            with open(path, 'rb') as f:
+                assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+            assert cache.image_for(track, client.analysis_root) == path
+            assert cache.stats == {'hits': 1, 'renders': 1, 'missing': 0}
+        finally:
+            client.close()
+
+    def test_reanalysed_track_is_rendered_again(self, tmp_path):
+        """解析ファイルが更新されたら描画し直し、古い版の画像を削除することのテスト"""
+        db_path = create_synthetic_database(str(tmp_path / "master.db"), num_tracks=5)
+        client = RekordboxClient(db_path=db_path, unlock=False)
+        try:
+            track = client.get_current_track()
+            analysis = write_analysis(resolve_analysis_path(client.analysis_root, track.analysis_path))
+            cache = WaveformCache(str(tmp_path / "waveforms"), width=100, height=20)
+            old_path = cache.image_for(track, client.analysis_root)
+
+            # 解析し直してカラー波形（.EXT）が追加された
+            write_analysis(analysis, color=True)
+            new_path = cache.image_for(track, client.analysis_root)
+            assert new_path != old_path
+            assert os.listdir(str(tmp_path / "waveforms")) == [os.path.basename(new_path)]
+            assert cache.stats == {'hits': 0, 'renders': 2, 'missing': 0}
+
+            # 解析ファイルがなくなった場合は古い画像を返さない
+            os.remove(analysis)
+            os.remove(os.path.splitext(analysis)[0] + '.EXT')
+            assert analysis_version(analysis) is None
+            assert cache.image_for(track, client.analysis_root) is None
+            assert cache.stats['missing'] == 1
+        finally:
+            client.close()
+
+    def test_device_library_tracks(self, tmp_path):
+        """USBのエクスポートの曲もメディア上の解析ファイルから描画できることのテスト"""
+        create_synthetic_export(str(tmp_path / "PIONEER" / "rekordbox" / "export.pdb"), num_tracks=3)
+        for content_id in (1, 2):
+            write_analysis(resolve_analysis_path(str(tmp_path), analysis_data_path(content_id)),
+                           color=True)
+        client = DeviceLibraryClient(str(tmp_path))
+        try:
+            cache = WaveformCache(str(tmp_path / "waveforms"))
+            assert cache.warm(client.get_tracks([1, 2, 3]), client.analysis_root) == 2
+            assert cache.stats['missing'] == 1
+            analysis = resolve_analysis_path(str(tmp_path), analysis_data_path(2))
+            assert os.path.exists(cache.path_for('2', analysis_version(analysis)))
+        finally:
+            client.close()
@@ -0,0 +1,94 @@
+import os
+import signal
+import sys
+import time
+import pytest
+from rekordbox_client.key_provider import DatabaseKeyProvider
+from rekordbox_client.worker import MSG_HISTORY, WorkerRekordboxClient
+
+def _wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.02)
+    return None
+
+class TestWorkerRekordboxClient:
+    @pytest.fixture
+    def client(self, history_db):
+        client = WorkerRekordboxClient(
+            db_path=history_db, unlock=False, interval=0.05, heartbeat_timeout=2.0, restart_delay=0.05
+        )
+        yield client
+        client.close()
+
+    def test_track_changes_from_worker(self, client, play_track):
+        """子プロセスから曲の変化と履歴を受け取ることのテスト"""
+        assert client.connect()
+        first = _wait_for(client.get_current_track)
+        assert first is not None
+        assert client.worker_pid != os.getpid()
+
+        play_track('7')
+        assert _wait_for(lambda: client.get_current_track().title == "Track 7")
+
+        history = client.get_history(limit=5, days=30)
+        assert [track.title for track in history][0] == "Track 7"
+        assert len(history) == 5
+
+    def test_restart_after_crash(self, client, play_track):
+        """子プロセスが異常終了しても再起動して取得を続けることのテスト"""
+        client.connect()
+        assert _wait_for(client.get_current_track)
+        pid = client.worker_pid
+        os.kill(pid, signal.SIGKILL)
+
+        assert _wait_for(lambda: client.restart_count == 1)
+        assert client.worker_pid != pid
+        play_track('9')
+        assert _wait_for(lambda: client.get_current_track().title == "Track 9")
+
+    def test_late_history_reply_is_dropped(self, client, monkeypatch):
+        """タイムアウトした履歴の要求に遅れて届いた応答を保持しないことのテスト"""
+        client._supervisor = object()
+        monkeypatch.setattr(client, '_send', lambda message: True)
+        assert client.get_history(timeout=0.05) == []
+        client._handle((MSG_HISTORY, 1, ["late"]))
+        assert client._responses == {}
+        client._supervisor = None
+
+    @pytest.mark.skipif(sys.platform == 'win32', reason="SIGSTOP is not available")
+    def test_restart_after_hang(self, client):
+        """子プロセスが応答しなくなったら再起動することのテスト"""
+        client.connect()
+        assert _wait_for(client.get_current_track)
+        pid = client.worker_pid
+        os.kill(pid, signal.SIGSTOP)
+        try:
+            assert _wait_for(lambda: client.restart_count == 1)
+        finally:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        # 再起動中も最後の曲情報を返し続ける
+        assert client.get_current_track() is not None
+
+    def test_snapshot_and_key_provider_options(self, history_db, tmp_path, play_track):
+        """snapshotとkey_providerの設定が子プロセスのRekordboxClientに渡されることのテスト"""
+        snapshot_path = str(tmp_path / "snapshot.db")
+        provider = DatabaseKeyProvider(str(tmp_path / "keys.json"))
+        client = WorkerRekordboxClient(
+            db_path=history_db, unlock=False, snapshot=True, snapshot_path=snapshot_path,
+            key_provider=provider, interval=0.05, heartbeat_timeout=2.0
+        )
+        try:
+            client.connect()
+            assert _wait_for(client.get_current_track)
+            assert os.path.exists(snapshot_path)
+            play_track('7')
+            assert _wait_for(lambda: client.get_current_track().title == "Track 7")
+        finally:
+            client.close()
@@ -0,0 +1,92 @@
+from typing import Any, Dict, Iterator, Optional, Tuple
+from datetime import datetime
+
+class TrackInfo:
+    """整形済みの曲情報
+
+    曲ごとに辞書を作る代わりに __slots__ を使った軽量なレコードとして保持する。
+    同一性は曲のIDとupdated_at（再生履歴から取得した場合は再生を記録した時刻）で判定するため、
+    同じタイトルの別の曲や同じ曲の再生し直しも別のレコードとして区別できる。
+
+    表示フォーマット（"{title} - {artist}".format_map(track) など）や既存の呼び出し側のために、
+    track["title"] のような辞書形式の読み取りにも対応する。
+    """
+
+    # 表示・出力に使う項目（to_dict()のキー）
+    FIELDS = (
+        'title', 'artist', 'album', 'genre', 'bpm', 'key', 'rating', 'comment',
+        'duration', 'file_path', 'last_played', 'play_count', 'length',
+        'key_camelot', 'key_open',
+    )
+    __slots__ = ('content_id', 'updated_at') + FIELDS + ('analysis_path',)
+
+    def __init__(self, content_id: Optional[str] = None, updated_at: Optional[datetime] = None,
+                 title: str = '', artist: str = '', album: str = '', genre: str = '',
+                 bpm: float = 0, key: str = '', rating: int = 0, comment: str = '',
+                 duration: int = 0, file_path: str = '', last_played: Optional[str] = None,
+                 play_count: Any = 0, length: str = '', key_camelot: str = '', key_open: str = '',
+                 analysis_path: str = ''):
+        self.content_id = content_id
+        self.updated_at = updated_at
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.genre = genre
+        self.bpm = bpm
+        self.key = key
+        self.rating = rating
+        self.comment = comment
+        self.duration = duration
+        self.file_path = file_path
+        self.last_played = last_played
+        self.play_count = play_count
+        # 曲の長さの表示用文字列（HH:MM:SS）
+        self.length = length
+        # キーのCamelot表記（例: 8A）とOpen Key表記（例: 1m）
+        self.key_camelot = key_camelot
+        self.key_open = key_open
+        # 解析ファイル（ANLZ）のパス（表示には使わないため FIELDS には含めない）
+        self.analysis_path = analysis_path
+
+    @property
+    def identity(self) -> Tuple[Optional[str], Optional[datetime]]:
+        """同一性の判定に使う（曲のID, updated_at）"""
+        return self.content_id, self.updated_at
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TrackInfo):
+            return NotImplemented
+        return self.content_id == other.content_id and self.updated_at == other.updated_at
+
+    def __hash__(self) -> int:
+        return hash((self.content_id, self.updated_at))
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """辞書と同じ形式で項目を取得する"""
+        return getattr(self, name) if name in self.FIELDS else default
+
+    def keys(self):
+        """項目名の一覧を取得する"""
+        return self.FIELDS
+
+    def to_dict(self) -> Dict[str, Any]:
+        """表示・出力用の辞書に変換する"""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __reduce__(self):
+        # 別プロセスへの送信用に、属性名を含まない値のタプルとしてpickleする
+        return (TrackInfo, tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self) -> str:
+        return f"<TrackInfo({self.content_id} Title={self.title} updated_at={self.updated_at})>"
@@ -0,0 +1,308 @@
+"""
+解析ファイル（ANLZ）の波形プレビューの画像化
+
+rekordboxは曲ごとに解析ファイル（ANLZ0000.DAT/.EXT）を作成し、波形プレビューを保存している。
+.DATのPWAVは400列の青い波形、.EXTのPWV4は1200列のカラー波形（各列6バイト）。
+.EXTには詳細波形（PWV3/PWV5）も含まれ数百KBになるため、ファイルをメモリマップして
+セクションのヘッダーだけをたどり、プレビューの部分だけをNumPyの配列として読む。
+
+WaveformCacheはプレビューを曲ごとに小さなPNGとして描画し、曲のIDと解析ファイルの版（更新時刻と
+サイズ）をファイル名にしてキャッシュする。曲が変わったときはOBSの画像ソースのファイルパスを差し替えるだけで
+済み、解析ファイルの読み取りと描画は初回（またはwarmによる事前の描画）と曲を解析し直したときだけになる。
+
+NumPyは読み込みに時間がかかるため、このモジュールはパッケージの__init__からはインポートしない。
+"""
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+import glob
+import logging
+import mmap
+import os
+import struct
+import zlib
+import numpy as np
+from utils.paths import user_cache_dir
+
+# ANLZファイルのヘッダーとセクションのヘッダー（いずれもビッグエンディアン）：(種類, ヘッダー長, 全体の長さ)
+ANLZ_MAGIC = b'PMAI'
+_SECTION = struct.Struct('>4sII')
+# PWAV：(列数, 不明)、PWV4：(1列のバイト数, 列数, 不明)
+_PREVIEW_HEADER = struct.Struct('>II')
+_COLOR_PREVIEW_HEADER = struct.Struct('>III')
+_COLOR_ENTRY_SIZE = 6
+
+TAG_WAVEFORM_PREVIEW = 'PWAV'
+TAG_WAVEFORM_COLOR_PREVIEW = 'PWV4'
+
+# 青い波形の色（白さが0のときと最大のとき）
+PREVIEW_BLUE = (0, 104, 255)
+PREVIEW_WHITE = (200, 224, 255)
+
+# 画像の既定の大きさ（PWAVの列数と同じ幅）
+DEFAULT_WIDTH = 400
+DEFAULT_HEIGHT = 48
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+class WaveformPreview(NamedTuple):
+    """波形プレビューの列ごとの高さ（0〜1）と色（RGB）"""
+    heights: np.ndarray
+    colors: np.ndarray
+
+def default_cache_dir() -> str:
+    """波形画像の既定のキャッシュディレクトリ（ユーザーごとのキャッシュディレクトリの下）"""
+    return os.path.join(user_cache_dir(), 'waveforms')
+
+def resolve_analysis_path(analysis_root: str, analysis_path: str) -> str:
+    """データベースに記録された解析ファイルのパス（"/PIONEER/USBANLZ/..."）を絶対パスにする"""
+    return os.path.join(analysis_root, *analysis_path.replace('\\', '/').strip('/').split('/'))
+
+def find_sections(buf) -> Dict[str, Tuple[int, int, int]]:
+    """ANLZファイルのセクションの位置を求める
+
+    Returns:
+        Dict[str, Tuple[int, int, int]]: セクションの種類から (開始位置, ヘッダー長, 全体の長さ)
+            （ANLZファイルでなければ空）
+    """
+    if len(buf) < _SECTION.size:
+        return {}
+    magic, header_size, file_size = _SECTION.unpack_from(buf, 0)
+    if magic != ANLZ_MAGIC:
+        return {}
+    end = min(file_size, len(buf))
+    sections = {}
+    pos = header_size
+    while pos + _SECTION.size <= end:
+        tag, section_header, section_size = _SECTION.unpack_from(buf, pos)
+        if section_size < _SECTION.size or pos + section_size > end:
+            break
+        sections[tag.decode('ascii', 'replace')] = (pos, section_header, section_size)
+        pos += section_size
+    return sections
+
+def _read_section(path: str, tag: str) -> Optional[Tuple[bytes, bytes]]:
+    """ファイルをメモリマップし、指定した種類のセクションの（ヘッダー, 内容）だけを読む"""
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            section = find_sections(buf).get(tag)
+            if section is None:
+                return None
+            pos, header_size, size = section
+            return buf[pos + _SECTION.size:pos + header_size], buf[pos + header_size:pos + size]
+    except (OSError, ValueError):
+        return None
+
+def decode_preview(data: bytes) -> WaveformPreview:
+    """PWAVの内容を復号する（各バイトの下位5ビットが高さ、上位3ビットが白さ）"""
+    values = np.frombuffer(data, dtype=np.uint8)
+    whiteness = (values >> 5).astype(np.float32)[:, None] / 7
+    blue = np.array(PREVIEW_BLUE, dtype=np.float32)
+    white = np.array(PREVIEW_WHITE, dtype=np.float32)
+    colors = blue + (white - blue) * whiteness
+    return WaveformPreview((values & 0x1f).astype(np.float32) / 31, colors.astype(np.uint8))
+
+def decode_color_preview(data: bytes) -> WaveformPreview:
+    """PWV4の内容を復号する
+
+    各列の6バイトのうち、1バイト目が明るさ、3〜5バイト目が赤・緑・青の強さ（下位7ビット）。
+    高さは2〜5バイト目の最大値とする（pyrekordboxの解釈に従う）。
+    """
+    entries = np.frombuffer(data, dtype=np.uint8)
+    entries = entries[:len(entries) // _COLOR_ENTRY_SIZE * _COLOR_ENTRY_SIZE]
+    entries = entries.reshape(-1, _COLOR_ENTRY_SIZE) & 0x7f
+    heights = entries[:, 2:6].max(axis=1).astype(np.float32) / 127
+    rgb = entries[:, 3:6].astype(np.float32) * (entries[:, 1:2].astype(np.float32) / 127)
+    # 暗い色のままでは見えにくいため、最も強い成分が255になるように明るくする
+    peak = rgb.max(axis=1, keepdims=True)
+    colors = np.where(peak > 0, rgb * 255 / np.maximum(peak, 1), 0)
+    return WaveformPreview(heights, colors.astype(np.uint8))
+
+def read_preview(analysis_path: str) -> Optional[WaveformPreview]:
+    """曲の解析ファイルから波形プレビューを読む
+
+    .EXTがあればカラー波形を、なければ.DATの青い波形を使う。
+
+    Args:
+        analysis_path (str): 解析ファイル（.DAT）の絶対パス
+
+    Returns:
+        Optional[WaveformPreview]: 波形プレビュー（解析ファイルがないか波形がなければNone）
+    """
+    base, _ = os.path.splitext(analysis_path)
+    section = _read_section(base + '.EXT', TAG_WAVEFORM_COLOR_PREVIEW)
+    if section is not None:
+        header, data = section
+        entry_size, count, _ = _COLOR_PREVIEW_HEADER.unpack_from(header)
+        if entry_size == _COLOR_ENTRY_SIZE and count:
+            return decode_color_preview(data[:count * entry_size])
+    section = _read_section(base + '.DAT', TAG_WAVEFORM_PREVIEW)
+    if section is not None:
+        header, data = section
+        count, _ = _PREVIEW_HEADER.unpack_from(header)
+        if count:
+            return decode_preview(data[:count])
+    return None
+
+def analysis_version(analysis_path: str) -> Optional[str]:
+    """解析ファイル（.EXTと.DAT）の更新時刻とサイズから、キャッシュのファイル名に使う版を求める
+
+    ファイルを開かずにstatだけで求めるため、キャッシュの確認のたびに呼び出してよい。
+
+    Returns:
+        Optional[str]: 8桁の16進数（解析ファイルがなければNone）
+    """
+    base, _ = os.path.splitext(analysis_path)
+    stamps = []
+    for suffix in ('.EXT', '.DAT'):
+        try:
+            st = os.stat(base + suffix)
+        except OSError:
+            continue
+        stamps.append(f"{suffix}:{st.st_mtime_ns}:{st.st_size}")
+    if not stamps:
+        return None
+    return f"{zlib.crc32(';'.join(stamps).encode()):08x}"
+
+def render_image(preview: WaveformPreview, width: int = DEFAULT_WIDTH,
+                 height: int = DEFAULT_HEIGHT) -> np.ndarray:
+    """波形プレビューを下揃えの棒グラフとして描画する
+
+    列数が画像の幅より多い場合は、まとめる列の高さの最大値を使う。波形のない部分は透明にする。
+
+    Returns:
+        np.ndarray: (height, width, 4) のRGBA画像
+    """
+    count = len(preview.heights)
+    image = np.zeros((height, width, 4), dtype=np.uint8)
+    if not count:
+        return image
+    starts = np.arange(width) * count // width
+    heights = np.maximum.reduceat(preview.heights, starts)
+    bars = np.rint(heights * height).astype(np.int32)
+    image[:, :, :3] = preview.colors[starts][None, :, :]
+    image[:, :, 3] = np.where(np.arange(height)[:, None] >= height - bars[None, :], 255, 0)
+    return image
+
+def encode_png(image: np.ndarray) -> bytes:
+    """RGBA画像をPNGに変換する（Pillowを使わずにzlibで圧縮する）"""
+    height, width, _ = image.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 4)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    return (PNG_SIGNATURE
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 9))
+            + chunk(b'IEND', b''))
+
+class WaveformCache:
+    """曲ごとの波形画像をディスクにキャッシュする
+
+    画像のファイル名は曲のID・画像の大きさ・解析ファイルの版から決まるため、一度描画した曲は
+    解析ファイルのstatとキャッシュの存在を確認するだけでパスを返す。曲を解析し直すと版が変わり、
+    描画し直して古い版の画像を削除する。ライブラリ（master.dbとUSBのエクスポートなど）ごとに
+    曲のIDの体系が異なるため、別のライブラリには別のキャッシュディレクトリを使うこと。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, width: int = DEFAULT_WIDTH,
+                 height: int = DEFAULT_HEIGHT):
+        """
+        Args:
+            cache_dir (Optional[str]): キャッシュディレクトリ（Noneの場合はdefault_cache_dir()）
+            width (int): 画像の幅（ピクセル）
+            height (int): 画像の高さ（ピクセル）
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.width = width
+        self.height = height
+        self.logger = logging.getLogger(__name__)
+        self._stats = {'hits': 0, 'renders': 0, 'missing': 0}
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュの命中回数・描画した回数・波形がなかった回数"""
+        return dict(self._stats)
+
+    def path_for(self, content_id: str, version: str) -> str:
+        """曲の波形画像のキャッシュのパス
+
+        Args:
+            content_id (str): 曲のID
+            version (str): 解析ファイルの版（analysis_version()の値）
+        """
+        return os.path.join(self.cache_dir, f"{content_id}_{self.width}x{self.height}_{version}.png")
+
+    def image_for(self, track, analysis_root: str) -> Optional[str]:
+        """曲の波形画像のパスを取得する（キャッシュになければ描画する）
+
+        Args:
+            track (TrackInfo): 曲情報（content_idとanalysis_pathを使う）
+            analysis_root (str): 解析ファイルのパスの起点（RekordboxClient.analysis_rootなど）
+
+        Returns:
+            Optional[str]: PNGファイルのパス（解析ファイルや波形がなければNone）
+        """
+        if not track.content_id or not track.analysis_path:
+            return None
+        analysis_path = resolve_analysis_path(analysis_root, track.analysis_path)
+        version = analysis_version(analysis_path)
+        if version is not None:
+            path = self.path_for(track.content_id, version)
+            if os.path.exists(path):
+                self._stats['hits'] += 1
+                return path
+        return self.render(track.content_id, analysis_path, version)
+
+    def render(self, content_id: str, analysis_path: str,
+               version: Optional[str] = None) -> Optional[str]:
+        """解析ファイルから波形画像を描画してキャッシュに保存する
+
+        Args:
+            content_id (str): 曲のID
+            analysis_path (str): 解析ファイル（.DAT）の絶対パス
+            version (Optional[str]): 解析ファイルの版（Noneの場合はanalysis_version()で求める）
+        """
+        if version is None:
+            version = analysis_version(analysis_path)
+        preview = read_preview(analysis_path) if version is not None else None
+        if preview is None:
+            self._stats['missing'] += 1
+            self.logger.debug(f"No waveform preview for track {content_id}: {analysis_path}")
+            return None
+        path = self.path_for(content_id, version)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(encode_png(render_image(preview, self.width, self.height)))
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Failed to write waveform image {path}: {e}")
+            return None
+        self._stats['renders'] += 1
+        self._remove_stale(content_id, path)
+        return path
+
+    def _remove_stale(self, content_id: str, path: str) -> None:
+        """解析し直す前の版の画像を削除する"""
+        pattern = os.path.join(glob.escape(self.cache_dir),
+                               f"{glob.escape(content_id)}_{self.width}x{self.height}_*.png")
+        for stale in glob.glob(pattern):
+            if stale == path:
+                continue
+            try:
+                os.remove(stale)
+            except OSError as e:
+                self.logger.debug(f"Failed to remove stale waveform image {stale}: {e}")
+
+    def warm(self, tracks: Iterable, analysis_root: str) -> int:
+        """曲の波形画像をまとめて描画しておく（再生履歴やプレイリストの曲を事前に描画する）
+
+        Returns:
+            int: 新たに描画した曲数
+        """
+        before = self._stats['renders']
+        for track in tracks:
+            self.image_for(track, analysis_root)
+        return self._stats['renders'] - before
@@ -0,0 +1,241 @@
+"""
+別プロセスでのデータベース読み取り
+
+SQLCipherの復号やSQLAlchemyの行の生成はCPUを使いGILを保持するため、GUIやOBSへの送信と
+同じプロセスで行うとポーリングのたびに処理が揺らぐ。WorkerRekordboxClientは
+RekordboxClientを子プロセスで動かし、曲の変化だけをパイプ経由で受け取る。
+子プロセスが終了したり応答しなくなった場合は、表示側を止めずに再起動する。
+"""
+from typing import Any, Dict, List, Optional
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from .track_info import TrackInfo
+
+# 子プロセスとの間でやり取りするメッセージの種類
+MSG_TRACK = 'track'
+MSG_HEARTBEAT = 'heartbeat'
+MSG_HISTORY = 'history'
+MSG_STOP = 'stop'
+
+def _worker_main(conn, key: Optional[str], db_path: Optional[str], unlock: bool, interval: float,
+                 snapshot: bool = False, snapshot_path: Optional[str] = None, key_provider=None) -> None:
+    """子プロセスの処理：曲の変化とハートビートを送り、履歴の要求に応答する"""
+    from .rekordbox_client import RekordboxClient
+
+    client = RekordboxClient(key=key, db_path=db_path, unlock=unlock, snapshot=snapshot,
+                             snapshot_path=snapshot_path, key_provider=key_provider)
+    last_track = None
+    try:
+        while True:
+            track = client.get_current_track()
+            if track is not None and track != last_track:
+                conn.send((MSG_TRACK, track))
+                last_track = track
+            conn.send((MSG_HEARTBEAT, time.time()))
+
+            # 次のポーリングまでの間は親プロセスからの要求を処理する
+            deadline = time.monotonic() + interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not conn.poll(remaining):
+                    break
+                message = conn.recv()
+                if message[0] == MSG_STOP:
+                    return
+                if message[0] == MSG_HISTORY:
+                    _, request_id, limit, days = message
+                    conn.send((MSG_HISTORY, request_id, client.get_history(limit=limit, days=days)))
+    except (EOFError, OSError, KeyboardInterrupt):
+        # 親プロセスが終了した
+        return
+    finally:
+        client.close()
+
+class WorkerRekordboxClient:
+    """子プロセスでRekordboxClientを動かすクライアント
+
+    get_current_trackは子プロセスから届いた最新の曲を返すだけで、データベースを待たない。
+    子プロセスが終了するか、heartbeat_timeout秒の間メッセージを送ってこなければ
+    強制終了して再起動する（再起動の間隔は失敗が続くほど延ばす）。
+    """
+
+    def __init__(self, key: Optional[str] = None, db_path: Optional[str] = None, unlock: bool = True,
+                 snapshot: bool = False, snapshot_path: Optional[str] = None, key_provider=None,
+                 interval: float = 1.0, heartbeat_timeout: float = 10.0,
+                 restart_delay: float = 1.0, max_restart_delay: float = 30.0):
+        """
+        Args:
+            key (Optional[str]): データベースキー
+            db_path (Optional[str]): master.dbのパス
+            unlock (bool): データベースを復号するか
+            snapshot (bool): 子プロセスでmaster.dbのローカルのコピーを読む（RekordboxClientと同じ）
+            snapshot_path (Optional[str]): コピーのパス（Noneの場合は一時ディレクトリに作成する）
+            key_provider (Optional[DatabaseKeyProvider]): キーと導出済みの暗号鍵のキャッシュ
+                （spawnで子プロセスに渡すため、pickleできる必要がある。discoverにはlambdaではなく
+                モジュールの関数を指定する）
+            interval (float): 子プロセスでのポーリング間隔（秒）
+            heartbeat_timeout (float): この秒数だけ応答がなければ子プロセスを再起動する
+            restart_delay (float): 再起動までの最初の待ち時間（秒）
+            max_restart_delay (float): 再起動までの待ち時間の上限（秒）
+        """
+        self.key = key
+        self.db_path = db_path
+        self.unlock = unlock
+        self.snapshot = snapshot
+        self.snapshot_path = snapshot_path
+        self.key_provider = key_provider
+        self.interval = interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.logger = logging.getLogger(__name__)
+        self.restart_count = 0
+        # GUIのプロセスをforkしないよう、子プロセスは常にspawnで起動する
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._current_track: Optional[TrackInfo] = None
+        self._last_message_time = 0.0
+        self._next_restart_delay = restart_delay
+        self._request_ids = itertools.count(1)
+        # 応答を待っている履歴の要求（要求ID -> 応答、届くまではNone）
+        self._responses: Dict[int, Any] = {}
+        self._response_ready = threading.Condition()
+        self._stop_event = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+
+    @property
+    def worker_pid(self) -> Optional[int]:
+        """子プロセスのプロセスID（起動していなければNone）"""
+        return self._process.pid if self._process is not None else None
+
+    def connect(self) -> bool:
+        """子プロセスを起動する（データベースへの接続は子プロセスで行う）"""
+        if self._supervisor is not None and self._supervisor.is_alive():
+            return True
+        self._stop_event.clear()
+        self._spawn()
+        self._supervisor = threading.Thread(target=self._supervise, name="RekordboxWorkerSupervisor",
+                                            daemon=True)
+        self._supervisor.start()
+        return True
+
+    def get_current_track(self) -> Optional[TrackInfo]:
+        """子プロセスから届いた最新の曲情報を返す（データベースの処理は待たない）"""
+        if self._supervisor is None:
+            self.connect()
+        return self._current_track
+
+    def get_history(self, limit: int = 10, days: int = 7, timeout: float = 5.0) -> List[TrackInfo]:
+        """子プロセスに履歴を問い合わせる（timeout秒以内に応答がなければ空のリスト）"""
+        if self._supervisor is None:
+            self.connect()
+        request_id = next(self._request_ids)
+        with self._response_ready:
+            self._responses[request_id] = None
+        if not self._send((MSG_HISTORY, request_id, limit, days)):
+            with self._response_ready:
+                self._responses.pop(request_id, None)
+            return []
+        deadline = time.monotonic() + timeout
+        with self._response_ready:
+            while self._responses[request_id] is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # 遅れて届いた応答は_handleで捨てる
+                    del self._responses[request_id]
+                    self.logger.warning("Timed out waiting for history from rekordbox worker")
+                    return []
+                self._response_ready.wait(remaining)
+            return self._responses.pop(request_id)
+
+    def close(self) -> None:
+        """子プロセスを停止する"""
+        self._stop_event.set()
+        self._send((MSG_STOP,))
+        if self._supervisor is not None:
+            self._supervisor.join(self.heartbeat_timeout)
+            self._supervisor = None
+        self._terminate(timeout=2.0)
+
+    def _spawn(self) -> None:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name="RekordboxWorker",
+            args=(child_conn, self.key, self.db_path, self.unlock, self.interval,
+                  self.snapshot, self.snapshot_path, self.key_provider), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, parent_conn
+        self._last_message_time = time.monotonic()
+        self.logger.info(f"Started rekordbox worker process (pid {process.pid})")
+
+    def _terminate(self, timeout: float = 0.0) -> None:
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        if process is not None:
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if conn is not None:
+            conn.close()
+
+    def _send(self, message) -> bool:
+        with self._send_lock:
+            conn = self._conn
+            if conn is None:
+                return False
+            try:
+                conn.send(message)
+                return True
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Failed to send to rekordbox worker: {e}")
+                return False
+
+    def _handle(self, message) -> None:
+        kind = message[0]
+        if kind == MSG_TRACK:
+            self._current_track = message[1]
+        elif kind == MSG_HISTORY:
+            with self._response_ready:
+                # タイムアウトして待つのをやめた要求の応答は保持しない
+                if message[1] in self._responses:
+                    self._responses[message[1]] = message[2]
+                    self._response_ready.notify_all()
+
+    def _supervise(self) -> None:
+        """子プロセスからのメッセージを受け取り、終了や無応答を検出して再起動する"""
+        while not self._stop_event.is_set():
+            conn = self._conn
+            failure = None
+            try:
+                if conn.poll(min(self.interval, 0.2)):
+                    self._handle(conn.recv())
+                    self._last_message_time = time.monotonic()
+                    self._next_restart_delay = self.restart_delay
+                    continue
+                if not self._process.is_alive():
+                    failure = f"exited with code {self._process.exitcode}"
+                elif time.monotonic() - self._last_message_time > self.heartbeat_timeout:
+                    failure = f"did not respond for {self.heartbeat_timeout:.1f}s"
+            except (EOFError, OSError):
+                failure = "closed the connection"
+            if failure is None or self._stop_event.is_set():
+                continue
+
+            self.logger.error(f"Rekordbox worker {failure}, restarting "
+                              f"in {self._next_restart_delay:.1f}s")
+            with self._send_lock:
+                self._terminate()
+            if self._stop_event.wait(self._next_restart_delay):
+                return
+            self._next_restart_delay = min(self._next_restart_delay * 2, self.max_restart_delay)
+            with self._send_lock:
+                self._spawn()
+            self.restart_count += 1
@@ -1,6 +1,5 @@
 import os
 import sys
-import sqlite3
 from sqlalchemy import inspect
 
 # プロジェクトルートをPythonパスに追加
@@ -8,7 +7,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 sys.path.insert(0, project_root)
 
 from rekordbox_client.rekordbox_client import RekordboxClient
-import json
+from rekordbox_client.diagnostics import dump_track_attributes
 import logging
 from datetime import datetime, timedelta
 
@@ -18,15 +17,7 @@ logger = logging.getLogger(__name__)
 
 def inspect_track_details(track):
     """トラック情報の詳細を調査"""
-    details = []
-    for attr in dir(track):
-        if not attr.startswith('_'):  # プライベート属性を除外
-            try:
-                value = getattr(track, attr)
-                details.append(f"{attr}: {value}")
-            except Exception as e:
-                details.append(f"{attr}: [Error: {e}]")
-    return details
+    return [f"{attr}: {value}" for attr, value in dump_track_attributes(track).items()]
 
 def inspect_database_structure(client):
     """データベースの構造を調査"""
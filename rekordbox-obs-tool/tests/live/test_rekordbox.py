@@ -22,7 +22,7 @@ def test_rekordbox_live():
         if track:
             print("✅ 曲情報の取得成功")
             print("\n取得した曲情報:")
-            print(json.dumps(track, indent=2, ensure_ascii=False))
+            print(json.dumps(track.to_dict(), indent=2, ensure_ascii=False))
         else:
             print("ℹ️ 現在再生中の曲はありません")
 
@@ -44,12 +44,12 @@ def test_rekordbox_live():
         print("rekordboxで曲を再生または選択してください...")
         
         start_time = time.time()
-        last_title = None
+        last_track = None
         
         while time.time() - start_time < 10:
             track = client.get_current_track()
-            if track and track['title'] != last_title:
-                last_title = track['title']
+            if track and track != last_track:
+                last_track = track
                 print(f"\n新しい曲を検出: {track['title']} - {track['artist']}")
                 print(f"BPM: {track['bpm']}, Key: {track['key']}")
             time.sleep(1)
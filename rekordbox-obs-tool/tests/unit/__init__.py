@@ -1,3 +0,0 @@
-"""
-Unit tests for Rekordbox OBS Tool
-""" 
\ No newline at end of file
@@ -4,10 +4,12 @@ Utils package for rekordbox-obs-tool
 
 from .config import load_config, save_config, get_config_value, validate_config
 from .logger import setup_logger, get_log_level
+from .paths import user_cache_dir
 from .time_utils import format_duration, parse_duration, format_timestamp, parse_timestamp
 
 __all__ = [
     'load_config', 'save_config', 'get_config_value', 'validate_config',
     'setup_logger', 'get_log_level',
+    'user_cache_dir',
     'format_duration', 'parse_duration', 'format_timestamp', 'parse_timestamp'
 ] 
\ No newline at end of file
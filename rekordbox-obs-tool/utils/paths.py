@@ -0,0 +1,13 @@
+import os
+
+APP_NAME = 'rekordbox-obs-tool'
+
+def user_cache_dir() -> str:
+    """
+    ユーザーごとのキャッシュディレクトリ（キーや波形画像のキャッシュの置き場所）を取得する
+
+    Returns:
+        str: %LOCALAPPDATA%、$XDG_CACHE_HOME、~/.cache の順に見つかった場所の下のアプリ用ディレクトリ
+    """
+    base = os.getenv('LOCALAPPDATA') or os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, APP_NAME)
@@ -0,0 +1,12 @@
+import os
+from utils.paths import user_cache_dir
+
+def test_user_cache_dir(monkeypatch, tmp_path):
+    """user_cache_dir関数のテスト"""
+    monkeypatch.delenv('LOCALAPPDATA', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert user_cache_dir() == os.path.join(str(tmp_path), 'rekordbox-obs-tool')
+
+    # Windowsでは%LOCALAPPDATA%を優先する
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path / "local"))
+    assert user_cache_dir() == os.path.join(str(tmp_path / "local"), 'rekordbox-obs-tool')